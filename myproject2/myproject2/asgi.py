@@ -3,6 +3,15 @@ ASGI config for myproject2 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run with an ASGI server, e.g. ``uvicorn myproject2.asgi:application --workers 2``.
+Submission uploads, previews and file serving are async views: the server
+reads slow uploads on the event loop and blocking work goes to the bounded
+pool in submissions/aio.py (ASYNC_BLOCKING_WORKERS).
+
+DJANGO_ASGI turns off persistent database connections (CONN_MAX_AGE) in
+settings.py: each request's sync work runs on its own thread, so a kept
+connection would never be reused.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +21,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject2.settings')
+# Read by settings.py, which get_asgi_application() loads
+os.environ['DJANGO_ASGI'] = '1'
 
 application = get_asgi_application()
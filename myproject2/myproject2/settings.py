@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +43,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'submissions.schools.SchoolMiddleware',
+    'submissions.profiling.ProfilingMiddleware',
+    'submissions.querywatch.QueryWatchMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,10 +81,64 @@ WSGI_APPLICATION = 'myproject2.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Opt-in production SQLite profile (SQLITE_PRODUCTION=1): persistent connections (WSGI only),
+# IMMEDIATE write transactions and the PRAGMAs below, applied to every new
+# connection by submissions/db.py
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION') == '1'
+SQLITE_PRAGMAS = {}
+SQLITE_OPTIMIZE_INTERVAL = None  # seconds between "PRAGMA optimize" per connection
+
+if SQLITE_PRODUCTION:
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds to wait for a lock (Python-level busy timeout)
+            'timeout': 20,
+            # Take the write lock at BEGIN so concurrent writers queue on the
+            # busy timeout instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 20000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,  # KiB, i.e. 64 MB per connection
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_OPTIMIZE_INTERVAL = 60 * 60
+
+# Under ASGI every request runs its sync database work on a thread that ends
+# with the request, so a persistent connection is never reused (myproject2/asgi.py)
+if os.environ.get('DJANGO_ASGI') == '1':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# Multi-school hosting: every school registered in SCHOOLS_ROOT/schools.json
+# gets its own SQLite file and media root (see submissions/schools.py).
+# Manage schools with school_create / school_migrate / school_rebalance.
+SCHOOLS_ROOT = os.environ.get('SCHOOLS_ROOT', os.path.join(BASE_DIR, 'schools'))
+SCHOOL_PATH_PREFIX = 's'
+
+try:
+    with open(os.path.join(SCHOOLS_ROOT, 'schools.json'), encoding='utf-8') as _registry:
+        SCHOOLS = json.load(_registry)
+except FileNotFoundError:
+    SCHOOLS = {}
+
+for _slug in SCHOOLS:
+    DATABASES[f'school_{_slug}'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(SCHOOLS_ROOT, _slug, 'db.sqlite3'),
+    }
+
+DATABASE_ROUTERS = ['submissions.routers.SchoolRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,11 +181,115 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-import os
-
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+SCHOOL_MEDIA_URL = '/school-media/'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'submissions.schools.SchoolFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+LOGIN_URL = 'teacher_login'
 
 # Allow embedding in iframes (for PDF preview)
 X_FRAME_OPTIONS = 'SAMEORIGIN'
 
+
+# Cache shared by all worker processes (no external service needed)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    }
+}
+
+# Versioned cache of the success feed and class lists (see submissions/cache.py)
+FRAGMENT_CACHE_ENABLED = True
+
+# Near-duplicate detection of document submissions (see submissions/similarity.py);
+# classes can override the threshold in the admin
+SIMILARITY_THRESHOLD = 0.6
+
+# Archive browsing in view_file (see submissions/archives.py)
+ARCHIVE_MAX_DEPTH = 3                          # nested archives inside archives
+ARCHIVE_MAX_ENTRIES = 100_000                  # entries read, nested ones included
+ARCHIVE_MAX_RATIO = 100                        # uncompressed / compressed size
+ARCHIVE_MAX_NESTED_SIZE = 50 * 1024 * 1024     # bytes read out of a nested archive
+ARCHIVE_MAX_CHILDREN = 500                     # nodes shown per directory, the rest is counted
+ARCHIVE_MAX_NODES = 3000                       # nodes shown in the whole tree
+ARCHIVE_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+# Downscaled copies of image submissions (see submissions/images.py)
+IMAGE_DERIVATIVE_ROOT = os.path.join(BASE_DIR, 'derivatives')
+IMAGE_DERIVATIVE_SIZES = (160, 480, 960, 1600, 2560)   # bounding boxes; the smallest is the thumbnail
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_MAX_BYTES = 1024 * 1024 * 1024    # least recently used copies are removed above this
+
+# Background PDF analysis: page count, page text, first-page thumbnail (see submissions/pdfs.py)
+PDF_ANALYSIS_BACKGROUND = True      # False runs the analysis right after the upload commits
+PDF_ANALYSIS_WORKERS = 2            # threads per process
+PDF_RASTERIZER = 'pdftoppm'         # poppler-utils; without it PDFs get no thumbnail
+
+# Preview of .doc/.xls/.ppt through a LibreOffice conversion to OOXML (see submissions/office.py)
+OFFICE_CONVERTER_BINARY = 'soffice'     # without LibreOffice these formats are offered as downloads
+OFFICE_CONVERTER_POOL_SIZE = 2          # concurrent conversions per process
+OFFICE_CONVERTER_TIMEOUT = 60           # seconds before a conversion is killed
+OFFICE_CONVERTER_MAX_JOBS = 200         # documents before a converter is restarted
+
+# Per-request timing: Server-Timing headers and p50/p95/p99 per route (see submissions/profiling.py)
+PROFILING_ENABLED = True
+PROFILING_WINDOW = 1000             # latest requests kept per route and process
+PROFILING_FLUSH_INTERVAL = 30       # seconds between copies of the windows to the cache
+PROFILING_RETENTION = 60 * 60       # windows of processes that stopped flushing are dropped after this
+
+# Prometheus metrics at /metrics, shared by all worker processes through
+# memory-mapped files (see submissions/metrics.py)
+METRICS_ENABLED = True
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')   # scrapers allowed to read /metrics
+METRICS_LOCK_WAIT_THRESHOLD = 0.1           # seconds; slower SQLite writes count as lock waits
+
+# Slow query and N+1 detector, off by default (see submissions/querywatch.py);
+# "manage.py query_report" summarizes the log
+QUERY_WATCH_ENABLED = os.environ.get('QUERY_WATCH') == '1'
+QUERY_WATCH_SLOW_MS = 100               # queries at least this slow are logged with a stack trace
+QUERY_WATCH_REPEAT_THRESHOLD = 10       # identical queries per request reported as N+1
+QUERY_WATCH_LOG = os.path.join(BASE_DIR, 'logs', 'queries.jsonl')
+
+# Async views under ASGI (see submissions/aio.py): uploads, previews and file
+# serving run blocking work in a bounded per-process pool
+ASYNC_BLOCKING_WORKERS = 8              # threads per process for converters and file I/O
+ASYNC_BLOCKING_QUEUE = 200              # jobs waiting beyond that get 503 with Retry-After
+
+# Live teacher dashboard over Server-Sent Events (see submissions/live.py)
+LIVE_POLL_INTERVAL = 2              # seconds between checks for changes made by other worker processes
+LIVE_BATCH_DELAY = 0.5              # changes within this window are sent as one batch
+LIVE_HEARTBEAT = 20                 # idle streams get a comment line so proxies keep them open
+LIVE_MAX_SECONDS = 15 * 60          # streams end after this and the browser reconnects
+LIVE_RETRY_MS = 3000                # reconnect delay announced to the browser
+LIVE_BACKLOG = 100                  # missed entries beyond this reload the page instead
+
+# Background job queue in the school databases (see submissions/jobs.py);
+# "manage.py run_jobs" runs the workers. Off: uploads work as before
+JOBS_ENABLED = os.environ.get('JOBS_ENABLED') == '1'
+JOB_WORKER_PROCESSES = 2            # processes started by run_jobs
+JOB_POLL_INTERVAL = 1               # seconds an idle worker waits before looking again
+JOB_LEASE_SECONDS = 5 * 60          # a job whose worker stopped renewing this is run again
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_BASE = 10               # seconds before the first retry, doubled each time
+JOB_BACKOFF_MAX = 60 * 60
+JOB_SHUTDOWN_GRACE = 60             # seconds workers get to finish their job on shutdown
+JOB_RETENTION_DAYS = 7              # finished jobs are deleted after this
+
+# Grade and submission file exports, cached on disk per data version (see submissions/exports.py);
+# with JOBS_ENABLED they are built by run_jobs while the page shows progress
+EXPORT_ROOT = os.path.join(BASE_DIR, 'exports')
@@ -26,5 +26,15 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 if settings.DEBUG:
+    from django.urls import re_path
+    from django.views.static import serve
+    from submissions.schools import media_root
+
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<school>[a-z0-9_-]+)/(?P<path>.*)$' % settings.SCHOOL_MEDIA_URL.lstrip('/'),
+            lambda request, school, path: serve(request, path, document_root=media_root(school)),
+        ),
+    ]
 
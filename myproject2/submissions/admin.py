@@ -1,9 +1,12 @@
 from django.contrib import admin
-from .models import ClassGroup, Submission, Comment, ActivityLog
+from django.db.models import Count, Q
+from .models import ClassGroup, Submission, Comment, ActivityLog, Job
+from . import search
 
 @admin.register(ClassGroup)
 class ClassGroupAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'similarity_threshold')
+    list_editable = ('similarity_threshold',)
     search_fields = ('name',)
 
 @admin.register(Submission)
@@ -26,9 +29,16 @@ class SubmissionAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Comment counts and teachers come with the changelist query, not one query per row
+        return super().get_queryset(request).select_related('class_group', 'teacher').annotate(
+            comments_total=Count('comments')
+        )
+
     def comments_count(self, obj):
-        return obj.comments.count()
+        return obj.comments_total
     comments_count.short_description = 'Коментарів'
+    comments_count.admin_order_field = 'comments_total'
     
     def teacher_name(self, obj):
         if obj.teacher:
@@ -55,6 +65,14 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ['text', 'submission__last_name', 'submission__first_name']
     readonly_fields = ['created_at']
     
+    def get_search_results(self, request, queryset, search_term):
+        # Comment text is matched through the FTS5 index instead of LIKE '%...%'
+        if not search_term:
+            return queryset, False
+        ids = search.search_comment_ids(search_term, using=queryset.db)
+        by_student = Q(submission__last_name__icontains=search_term) | Q(submission__first_name__icontains=search_term)
+        return queryset.filter(Q(id__in=ids) | by_student), False
+
     def text_preview(self, obj):
         return obj.text[:50] + '...' if len(obj.text) > 50 else obj.text
     text_preview.short_description = 'Текст'
@@ -65,3 +83,11 @@ class ActivityLogAdmin(admin.ModelAdmin):
     list_filter = ['action_type', 'timestamp']
     search_fields = ['description', 'actor__username']
     readonly_fields = ['timestamp']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'args', 'status', 'priority', 'attempts', 'run_at', 'worker', 'finished_at']
+    list_filter = ['status', 'task']
+    search_fields = ['dedup_key']
+    readonly_fields = ['attempts', 'lease_until', 'worker', 'error', 'result', 'created_at', 'started_at', 'finished_at']
+    list_per_page = 50
@@ -0,0 +1,156 @@
+"""
+Асинхронні шляхи для ASGI: прийом робіт, віддача файлів і конвертація
+
+Під ASGI-сервером (myproject2/asgi.py, наприклад uvicorn) тіло запиту
+читає сам сервер у циклі подій, тож повільне завантаження учня не займає
+потік. Async-view (submission_create, view_file і view, що віддають
+файли) виконують блокуючу роботу - копіювання завантаження в сховище,
+конвертери попереднього перегляду, растеризацію, читання файлів - в
+обмеженому пулі потоків процесу (ASYNC_BLOCKING_WORKERS). Коли в черзі
+пулу вже ASYNC_BLOCKING_QUEUE завдань, нові запити одразу отримують 503
+з Retry-After замість нескінченного очікування.
+
+Запити до бази лишаються звичайним синхронним кодом Django і йдуть через
+sync_to_async: Django виконує їх у потоці, закріпленому за HTTP-запитом,
+тож з'єднання і транзакції поводяться як під WSGI. Функції, передані в
+run_blocking, до бази не звертаються: з'єднання потоків пулу ніхто не
+закривав би. Тому текст нової роботи для пошуку і схожості витягується в
+пулі заздалегідь (utils.prepared_text), а в потоці бази лишається запис.
+Виняток - run_in_background: після коміту роботи індекси будуються в
+тому ж пулі, і з'єднання потоку закривається разом із завданням.
+
+Під WSGI ті самі view працюють як раніше (Django виконує їх через
+async_to_sync), а файли віддаються звичайним FileResponse.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import FileResponse, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Jobs submitted to the pool and not finished yet (running or queued)
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class Overloaded(Exception):
+    """Черга блокуючих завдань процесу переповнена"""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_BLOCKING_WORKERS,
+                thread_name_prefix='blocking',
+            )
+        return _executor
+
+
+def _job(func, *args):
+    global _pending
+    # The school and the request profile travel with the job into the pool thread
+    context = contextvars.copy_context()
+
+    def job():
+        global _pending
+        try:
+            return context.run(func, *args)
+        finally:
+            # Counted down when the thread is done, not when the awaiting request gives up
+            with _pending_lock:
+                _pending -= 1
+
+    with _pending_lock:
+        _pending += 1
+    return job
+
+
+def _submit(func, *args):
+    return asyncio.get_running_loop().run_in_executor(_get_executor(), _job(func, *args))
+
+
+async def run_blocking(func, *args):
+    """
+    Виконує блокуючу функцію в пулі потоків, не займаючи цикл подій
+
+    Raises:
+        Overloaded: у пулі вже ASYNC_BLOCKING_WORKERS + ASYNC_BLOCKING_QUEUE завдань
+    """
+    if _pending >= settings.ASYNC_BLOCKING_WORKERS + settings.ASYNC_BLOCKING_QUEUE:
+        raise Overloaded
+    return await _submit(func, *args)
+
+
+def run_in_background(func, *args) -> None:
+    """
+    Виконує функцію в пулі потоків, не чекаючи на результат
+
+    На відміну від run_blocking, функція може звертатися до бази: з'єднання
+    потоку закриваються, коли вона завершиться. Ліміт черги тут не діє -
+    робота вже прийнята, і відмовляти нікому.
+    """
+    def background():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Background call %s failed', getattr(func, '__name__', func))
+        finally:
+            connections.close_all()
+
+    _get_executor().submit(_job(background))
+
+
+def pending() -> int:
+    return _pending
+
+
+def shed_load(view):
+    """Декоратор async-view: 503 з Retry-After, коли пул переповнений"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except Overloaded:
+            response = HttpResponse('Сервер перевантажений, спробуйте ще раз за хвилину', status=503)
+            response['Retry-After'] = '30'
+            return response
+    return wrapper
+
+
+async def _read_chunks(file, chunk_size: int):
+    try:
+        while True:
+            # A response already being sent is not refused: no queue limit here
+            chunk = await _submit(file.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+def file_response(request, file, **kwargs) -> FileResponse:
+    """
+    FileResponse, що під ASGI читає файл шматками в пулі потоків
+
+    Синхронний ітератор Django під ASGI перед відправленням вичитує
+    повністю в пам'ять; асинхронний віддається шматок за шматком.
+    Заголовки (Content-Length, Content-Type, Content-Disposition) ті самі.
+    """
+    response = FileResponse(file, **kwargs)
+    if isinstance(request, ASGIRequest):
+        response.streaming_content = _read_chunks(file, response.block_size)
+    return response
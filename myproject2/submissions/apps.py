@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SubmissionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'submissions'
+
+    def ready(self):
+        from . import db, metrics, profiling, querywatch, signals, tasks  # noqa: F401
+
+        profiling.install_template_timing()
@@ -0,0 +1,493 @@
+"""
+Перегляд архівів робіт: потокове читання zip/tar/tar.gz/gz/rar/7z з
+заходом у вкладені архіви
+
+Архів не розпаковується: для zip, rar і 7z читається лише каталог
+записів, tar читається послідовним потоком. Вкладений архів копіюється
+у тимчасовий файл (у пам'яті, поки малий) з обмеженням розміру. Пам'ять
+залежить від кількості показаних вузлів дерева, а не від розміру архіву.
+
+Обмеження (settings.ARCHIVE_*) захищають від «архівних бомб»: глибина
+вкладення, кількість записів, ступінь стиснення і розмір вкладеного
+архіву. Готове дерево кешується за SHA-256 файлу (utils.file_digest).
+
+Окремий файл з архіву (read_member) читається так само потоково, без
+розпакування решти; його прев'ю кешується за (хеш архіву, шлях у архіві).
+"""
+import gzip
+import hashlib
+import io
+import os
+import struct
+import tarfile
+import tempfile
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .profiling import timed
+
+# Bump when the tree format changes so stale cache entries are ignored
+TREE_VERSION = 1
+
+# Bump when the preview dict built by views._build_preview changes
+MEMBER_PREVIEW_VERSION = 2
+
+# Separator between the member paths of nested archives ("lib.zip!/src/a.py")
+NESTED_SEPARATOR = '!/'
+
+# Paths deeper than this are folded into the last node (guards recursion)
+MAX_PATH_PARTS = 64
+
+# Nested archives are kept in memory up to this size, then spill to disk
+SPOOL_MEMORY = 8 * 1024 * 1024
+
+# Entries smaller than this are never flagged by the compression ratio
+RATIO_MIN_SIZE = 1024 * 1024
+
+Entry = namedtuple('Entry', 'name size compressed is_dir handle')
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_kind(name: str) -> Optional[str]:
+    """Тип архіву за іменем файлу: 'zip', 'tar', 'gz', 'rar', '7z' або None"""
+    name = name.lower()
+    if name.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')):
+        return 'tar'
+    for ext, kind in (('.zip', 'zip'), ('.gz', 'gz'), ('.rar', 'rar'), ('.7z', '7z')):
+        if name.endswith(ext):
+            return kind
+    return None
+
+
+class _ZipReader:
+    def __init__(self, source):
+        self.archive = zipfile.ZipFile(source)
+
+    def entries(self):
+        for info in self.archive.infolist():
+            yield Entry(info.filename, info.file_size, info.compress_size, info.is_dir(), info)
+
+    def open(self, entry):
+        return self.archive.open(entry.handle)
+
+    def close(self):
+        self.archive.close()
+
+
+class _TarReader:
+    """Послідовний потік (r|*): учасника можна відкрити лише до переходу до наступного"""
+
+    def __init__(self, source):
+        if isinstance(source, str):
+            self.archive = tarfile.open(source, mode='r|*')
+        else:
+            self.archive = tarfile.open(fileobj=source, mode='r|*')
+
+    def entries(self):
+        for member in self.archive:
+            if member.isdir() or member.isfile():
+                yield Entry(member.name, member.size, None, member.isdir(), member)
+
+    def open(self, entry):
+        return self.archive.extractfile(entry.handle)
+
+    def close(self):
+        self.archive.close()
+
+
+class _GzipReader:
+    """Одиночний файл .gz: один запис з іменем без .gz"""
+
+    def __init__(self, source, name):
+        self.source = source
+        base = os.path.basename(name)
+        self.name = base[:-3] if base.lower().endswith('.gz') else base
+
+    def _size(self):
+        # ISIZE trailer: uncompressed size modulo 2**32
+        f = open(self.source, 'rb') if isinstance(self.source, str) else self.source
+        try:
+            f.seek(-4, os.SEEK_END)
+            size = struct.unpack('<I', f.read(4))[0]
+            compressed = f.tell()
+            f.seek(0)
+            return size, compressed
+        finally:
+            if isinstance(self.source, str):
+                f.close()
+
+    def entries(self):
+        size, compressed = self._size()
+        yield Entry(self.name, size, compressed, False, None)
+
+    def open(self, entry):
+        return gzip.open(self.source)
+
+    def close(self):
+        pass
+
+
+class _RarReader:
+    def __init__(self, source):
+        import rarfile
+        self.archive = rarfile.RarFile(source)
+
+    def entries(self):
+        for info in self.archive.infolist():
+            yield Entry(info.filename, info.file_size, info.compress_size, info.isdir(), info)
+
+    def open(self, entry):
+        # Needs the unrar/unar tool for compressed members
+        return self.archive.open(entry.handle)
+
+    def close(self):
+        self.archive.close()
+
+
+class _SevenZipReader:
+    def __init__(self, source):
+        import py7zr
+        self.archive = py7zr.SevenZipFile(source, 'r')
+
+    def entries(self):
+        for info in self.archive.list():
+            yield Entry(info.filename, info.uncompressed, info.compressed, info.is_directory, info.filename)
+
+    def open(self, entry):
+        # 7z has no per-member streams; one member is decoded into memory
+        from py7zr.io import BytesIOFactory
+        limit = settings.ARCHIVE_MAX_NESTED_SIZE
+        if entry.size > limit:
+            raise ArchiveError('Файл завеликий для читання з архіву 7z')
+        factory = BytesIOFactory(limit)
+        self.archive.reset()
+        self.archive.extract(targets=[entry.handle], factory=factory)
+        member = factory.get(entry.handle)
+        member.seek(0)
+        return io.BytesIO(member.read())
+
+    def close(self):
+        self.archive.close()
+
+
+def open_reader(source, name: str):
+    """
+    Відкриває архів для читання
+
+    Args:
+        source: Шлях до файлу або файловий об'єкт з seek()
+        name: Ім'я файлу (за ним визначається тип)
+    """
+    kind = archive_kind(name)
+    if kind == 'zip':
+        return _ZipReader(source)
+    if kind == 'tar':
+        return _TarReader(source)
+    if kind == 'gz':
+        # .gz may still be a tarball named without .tar
+        try:
+            reader = _TarReader(source)
+            if not isinstance(source, str):
+                source.seek(0)
+            return reader
+        except tarfile.TarError:
+            if not isinstance(source, str):
+                source.seek(0)
+            return _GzipReader(source, name)
+    if kind == 'rar':
+        return _RarReader(source)
+    if kind == '7z':
+        return _SevenZipReader(source)
+    raise ArchiveError(f'Непідтримуваний тип архіву: {name}')
+
+
+def spool(stream, limit: int):
+    """Копіює потік учасника у тимчасовий файл, не більше limit байтів"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    copied = 0
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        copied += len(chunk)
+        if copied > limit:
+            spooled.close()
+            raise ArchiveError('Вкладений архів завеликий')
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def _normalize(name: str) -> str:
+    return '/'.join(part for part in name.replace('\\', '/').split('/') if part not in ('', '.'))
+
+
+def member_name(member: str) -> str:
+    """Ім'я файлу учасника (останній компонент шляху з урахуванням вкладених архівів)"""
+    return member.split(NESTED_SEPARATOR)[-1].rsplit('/', 1)[-1]
+
+
+def read_member(file_path: str, member: str):
+    """
+    Читає один файл з архіву (можливо, вкладеного)
+
+    Args:
+        file_path: Шлях до архіву
+        member: Шлях учасника з дерева архіву ("lib.zip!/src/main.py")
+
+    Returns:
+        Тимчасовий файл з вмістом (SpooledTemporaryFile, закриває викликач)
+
+    Raises:
+        ArchiveError: Учасника не знайдено або він перевищує обмеження
+    """
+    parts = member.split(NESTED_SEPARATOR)
+    if len(parts) > settings.ARCHIVE_MAX_DEPTH + 1:
+        raise ArchiveError('Досягнуто максимальної глибини вкладення')
+    source, name = file_path, os.path.basename(file_path)
+    opened = None
+    try:
+        for part in parts:
+            wanted = _normalize(part)
+            reader = open_reader(source, name)
+            try:
+                # Zip/rar/7z look the name up in the central directory; tar
+                # streams up to the member and reads it before moving on
+                entry = next((e for e in reader.entries() if not e.is_dir and _normalize(e.name) == wanted), None)
+                if entry is None:
+                    raise ArchiveError('Файл не знайдено в архіві')
+                if (entry.compressed and entry.size > RATIO_MIN_SIZE
+                        and entry.size / entry.compressed > settings.ARCHIVE_MAX_RATIO):
+                    raise ArchiveError('Підозріло великий ступінь стиснення')
+                with reader.open(entry) as stream:
+                    spooled = spool(stream, settings.ARCHIVE_MAX_NESTED_SIZE)
+            finally:
+                reader.close()
+            if opened is not None:
+                opened.close()
+            opened = source = spooled
+            name = wanted
+        return opened
+    except Exception:
+        if opened is not None:
+            opened.close()
+        raise
+
+
+@contextmanager
+def extract_member(file_path: str, member: str):
+    """Зберігає учасника у тимчасовий файл з тим самим розширенням (для конвертерів, що приймають шлях)"""
+    suffix = os.path.splitext(member_name(member))[1]
+    with read_member(file_path, member) as source, tempfile.NamedTemporaryFile(suffix=suffix) as target:
+        while True:
+            chunk = source.read(64 * 1024)
+            if not chunk:
+                break
+            target.write(chunk)
+        target.flush()
+        yield target.name
+
+
+@timed('convert')
+def get_member_preview(file_path: str, member: str, render: Callable[[str, str], dict]) -> dict:
+    """
+    Прев'ю учасника архіву з кешу за (хеш архіву, шлях учасника)
+
+    Args:
+        file_path: Шлях до архіву
+        member: Шлях учасника
+        render: Функція (шлях до файлу, розширення) -> dict прев'ю
+
+    Returns:
+        dict: Результат render або {'error_message': ...}
+    """
+    from .utils import file_digest
+    file_ext = os.path.splitext(member_name(member))[1].lower()
+    key = f'archive_member:v{MEMBER_PREVIEW_VERSION}:{file_digest(file_path)}:' + hashlib.md5(member.encode()).hexdigest()
+    preview = cache.get(key)
+    if preview is None:
+        try:
+            with extract_member(file_path, member) as path:
+                preview = render(path, file_ext)
+        except Exception as e:
+            return {'error_message': f"Помилка при читанні файлу з архіву: {str(e)}"}
+        cache.set(key, preview, settings.ARCHIVE_CACHE_TIMEOUT)
+    return preview
+
+
+class _TreeBuilder:
+    def __init__(self, limits):
+        self.limits = limits
+        self.root = self._node('', '', True)
+        self.entries = 0
+        self.nodes = 0
+        self.total_size = 0
+        self.warnings = []
+        self.stopped = False
+
+    @staticmethod
+    def _node(name, member, is_dir):
+        return {'name': name, 'member': member, 'is_dir': is_dir, 'is_archive': False, 'size': 0,
+                'error': None, 'children': {}, 'hidden_files': 0, 'hidden_size': 0}
+
+    def warn(self, message):
+        if message not in self.warnings:
+            self.warnings.append(message)
+
+    def add(self, parent, parts, member, size, is_dir):
+        """Додає запис; повертає його вузол або None, якщо вузол не показується"""
+        if len(parts) > MAX_PATH_PARTS:
+            parts = parts[:MAX_PATH_PARTS - 1] + ['/'.join(parts[MAX_PATH_PARTS - 1:])]
+        node = parent
+        for depth, part in enumerate(parts):
+            last = depth == len(parts) - 1
+            child = node['children'].get(part)
+            if child is None:
+                if len(node['children']) >= self.limits['children'] or self.nodes >= self.limits['nodes']:
+                    # Directory or the whole tree is full: only count what is not shown
+                    if not is_dir:
+                        node['hidden_files'] += 1
+                        node['hidden_size'] += size
+                    return None
+                child = self._node(part, member if last else None, not last or is_dir)
+                node['children'][part] = child
+                self.nodes += 1
+            node = child
+        if not is_dir:
+            node['size'] = size
+        return node
+
+    def walk(self, reader, parent, prefix, depth, archive_size):
+        unpacked = 0
+        for entry in reader.entries():
+            if self.entries >= self.limits['entries']:
+                self.warn(f"Показано перші {self.limits['entries']} записів")
+                self.stopped = True
+                return
+            self.entries += 1
+            self.total_size += entry.size
+            unpacked += entry.size
+
+            # Whole-archive ratio: catches tar.gz bombs, where members have no compressed size
+            if archive_size and unpacked > RATIO_MIN_SIZE and unpacked > archive_size * self.limits['ratio']:
+                self.warn('Підозріло великий ступінь стиснення: можливо, це «архівна бомба»; перегляд зупинено')
+                self.stopped = True
+                return
+
+            parts = _normalize(entry.name).split('/')
+            if not parts[0]:
+                continue
+            member = prefix + '/'.join(parts)
+            node = self.add(parent, parts, member, entry.size, entry.is_dir)
+            if node is None or entry.is_dir or archive_kind(parts[-1]) is None:
+                continue
+
+            node['is_archive'] = True
+            if entry.compressed and entry.size > RATIO_MIN_SIZE and entry.size / entry.compressed > self.limits['ratio']:
+                node['error'] = 'Підозріло великий ступінь стиснення, вміст не показано'
+            elif depth >= self.limits['depth']:
+                node['error'] = 'Досягнуто максимальної глибини вкладення'
+            else:
+                self.walk_nested(reader, entry, node, member + NESTED_SEPARATOR, depth + 1)
+            if self.stopped:
+                return
+
+    def walk_nested(self, reader, entry, node, prefix, depth):
+        try:
+            with reader.open(entry) as stream:
+                nested = spool(stream, self.limits['nested_size'])
+            with nested:
+                size = nested.seek(0, os.SEEK_END)
+                nested.seek(0)
+                nested_reader = open_reader(nested, entry.name)
+                try:
+                    self.walk(nested_reader, node, prefix, depth, size)
+                finally:
+                    nested_reader.close()
+        except Exception as e:
+            node['error'] = f'Не вдалося прочитати вкладений архів: {e}'
+        node['is_dir'] = True
+
+    def finish(self, node):
+        """Перетворює словники дітей на відсортовані списки і рахує підсумки"""
+        children = sorted(node['children'].values(), key=lambda child: (not child['is_dir'], child['name'].lower()))
+        node['children'] = [self.finish(child) for child in children]
+        node['file_count'] = node['hidden_files'] + sum(
+            child['file_count'] if child['is_dir'] else 1 for child in node['children']
+        )
+        if node['is_dir'] and not node['is_archive']:
+            node['size'] = node['hidden_size'] + sum(child['size'] for child in node['children'])
+        return node
+
+
+def current_limits() -> dict:
+    return {
+        'depth': settings.ARCHIVE_MAX_DEPTH,
+        'entries': settings.ARCHIVE_MAX_ENTRIES,
+        'ratio': settings.ARCHIVE_MAX_RATIO,
+        'nested_size': settings.ARCHIVE_MAX_NESTED_SIZE,
+        'children': settings.ARCHIVE_MAX_CHILDREN,
+        'nodes': settings.ARCHIVE_MAX_NODES,
+    }
+
+
+def build_tree(file_path: str, name: Optional[str] = None, limits: Optional[dict] = None) -> dict:
+    """
+    Обходить архів і повертає дерево вмісту
+
+    Returns:
+        dict: children (вузли верхнього рівня), entries, total_size, warnings;
+        вузол - dict з name, member (шлях для перегляду), is_dir, is_archive,
+        size, file_count, error, children, hidden_files (не показані файли)
+    """
+    builder = _TreeBuilder(limits or current_limits())
+    reader = open_reader(file_path, name or file_path)
+    try:
+        builder.walk(reader, builder.root, '', 0, os.path.getsize(file_path))
+    finally:
+        reader.close()
+    root = builder.finish(builder.root)
+    return {
+        'children': root['children'],
+        'hidden_files': root['hidden_files'],
+        'file_count': root['file_count'],
+        'entries': builder.entries,
+        'total_size': builder.total_size,
+        'warnings': builder.warnings,
+    }
+
+
+@timed('convert')
+def get_archive_tree(file_path: str) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Повертає дерево вмісту архіву (з кешу за хешем файлу)
+
+    Args:
+        file_path: Шлях до архіву; тип визначається за іменем (.zip, .tar.gz, ...)
+
+    Returns:
+        Tuple[Optional[dict], Optional[str]]: (дерево з build_tree, повідомлення про помилку)
+    """
+    from .utils import file_digest
+    limits = current_limits()
+    try:
+        digest = file_digest(file_path)
+        limits_key = hashlib.md5(repr(sorted(limits.items())).encode()).hexdigest()[:8]
+        key = f'archive_tree:v{TREE_VERSION}:{digest}:{limits_key}'
+        tree = cache.get(key)
+        metrics.cache_lookup('archive_tree', tree is not None)
+        if tree is None:
+            tree = build_tree(file_path, os.path.basename(file_path), limits)
+            cache.set(key, tree, settings.ARCHIVE_CACHE_TIMEOUT)
+        return tree, None
+    except Exception as e:
+        return None, f"Помилка при читанні архіву: {str(e)}"
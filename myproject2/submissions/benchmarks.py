@@ -0,0 +1,246 @@
+"""
+Корпус документів для бенчмарку конвертерів попереднього перегляду
+
+Вартість кожного convert_* з utils.py залежить від різних речей: рядків
+і стовпців таблиці, кількості слайдів, повторених комірок, зображень.
+Тому корпус - це не «типові файли», а розгортки за розміром для кожного
+формату (мала, середня, велика робота) і патологічні випадки, які
+трапляються в реальних файлах: ODS, де LibreOffice доповнює кожен рядок
+однією коміркою з number-columns-repeated до ширини аркуша (аж до
+мільйона стовпців), XLSX з однією коміркою в останньому стовпці, що
+роздуває max_column, документи з великою кількістю зображень.
+
+Файли генеруються детерміновано (зерно - назва випадку) і зберігаються в
+каталозі корпусу з номером версії: коли змінюються генератори, версія
+збільшується, і старі результати не порівнюються з новими файлами.
+"""
+import io
+import os
+import random
+import subprocess
+
+from django.conf import settings
+
+from . import synthetic
+
+CORPUS_VERSION = 1
+
+# Conversion function in utils.py for each format
+CONVERTERS = {
+    '.docx': 'convert_docx_to_html',
+    '.xlsx': 'convert_xlsx_to_html',
+    '.pptx': 'convert_pptx_to_html',
+    '.odt': 'convert_odt_to_html',
+    '.ods': 'convert_ods_to_html',
+    '.odp': 'convert_odp_to_html',
+}
+
+
+def git_revision():
+    """(коміт, чи є незакомічені зміни) або (None, None) поза git"""
+    cwd = str(settings.BASE_DIR)
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def _picture(rng: random.Random) -> io.BytesIO:
+    return io.BytesIO(synthetic.make_jpg(rng))
+
+
+def build_docx(rng: random.Random, paragraphs: int, table_rows: int = 0, table_cols: int = 0,
+               images: int = 0) -> bytes:
+    from docx import Document
+    from docx.shared import Cm
+
+    document = Document()
+    document.add_heading(synthetic.sentence(rng, 4).rstrip('.'), level=1)
+    for n in range(paragraphs):
+        if n % 20 == 0:
+            document.add_heading(synthetic.sentence(rng, 3).rstrip('.'), level=2)
+        document.add_paragraph(synthetic.paragraph(rng))
+    if table_rows:
+        table = document.add_table(rows=table_rows, cols=table_cols)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = str(rng.randint(1, 12))
+    for _ in range(images):
+        document.add_picture(_picture(rng), width=Cm(12))
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def build_xlsx(rng: random.Random, rows: int, cols: int, styled: bool = False, far_cell: bool = False) -> bytes:
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill
+
+    workbook = Workbook()
+    sheet = workbook.active
+    bold = Font(bold=True, color='FF1F4E79')
+    fill = PatternFill('solid', start_color='FFFFF2CC')
+    for row in range(1, rows + 1):
+        for col in range(1, cols + 1):
+            cell = sheet.cell(row=row, column=col, value=rng.randint(1, 12))
+            if styled:
+                cell.font = bold
+                cell.fill = fill
+    if far_cell:
+        # A stray space in XFD1: max_column becomes 16384 for the whole sheet
+        sheet.cell(row=1, column=16384, value=' ')
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def build_pptx(rng: random.Random, slides: int, images: int = 0) -> bytes:
+    from pptx import Presentation
+    from pptx.util import Cm
+
+    presentation = Presentation()
+    for n in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = synthetic.sentence(rng, 3).rstrip('.')
+        body = slide.placeholders[1].text_frame
+        body.text = synthetic.sentence(rng, 8)
+        for _ in range(3):
+            body.add_paragraph().text = synthetic.sentence(rng, 8)
+        if n < images:
+            slide.shapes.add_picture(_picture(rng), Cm(14), Cm(8), width=Cm(10))
+    out = io.BytesIO()
+    presentation.save(out)
+    return out.getvalue()
+
+
+def build_odt(rng: random.Random, paragraphs: int) -> bytes:
+    from odf.opendocument import OpenDocumentText
+    from odf.text import H, P
+
+    document = OpenDocumentText()
+    for n in range(paragraphs):
+        if n % 20 == 0:
+            document.text.addElement(H(outlinelevel=2, text=synthetic.sentence(rng, 3).rstrip('.')))
+        document.text.addElement(P(text=synthetic.paragraph(rng)))
+    out = io.BytesIO()
+    document.write(out)
+    return out.getvalue()
+
+
+def build_ods(rng: random.Random, rows: int, cols: int, repeated_columns: int = 0) -> bytes:
+    from odf.opendocument import OpenDocumentSpreadsheet
+    from odf.table import Table, TableCell, TableRow
+    from odf.text import P
+
+    document = OpenDocumentSpreadsheet()
+    table = Table(name='Оцінки')
+    for _ in range(rows):
+        row = TableRow()
+        for _ in range(cols):
+            value = rng.randint(1, 12)
+            cell = TableCell(valuetype='float', value=value)
+            cell.addElement(P(text=str(value)))
+            row.addElement(cell)
+        if repeated_columns:
+            # What LibreOffice writes to pad a row to the sheet width
+            row.addElement(TableCell(numbercolumnsrepeated=repeated_columns))
+        table.addElement(row)
+    document.spreadsheet.addElement(table)
+    out = io.BytesIO()
+    document.write(out)
+    return out.getvalue()
+
+
+def build_odp(rng: random.Random, slides: int) -> bytes:
+    from odf.draw import Frame, Page, TextBox
+    from odf.opendocument import OpenDocumentPresentation
+    from odf.style import MasterPage, PageLayout
+    from odf.text import P
+
+    document = OpenDocumentPresentation()
+    layout = PageLayout(name='layout')
+    document.automaticstyles.addElement(layout)
+    master = MasterPage(name='master', pagelayoutname=layout)
+    document.masterstyles.addElement(master)
+    for _ in range(slides):
+        page = Page(masterpagename=master)
+        document.presentation.addElement(page)
+        for y in ('1cm', '5cm'):
+            frame = Frame(width='24cm', height='3cm', x='1cm', y=y)
+            box = TextBox()
+            box.addElement(P(text=synthetic.sentence(rng, 8)))
+            frame.addElement(box)
+            page.addElement(frame)
+    out = io.BytesIO()
+    document.write(out)
+    return out.getvalue()
+
+
+# name -> (format, builder, parameters); the name is also the file name and the random seed
+CASES = {
+    'docx-10p': ('.docx', build_docx, {'paragraphs': 10}),
+    'docx-200p': ('.docx', build_docx, {'paragraphs': 200}),
+    'docx-2000p': ('.docx', build_docx, {'paragraphs': 2000}),
+    'docx-table-50x5': ('.docx', build_docx, {'paragraphs': 5, 'table_rows': 50, 'table_cols': 5}),
+    'docx-table-1000x8': ('.docx', build_docx, {'paragraphs': 5, 'table_rows': 1000, 'table_cols': 8}),
+    'docx-20-images': ('.docx', build_docx, {'paragraphs': 20, 'images': 20}),
+
+    'xlsx-20x8': ('.xlsx', build_xlsx, {'rows': 20, 'cols': 8}),
+    'xlsx-1000x20': ('.xlsx', build_xlsx, {'rows': 1000, 'cols': 20}),
+    'xlsx-20000x20': ('.xlsx', build_xlsx, {'rows': 20000, 'cols': 20}),
+    'xlsx-100x500': ('.xlsx', build_xlsx, {'rows': 100, 'cols': 500}),
+    'xlsx-styled-100x30': ('.xlsx', build_xlsx, {'rows': 100, 'cols': 30, 'styled': True}),
+    'xlsx-far-cell': ('.xlsx', build_xlsx, {'rows': 100, 'cols': 8, 'far_cell': True}),
+
+    'pptx-5s': ('.pptx', build_pptx, {'slides': 5}),
+    'pptx-50s': ('.pptx', build_pptx, {'slides': 50}),
+    'pptx-300s': ('.pptx', build_pptx, {'slides': 300}),
+    'pptx-20-images': ('.pptx', build_pptx, {'slides': 20, 'images': 20}),
+
+    'odt-10p': ('.odt', build_odt, {'paragraphs': 10}),
+    'odt-1000p': ('.odt', build_odt, {'paragraphs': 1000}),
+    'odt-10000p': ('.odt', build_odt, {'paragraphs': 10000}),
+
+    'ods-20x8': ('.ods', build_ods, {'rows': 20, 'cols': 8}),
+    'ods-1000x20': ('.ods', build_ods, {'rows': 1000, 'cols': 20}),
+    'ods-20000x20': ('.ods', build_ods, {'rows': 20000, 'cols': 20}),
+    'ods-padded-50x8': ('.ods', build_ods, {'rows': 50, 'cols': 8, 'repeated_columns': 16384 - 8}),
+    'ods-1m-columns': ('.ods', build_ods, {'rows': 1, 'cols': 3, 'repeated_columns': 1048576 - 3}),
+
+    'odp-5s': ('.odp', build_odp, {'slides': 5}),
+    'odp-50s': ('.odp', build_odp, {'slides': 50}),
+    'odp-300s': ('.odp', build_odp, {'slides': 300}),
+}
+
+
+def corpus_dir(root=None) -> str:
+    return os.path.join(root or os.path.join(settings.BASE_DIR, 'benchmarks', 'corpus'), f'v{CORPUS_VERSION}')
+
+
+def build_corpus(directory: str, names=None) -> dict:
+    """
+    Створює відсутні файли корпусу
+
+    Args:
+        directory: Каталог версії корпусу (corpus_dir)
+        names: Які випадки потрібні (за замовчуванням усі)
+
+    Returns:
+        dict: назва випадку -> шлях до файлу
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name in names or CASES:
+        extension, builder, params = CASES[name]
+        path = os.path.join(directory, name + extension)
+        if not os.path.exists(path):
+            content = builder(random.Random(name), **params)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(path + '.tmp', path)
+        paths[name] = path
+    return paths
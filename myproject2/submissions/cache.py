@@ -0,0 +1,154 @@
+"""
+Версійований кеш відрендерених фрагментів (стрічка робіт, списки класів)
+
+Кожен простір імен має лічильник версії. Ключ фрагмента містить поточну
+версію, тому інвалідація - це просто збільшення лічильника (див. signals.py):
+старі записи більше ніхто не читає, і вони зникають за таймаутом. Версія -
+час у наносекундах, тож лічильник, витіснений з кешу, не повертається до
+значення, під яким уже лежать старі фрагменти.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics, schools
+
+FEED = 'feed'
+CLASSES = 'classes'
+
+NAMESPACES = (FEED, CLASSES)
+
+FRAGMENT_TIMEOUT = 60 * 60
+
+# Hit/miss counters are buffered per process and added to the shared cache
+# at most every STATS_FLUSH_INTERVAL seconds, so a hit costs no cache write
+STATS_FLUSH_INTERVAL = 5
+
+_stats_lock = threading.Lock()
+_pending_stats = Counter()
+_last_flush = time.monotonic()
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'FRAGMENT_CACHE_ENABLED', True)
+
+
+def _incr(key: str, delta: int = 1) -> None:
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Key is missing (first use or evicted)
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def flush_stats() -> None:
+    """Переносить локальні лічильники влучань у спільний кеш"""
+    global _last_flush
+    with _stats_lock:
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+        _last_flush = time.monotonic()
+    for key, delta in pending.items():
+        _incr(key, delta)
+
+
+def _record(namespace: str, kind: str) -> None:
+    metrics.cache_lookup(f'fragment_{namespace}', kind == 'hits')
+    with _stats_lock:
+        _pending_stats[f'stats:{namespace}:{kind}'] += 1
+        due = time.monotonic() - _last_flush >= STATS_FLUSH_INTERVAL
+    if due:
+        flush_stats()
+
+
+def _scope(alias: Optional[str]) -> str:
+    # Each school database has its own feed and class list
+    return alias or schools.current_alias()
+
+
+def _next_version(current: Optional[int] = None) -> int:
+    # Nanoseconds since the epoch: a version key culled from the cache comes
+    # back larger than any value it had, so fragments of old versions stay unreachable
+    version = time.time_ns()
+    return version if current is None or version > current else current + 1
+
+
+def get_version(namespace: str, alias: Optional[str] = None) -> int:
+    """Повертає поточну версію простору імен"""
+    key = f'version:{_scope(alias)}:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        seed = _next_version()
+        cache.add(key, seed, timeout=None)
+        version = cache.get(key, seed)
+    return version
+
+
+def bump_version(namespace: str, alias: Optional[str] = None) -> None:
+    """Інвалідує всі фрагменти простору імен"""
+    key = f'version:{_scope(alias)}:{namespace}'
+    # A plain set instead of incr: incr is read-modify-write on FileBasedCache,
+    # while each concurrent bump here still writes a value never used before
+    cache.set(key, _next_version(cache.get(key)), timeout=None)
+
+
+def get_or_render(namespace: str, parts: Iterable, render: Callable[[], object],
+                  timeout: int = FRAGMENT_TIMEOUT):
+    """
+    Повертає фрагмент з кешу або обчислює його через render() і зберігає
+
+    Args:
+        namespace: Простір імен (FEED, CLASSES)
+        parts: Параметри, від яких залежить фрагмент (сторінка, пошук...)
+        render: Функція, що будує фрагмент при промаху кешу
+    """
+    if not is_enabled():
+        return render()
+
+    digest = hashlib.md5(repr(tuple(parts)).encode('utf-8')).hexdigest()
+    key = f'fragment:{_scope(None)}:{namespace}:v{get_version(namespace)}:{digest}'
+
+    value = cache.get(key)
+    if value is not None:
+        _record(namespace, 'hits')
+        return value
+
+    _record(namespace, 'misses')
+    value = render()
+    cache.set(key, value, timeout)
+    return value
+
+
+def get_stats() -> dict:
+    """Статистика влучань у кеш по просторах імен (спільна для всіх воркерів)"""
+    flush_stats()
+    stats = {}
+    for namespace in NAMESPACES:
+        hits = cache.get(f'stats:{namespace}:hits', 0)
+        misses = cache.get(f'stats:{namespace}:misses', 0)
+        total = hits + misses
+        stats[namespace] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'version': get_version(namespace),
+        }
+    return stats
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _pending_stats.clear()
+    cache.delete_many([f'stats:{ns}:{kind}' for ns in NAMESPACES for kind in ('hits', 'misses')])
+
+
+def get_class_groups() -> list:
+    """Список класів (ClassGroup) з кешу"""
+    from .models import ClassGroup
+    return get_or_render(CLASSES, ('all',), lambda: list(ClassGroup.objects.all()))
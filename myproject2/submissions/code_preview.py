@@ -0,0 +1,282 @@
+"""
+Перегляд коду й текстових файлів: підсвічування на сервері і посторінкове
+читання великих файлів
+
+Кодування визначається за BOM, перевіркою UTF-8 і частотами кириличних
+літер (cp1251, koi8-u, cp866), тож старі файли з Windows читаються без
+«кракозябр» і без помилки декодування.
+
+Файл ділиться на сторінки по PAGE_LINES рядків. Один прохід по файлу
+будує індекс: зміщення в байтах початку кожної сторінки. Сторінка
+читається seek-ом до зміщення, тож 30-мегабайтний лог не читається цілком
+ні для першої, ні для сотої сторінки. Індекс і підсвічені сторінки
+кешуються за SHA-256 файлу (utils.file_digest).
+"""
+import codecs
+import os
+from array import array
+from typing import Optional, Tuple
+
+from django.core.cache import cache
+from django.utils.html import escape
+
+from . import metrics
+from .profiling import timed
+from .utils import file_digest
+
+# Bump when the page format changes so stale cache entries are ignored
+PREVIEW_VERSION = 1
+
+PAGE_LINES = 1000
+
+# A page of very long lines (minified JS, one-line JSON) is cut at this size
+PAGE_MAX_BYTES = 1024 * 1024
+
+# Longer lines are shortened in the preview
+MAX_LINE_CHARS = 5000
+
+# Pygments gets slow on huge inputs; larger pages are shown as plain text
+HIGHLIGHT_MAX_CHARS = 200_000
+
+# Bytes inspected to detect the encoding
+SAMPLE_SIZE = 64 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+STYLE = 'one-dark'
+
+# Checked in this order: the UTF-32 LE BOM starts with the UTF-16 LE one
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+SINGLE_BYTE_ENCODINGS = ('cp1251', 'koi8-u', 'cp866')
+
+# Most frequent Ukrainian and Russian letters; a wrong code page turns them
+# into rarer letters, box-drawing characters or punctuation
+FREQUENT_LETTERS = frozenset('оаеинтірвслкмдпуяьзбгчйхжшюцщєїфыэ')
+
+_css = None
+
+
+def detect_encoding(sample: bytes) -> Tuple[Optional[str], int]:
+    """
+    Визначає кодування тексту за першими байтами файлу
+
+    Args:
+        sample: Початок файлу
+
+    Returns:
+        tuple: (кодування, довжина BOM); кодування None для двійкових файлів
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, len(bom)
+
+    if b'\0' in sample:
+        return None, 0
+
+    try:
+        # Incremental decoder: a character cut at the end of the sample is fine
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8', 0
+    except UnicodeDecodeError:
+        pass
+
+    best, best_score = 'cp1252', 0
+    high_bytes = sum(1 for byte in sample if byte >= 0x80)
+    for encoding in SINGLE_BYTE_ENCODINGS:
+        text = sample.decode(encoding, errors='replace').lower()
+        score = 0
+        for i, char in enumerate(text):
+            if char in FREQUENT_LETTERS:
+                # Accented Latin letters decoded as Cyrillic end up inside
+                # otherwise Latin words ("mьnchen"); real Cyrillic does not
+                neighbours = text[i - 1:i] + text[i + 1:i + 2]
+                score += -1 if any('a' <= c <= 'z' for c in neighbours) else 1
+        if score > best_score:
+            best, best_score = encoding, score
+    # Mostly not Cyrillic: some Western European code page
+    if best_score < high_bytes * 0.6:
+        best = 'cp1252'
+    return best, 0
+
+
+def _newline(encoding: str) -> bytes:
+    return '\n'.encode(encoding)
+
+
+def build_index(file_path: str) -> dict:
+    """
+    Один прохід по файлу: кодування, кількість рядків і зміщення сторінок
+
+    Returns:
+        dict: {'encoding', 'size', 'lines', 'pages': array зміщень початку сторінок}
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        encoding, bom = detect_encoding(f.read(SAMPLE_SIZE))
+        index = {'encoding': encoding, 'size': size, 'lines': 0, 'pages': array('Q', [bom])}
+        if encoding is None:
+            return index
+
+        newline = _newline(encoding)
+        unit = len(newline)
+        pages = index['pages']
+        lines = 0
+        last_byte = b''
+        base = bom
+        f.seek(bom)
+        # CHUNK_SIZE is a multiple of 4, so UTF-16/32 code units never
+        # straddle a chunk boundary
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            count = chunk.count(newline) if unit == 1 else None
+            if count is not None and (lines % PAGE_LINES) + count < PAGE_LINES:
+                # Fast path: no page starts in this chunk
+                lines += count
+            else:
+                pos = chunk.find(newline)
+                while pos != -1:
+                    if pos % unit == 0:
+                        lines += 1
+                        if lines % PAGE_LINES == 0:
+                            pages.append(base + pos + unit)
+                    pos = chunk.find(newline, pos + 1)
+            base += len(chunk)
+            last_byte = chunk[-unit:]
+
+    # The last line usually has no newline after it
+    if base > bom and last_byte != newline:
+        lines += 1
+    elif pages[-1] == size and len(pages) > 1:
+        # File ends exactly at a page boundary: no empty last page
+        pages.pop()
+    index['lines'] = lines
+    return index
+
+
+def get_index(file_path: str, digest: Optional[str] = None) -> dict:
+    digest = digest or file_digest(file_path)
+    key = f'code_index:v{PREVIEW_VERSION}:{digest}'
+    index = cache.get(key)
+    if index is None:
+        index = build_index(file_path)
+        cache.set(key, index, CACHE_TIMEOUT)
+    return index
+
+
+def _read_page(file_path: str, index: dict, page: int) -> Tuple[list, bool]:
+    pages = index['pages']
+    start = pages[page]
+    end = pages[page + 1] if page + 1 < len(pages) else index['size']
+    truncated = end - start > PAGE_MAX_BYTES
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(min(end - start, PAGE_MAX_BYTES))
+    text = data.decode(index['encoding'], errors='replace')
+    lines = text.split('\n')
+    if not truncated and lines and lines[-1] == '' and end - start > 0:
+        # Trailing newline of the page, not an extra empty line
+        lines.pop()
+    result = []
+    for line in lines:
+        line = line.rstrip('\r')
+        if len(line) > MAX_LINE_CHARS:
+            line = line[:MAX_LINE_CHARS] + f' … (+{len(line) - MAX_LINE_CHARS} символів)'
+        result.append(line)
+    return result, truncated
+
+
+def _highlight(lines: list, name: str, first_line: int) -> str:
+    text = '\n'.join(lines) + '\n'
+    try:
+        from pygments import highlight
+        from pygments.formatters import HtmlFormatter
+        from pygments.lexers import TextLexer, get_lexer_for_filename
+        from pygments.util import ClassNotFound
+    except ImportError:
+        return '<pre class="highlight">' + escape(text) + '</pre>'
+
+    lexer = TextLexer()
+    if len(text) <= HIGHLIGHT_MAX_CHARS:
+        try:
+            lexer = get_lexer_for_filename(name, stripnl=False, ensurenl=False)
+        except ClassNotFound:
+            pass
+    formatter = HtmlFormatter(
+        linenos='inline',
+        linenostart=first_line,
+        lineanchors='L',
+        anchorlinenos=True,
+        cssclass='highlight',
+        style=STYLE,
+    )
+    return highlight(text, lexer, formatter)
+
+
+@timed('convert')
+def get_page(file_path: str, page: int = 0, name: Optional[str] = None) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Повертає підсвічену сторінку файлу
+
+    Args:
+        file_path: Шлях до файлу
+        page: Номер сторінки з нуля
+        name: Ім'я файлу для вибору мови (типово - з шляху)
+
+    Returns:
+        tuple: (сторінка, повідомлення про помилку). Сторінка - dict з
+        html, page, pages, first_line, last_line, lines, encoding, truncated
+    """
+    name = name or os.path.basename(file_path)
+    try:
+        digest = file_digest(file_path)
+        index = get_index(file_path, digest)
+    except OSError as e:
+        return None, f"Помилка при читанні файлу: {str(e)}"
+
+    if index['encoding'] is None:
+        return None, "Файл схожий на двійковий, попередній перегляд недоступний"
+
+    pages = len(index['pages'])
+    page = max(0, min(page, pages - 1))
+    ext = os.path.splitext(name)[1].lower()
+    key = f'code_page:v{PREVIEW_VERSION}:{digest}:{ext}:{page}'
+    result = cache.get(key)
+    metrics.cache_lookup('code_page', result is not None)
+    if result is None:
+        try:
+            lines, truncated = _read_page(file_path, index, page)
+        except OSError as e:
+            return None, f"Помилка при читанні файлу: {str(e)}"
+        first_line = page * PAGE_LINES + 1
+        result = {
+            'html': _highlight(lines, name, first_line),
+            'page': page,
+            'pages': pages,
+            'first_line': first_line,
+            'last_line': first_line + len(lines) - 1,
+            'lines': index['lines'],
+            'encoding': index['encoding'],
+            'truncated': truncated,
+        }
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result, None
+
+
+def stylesheet() -> str:
+    """CSS стилю підсвічування (однаковий для всіх сторінок)"""
+    global _css
+    if _css is None:
+        try:
+            from pygments.formatters import HtmlFormatter
+            _css = HtmlFormatter(style=STYLE).get_style_defs('.highlight')
+        except ImportError:
+            _css = ''
+    return _css
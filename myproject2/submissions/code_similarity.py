@@ -0,0 +1,335 @@
+"""
+Пошук схожого коду (нормалізовані токени + winnowing)
+
+Код розбивається на токени без коментарів і пробілів; у Python і JS
+імена змінних/функцій замінюються на V, числа на N, рядки на S, тож
+перейменування змінних не приховує копію. Хеші k-грам з K токенів
+проріджуються winnowing (мінімум у кожному вікні з W хешів): збіг
+довжиною від K + W - 1 токенів гарантовано дає спільний відбиток.
+
+Відбитки зберігаються в CodeFingerprint при збереженні роботи, тож
+перевірка нової роботи - один запит по індексу хешів у межах класу.
+"""
+import keyword
+import re
+from collections import Counter, defaultdict, namedtuple
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count
+
+from . import schools
+from .similarity import get_threshold
+
+K = 8
+W = 8
+
+# Files with fewer fingerprints are too small to judge
+MIN_FINGERPRINTS = 5
+
+# Hashes present in more than this share of a class's code files are
+# treated as shared boilerplate (teacher's template, `if __name__ ...`)
+COMMON_SHARE = 0.5
+COMMON_MIN_FILES = 4
+
+# Highlight colours cycled over matching regions in the side-by-side view
+REGION_COLORS = 6
+
+LANGUAGES = {'.py': 'python', '.js': 'js', '.html': 'markup', '.css': 'css'}
+
+_COMMENTS = {
+    'python': r'\#[^\n]*',
+    'js': r'//[^\n]*|/\*[\s\S]*?\*/',
+    'css': r'/\*[\s\S]*?\*/',
+    'markup': r'<!--[\s\S]*?-->',
+}
+_STRINGS = (
+    r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|'
+    r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`'
+)
+_NAMES = {
+    'python': r'[^\W\d]\w*',
+    'js': r'[^\W\d][\w$]*|\$[\w$]*',
+    'css': r'-?[^\W\d][\w-]*',
+    'markup': r'[^\W\d][\w-]*',
+}
+_TOKEN_RES = {
+    language: re.compile(
+        rf'(?P<comment>{_COMMENTS[language]})|(?P<string>{_STRINGS})|'
+        rf'(?P<number>\d[\w.]*)|(?P<name>{_NAMES[language]})|(?P<op>\S)'
+    )
+    for language in LANGUAGES.values()
+}
+
+_PYTHON_KEEP = set(keyword.kwlist) | {
+    'print', 'input', 'len', 'range', 'int', 'str', 'float', 'list', 'dict', 'set', 'tuple',
+    'enumerate', 'zip', 'sum', 'min', 'max', 'sorted', 'open', 'self', 'append', 'split', 'join',
+}
+_JS_KEEP = {
+    'var', 'let', 'const', 'function', 'return', 'if', 'else', 'for', 'while', 'do', 'break',
+    'continue', 'new', 'this', 'class', 'extends', 'true', 'false', 'null', 'undefined', 'typeof',
+    'of', 'in', 'switch', 'case', 'default', 'try', 'catch', 'finally', 'throw', 'async', 'await',
+    'document', 'console', 'log', 'window', 'length', 'push', 'addEventListener',
+}
+# Identifiers are abstracted only where renaming them is the usual disguise
+_KEEP_NAMES = {'python': _PYTHON_KEEP, 'js': _JS_KEEP}
+
+Token = namedtuple('Token', 'text line')
+Fingerprint = namedtuple('Fingerprint', 'hash start_line end_line')
+
+
+def is_code(submission) -> bool:
+    return bool(submission.file) and submission.get_file_extension() in LANGUAGES
+
+
+def tokenize(source: str, file_ext: str) -> List[Token]:
+    """Нормалізовані токени з номерами рядків (коментарі відкидаються)"""
+    language = LANGUAGES[file_ext]
+    keep = _KEEP_NAMES.get(language)
+    tokens = []
+    line, position = 1, 0
+    for match in _TOKEN_RES[language].finditer(source):
+        line += source.count('\n', position, match.start())
+        position = match.start()
+        kind = match.lastgroup
+        if kind == 'comment':
+            continue
+        if kind == 'string':
+            text = 'S'
+        elif kind == 'number':
+            text = 'N'
+        elif kind == 'name':
+            text = match.group()
+            if keep is not None and text not in keep:
+                text = 'V'
+            elif keep is None:
+                text = text.casefold()
+        else:
+            text = match.group()
+        tokens.append(Token(text, line))
+    return tokens
+
+
+def _hash(tokens: List[Token]) -> int:
+    data = '\x1f'.join(token.text for token in tokens).encode()
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), 'little', signed=True)
+
+
+def winnow(tokens: List[Token]) -> List[Fingerprint]:
+    """Відбитки файлу: мінімальний хеш у кожному вікні з W k-грам"""
+    if len(tokens) < K:
+        return []
+    hashes = [_hash(tokens[i:i + K]) for i in range(len(tokens) - K + 1)]
+    selected = []
+    last = -1
+    for start in range(max(1, len(hashes) - W + 1)):
+        window = hashes[start:start + W]
+        # Rightmost minimum, so equal minima in overlapping windows are not repeated
+        offset = min(range(len(window)), key=lambda i: (window[i], -i))
+        position = start + offset
+        if position != last:
+            selected.append(Fingerprint(hashes[position], tokens[position].line, tokens[position + K - 1].line))
+            last = position
+    return selected
+
+
+def fingerprint_file(file_path: str, file_ext: str) -> List[Fingerprint]:
+    from .utils import MAX_EXTRACTED_TEXT
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        source = f.read(MAX_EXTRACTED_TEXT)
+    return winnow(tokenize(source, file_ext))
+
+
+def index_submission(submission, using: str = 'default', force: bool = False) -> None:
+    """Оновлює відбитки коду роботи, якщо змінився файл (або force)"""
+    from .models import CodeFile, CodeFingerprint
+
+    file_name = submission.file.name if submission.file else ''
+    current = CodeFile.objects.using(using).filter(submission_id=submission.pk).values_list(
+        'file_name', flat=True).first()
+    if current == file_name and not force:
+        return
+    if current is None and not is_code(submission):
+        return
+
+    hashes = set()
+    if is_code(submission):
+        with schools.using_school(schools.slug_for_alias(using)):
+            try:
+                hashes = {fp.hash for fp in fingerprint_file(submission.file.path, submission.get_file_extension())}
+            except OSError:
+                pass
+
+    with transaction.atomic(using=using):
+        CodeFingerprint.objects.using(using).filter(submission_id=submission.pk).delete()
+        CodeFile.objects.using(using).update_or_create(
+            submission_id=submission.pk,
+            defaults={'file_name': file_name, 'fingerprint_count': len(hashes)}
+        )
+        CodeFingerprint.objects.using(using).bulk_create(
+            [CodeFingerprint(submission_id=submission.pk, hash=value) for value in hashes], batch_size=500
+        )
+
+
+def _class_code_files(class_group_id: int, using: str) -> Dict[int, int]:
+    """id роботи -> кількість відбитків для всіх файлів коду класу"""
+    from .models import CodeFile
+    return dict(CodeFile.objects.using(using).filter(
+        submission__class_group_id=class_group_id, fingerprint_count__gte=MIN_FINGERPRINTS
+    ).values_list('submission_id', 'fingerprint_count'))
+
+
+def _common_hashes(hash_files: Dict[int, set], file_count: int) -> set:
+    if file_count < COMMON_MIN_FILES:
+        return set()
+    return {value for value, files in hash_files.items() if len(files) > file_count * COMMON_SHARE}
+
+
+def _score(shared: int, first_count: int, second_count: int) -> float:
+    # Share of the smaller file found in the other one: copying a solution
+    # and adding a few lines still scores high
+    return shared / min(first_count, second_count)
+
+
+def find_similar(submission, using: Optional[str] = None, threshold: Optional[float] = None) -> List[Tuple[object, float]]:
+    """
+    Знаходить роботи класу зі схожим кодом
+
+    Returns:
+        List[Tuple[Submission, float]]: (робота, частка спільних відбитків 0..1),
+        від найсхожішої
+    """
+    from .models import CodeFingerprint, Submission
+    using = using or submission._state.db or 'default'
+    if threshold is None:
+        threshold = get_threshold(submission.class_group)
+
+    files = _class_code_files(submission.class_group_id, using)
+    own_count = files.get(submission.pk)
+    if not own_count:
+        return []
+    own = CodeFingerprint.objects.using(using).filter(submission_id=submission.pk).values('hash')
+    rows = CodeFingerprint.objects.using(using).filter(
+        hash__in=own, submission__class_group_id=submission.class_group_id
+    ).values_list('hash', 'submission_id')
+
+    hash_files = defaultdict(set)
+    for value, submission_id in rows:
+        if submission_id in files:
+            hash_files[value].add(submission_id)
+    common = _common_hashes(hash_files, len(files))
+
+    shared = Counter(
+        submission_id
+        for value, submission_ids in hash_files.items() if value not in common
+        for submission_id in submission_ids if submission_id != submission.pk
+    )
+    scores = {pk: _score(count, own_count, files[pk]) for pk, count in shared.items()}
+    scores = {pk: score for pk, score in scores.items() if score >= threshold}
+    matches = Submission.objects.using(using).filter(id__in=scores).select_related('class_group')
+    return sorted(((match, scores[match.pk]) for match in matches), key=lambda item: -item[1])
+
+
+def similar_pairs(class_group, using: Optional[str] = None, threshold: Optional[float] = None) -> List[Tuple[object, object, float]]:
+    """Усі пари робіт класу зі схожим кодом, від найсхожішої"""
+    from .models import CodeFingerprint, Submission
+    using = using or class_group._state.db or 'default'
+    if threshold is None:
+        threshold = get_threshold(class_group)
+
+    files = _class_code_files(class_group.pk, using)
+    hash_files = defaultdict(set)
+    rows = CodeFingerprint.objects.using(using).filter(submission_id__in=list(files)).values_list('hash', 'submission_id')
+    for value, submission_id in rows:
+        hash_files[value].add(submission_id)
+    common = _common_hashes(hash_files, len(files))
+
+    shared = Counter()
+    for value, submission_ids in hash_files.items():
+        if value in common or len(submission_ids) < 2:
+            continue
+        members = sorted(submission_ids)
+        shared.update((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+
+    scored = [(a, b, _score(count, files[a], files[b])) for (a, b), count in shared.items()]
+    scored = [item for item in scored if item[2] >= threshold]
+    submissions = Submission.objects.using(using).in_bulk({pk for a, b, _ in scored for pk in (a, b)})
+    scored.sort(key=lambda item: -item[2])
+    return [(submissions[a], submissions[b], score) for a, b, score in scored]
+
+
+def compare(first, second) -> Tuple[List[dict], List[dict], float, Tuple[bool, bool]]:
+    """
+    Порівняння двох файлів для перегляду поруч
+
+    Як і при індексації, читається не більше MAX_EXTRACTED_TEXT символів
+    кожного файлу: підсвітка збігається з відбитками звіту, а величезний
+    файл не зупиняє обробник.
+
+    Returns:
+        Tuple: (рядки першого файлу, рядки другого, частка спільних відбитків,
+        чи обрізано кожен з файлів); рядок - dict з number, text, region
+        (номер спільного фрагмента або None) і color (номер кольору підсвітки)
+    """
+    from .models import CodeFingerprint
+    from .utils import MAX_EXTRACTED_TEXT
+    sides, truncated = [], []
+    for submission in (first, second):
+        path, ext = submission.file.path, submission.get_file_extension()
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            source = f.read(MAX_EXTRACTED_TEXT + 1)
+        truncated.append(len(source) > MAX_EXTRACTED_TEXT)
+        source = source[:MAX_EXTRACTED_TEXT]
+        sides.append((source.splitlines(), winnow(tokenize(source, ext))))
+
+    (first_lines, first_prints), (second_lines, second_prints) = sides
+    shared = {fp.hash for fp in first_prints} & {fp.hash for fp in second_prints}
+    # Ignore the class boilerplate here too, as in the report
+    using = first._state.db or 'default'
+    files = _class_code_files(first.class_group_id, using)
+    if len(files) >= COMMON_MIN_FILES and shared:
+        counts = dict(CodeFingerprint.objects.using(using).filter(
+            hash__in=list(shared), submission_id__in=list(files)
+        ).values('hash').annotate(files=Count('submission_id', distinct=True)).values_list('hash', 'files'))
+        shared = {value for value in shared if counts.get(value, 0) <= len(files) * COMMON_SHARE}
+
+    # Overlapping fingerprints of the first file form numbered regions; the
+    # same region number marks the matching lines of the second file
+    regions, region_of_hash, last_end = [], {}, 0
+    for fp in first_prints:
+        if fp.hash not in shared:
+            continue
+        if not regions or fp.start_line > last_end:
+            regions.append([fp.start_line, fp.end_line])
+        regions[-1][1] = max(regions[-1][1], fp.end_line)
+        last_end = regions[-1][1]
+        region_of_hash[fp.hash] = len(regions) - 1
+
+    def mark(lines, prints):
+        marked = [None] * len(lines)
+        for fp in prints:
+            region = region_of_hash.get(fp.hash)
+            if region is None:
+                continue
+            for number in range(fp.start_line, min(fp.end_line, len(lines)) + 1):
+                if marked[number - 1] is None:
+                    marked[number - 1] = region
+        return [
+            {'number': i + 1, 'text': text, 'region': marked[i],
+             'color': None if marked[i] is None else marked[i] % REGION_COLORS}
+            for i, text in enumerate(lines)
+        ]
+
+    score = 0.0
+    if first_prints and second_prints:
+        score = _score(len(shared), len({fp.hash for fp in first_prints}), len({fp.hash for fp in second_prints}))
+    return mark(first_lines, first_prints), mark(second_lines, second_prints), score, tuple(truncated)
+
+
+def rebuild(using: str = 'default') -> int:
+    """Переіндексовує код усіх робіт; повертає кількість файлів коду"""
+    from .models import CodeFile, Submission
+    for submission in Submission.objects.using(using).iterator():
+        index_submission(submission, using, force=True)
+    return CodeFile.objects.using(using).filter(fingerprint_count__gt=0).count()
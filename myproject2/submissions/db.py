@@ -0,0 +1,43 @@
+"""
+Налаштування з'єднань SQLite (профіль SQLITE_PRODUCTION у settings.py)
+"""
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Застосовує SQLITE_PRAGMAS до кожного нового з'єднання"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if pragmas:
+        with connection.cursor() as cursor:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+    connection.sqlite_optimized_at = time.monotonic()
+
+
+@receiver(request_finished)
+def optimize_sqlite(sender, **kwargs):
+    """
+    Періодично виконує PRAGMA optimize на постійних з'єднаннях,
+    щоб планувальник запитів мав свіжу статистику
+    """
+    interval = getattr(settings, 'SQLITE_OPTIMIZE_INTERVAL', None)
+    if not interval:
+        return
+    now = time.monotonic()
+    for connection in connections.all(initialized_only=True):
+        if connection.vendor != 'sqlite' or connection.connection is None:
+            continue
+        if now - getattr(connection, 'sqlite_optimized_at', now) < interval:
+            continue
+        connection.sqlite_optimized_at = now
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA optimize')
@@ -0,0 +1,222 @@
+"""
+Великі експорти фоновими завданнями: оцінки (CSV) і файли робіт (ZIP)
+
+Готовий файл експорту лежить на диску в EXPORT_ROOT/<база>/, а його ім'я
+складається з хешу параметрів (вид, клас) і хешу версії даних. Версія -
+лічильники кешу фрагментів (FEED змінюється з кожною оцінкою, коментарем
+чи роботою, CLASSES - з назвами класів) разом із кількістю і найбільшим
+id вибраних робіт, тож вона не повториться, навіть якщо лічильники
+витіснили з кешу. Поки дані не змінилися, повторний такий самий експорт
+віддається одразу з диска; після зміни ім'я вже інше, і файл будується
+заново, а старі версії того самого експорту видаляються.
+
+Файл будує завдання черги (jobs.py): view ставить його і показує сторінку,
+що опитує export_status і завантажує результат, коли він готовий. Ключ
+дедуплікації - ім'я файлу, тож кілька вчителів, які одночасно натиснули
+той самий експорт, чекають одне завдання. Файл пишеться поруч під
+тимчасовим ім'ям і перейменовується, коли записаний повністю.
+
+Без JOBS_ENABLED файл будується просто в запиті, як раніше, але так само
+кешується на диску.
+"""
+import csv
+import hashlib
+import json
+import os
+import zipfile
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from . import cache as fragment_cache
+from . import jobs, metrics, schools
+
+GRADES = 'grades'
+FILES = 'files'
+
+EXTENSIONS = {GRADES: '.csv', FILES: '.zip'}
+CONTENT_TYPES = {GRADES: 'text/csv; charset=utf-8', FILES: 'application/zip'}
+
+GRADES_HEADER = ['Прізвище', "Ім'я", 'Клас', 'Дата', 'Оцінка']
+
+# Already compressed formats go into the ZIP as they are
+STORED_EXTENSIONS = {
+    '.zip', '.rar', '.7z', '.gz', '.tgz', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4',
+}
+
+# Rows read per query; no statement stays open between batches (see _rows)
+BATCH_SIZE = 2000
+
+
+def parse_params(class_group: Optional[str], using: Optional[str] = None):
+    """
+    Параметри експорту з GET-параметра класу
+
+    Returns:
+        tuple: (параметри, клас або None). Невідомий клас - експорт усіх робіт
+    """
+    from .models import ClassGroup
+    selected = None
+    if class_group and class_group.isdigit():
+        selected = ClassGroup.objects.using(using or schools.current_alias()).filter(pk=class_group).first()
+    return {'class_group': selected.pk if selected else None}, selected
+
+
+def download_name(kind: str, selected_class) -> str:
+    prefix = 'grades' if kind == GRADES else 'submissions'
+    suffix = selected_class.name if selected_class else 'all'
+    return f'{prefix}_{suffix}{EXTENSIONS[kind]}'
+
+
+def _queryset(kind: str, params: dict, using: str):
+    from .models import Submission
+    submissions = Submission.objects.using(using)
+    if params['class_group']:
+        submissions = submissions.filter(class_group_id=params['class_group'])
+    if kind == GRADES:
+        return submissions.filter(grade__isnull=False)
+    return submissions.exclude(file='').exclude(file__isnull=True)
+
+
+def data_version(kind: str, params: dict, using: str) -> str:
+    stats = _queryset(kind, params, using).aggregate(count=Count('id'), last=Max('id'))
+    return '.'.join(str(part) for part in (
+        fragment_cache.get_version(fragment_cache.FEED, using),
+        fragment_cache.get_version(fragment_cache.CLASSES, using),
+        stats['count'],
+        stats['last'],
+    ))
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def artifact_name(kind: str, params: dict, using: str) -> str:
+    """Шлях файлу експорту відносно EXPORT_ROOT для поточної версії даних"""
+    base = f'{kind}-{_digest([kind, params])}'
+    return os.path.join(using, f'{base}-{_digest(data_version(kind, params, using))}{EXTENSIONS[kind]}')
+
+
+def artifact_path(name: str) -> str:
+    return os.path.join(settings.EXPORT_ROOT, name)
+
+
+def start(kind: str, params: dict, filename: str, using: Optional[str] = None):
+    """
+    Повертає готовий файл експорту або ставить завдання на його побудову
+
+    Returns:
+        tuple: (шлях до готового файлу, None) або (None, Job)
+    """
+    alias = using or schools.current_alias()
+    name = artifact_name(kind, params, alias)
+    path = artifact_path(name)
+    ready = os.path.exists(path)
+    metrics.cache_lookup('export', ready)
+    if ready:
+        return path, None
+    if not settings.JOBS_ENABLED:
+        build(kind, params, name, alias)
+        return path, None
+    job = jobs.enqueue('export', kind, params, name, filename, dedup_key=f'export:{name}', using=alias)
+    return None, job
+
+
+def _rows(submissions, size: int = BATCH_SIZE):
+    """
+    Роботи вибірки в її порядку як (номер, кількість, робота)
+
+    Спершу читаються лише id, далі кожен пакет із size робіт - окремий
+    короткий запит. QuerySet.iterator() на SQLite тримав би читання
+    відкритим увесь експорт, і записи прогресу та оренди чекали б на
+    блокування.
+    """
+    ids = list(submissions.values_list('id', flat=True))
+    for start in range(0, len(ids), size):
+        chunk = ids[start:start + size]
+        rows = submissions.order_by().in_bulk(chunk)
+        for i, pk in enumerate(chunk, start):
+            if pk in rows:
+                yield i, len(ids), rows[pk]
+
+
+def _write_grades(submissions, target: str) -> Tuple[int, int]:
+    submissions = submissions.select_related('class_group').order_by('last_name', 'submitted_at')
+    total = 0
+    with open(target, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(GRADES_HEADER)
+        for i, total, sub in _rows(submissions):
+            if i % BATCH_SIZE == 0:
+                jobs.set_progress(i * 100 / total)
+            writer.writerow([
+                sub.last_name,
+                sub.first_name,
+                sub.class_group.name,
+                sub.submitted_at.strftime('%Y-%m-%d'),
+                sub.grade
+            ])
+    return total, 0
+
+
+def _write_files(submissions, target: str) -> Tuple[int, int]:
+    submissions = submissions.select_related('class_group').order_by('class_group__name', 'last_name', 'id')
+    total = missing = 0
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i, total, sub in _rows(submissions, 200):
+            # Files differ in size, so progress is updated for each one
+            jobs.set_progress(i * 100 / total)
+            try:
+                path = sub.file.path
+            except (ValueError, NotImplementedError):
+                path = None
+            if not path or not os.path.isfile(path):
+                missing += 1
+                continue
+            extension = os.path.splitext(path)[1].lower()
+            member = f'{sub.class_group.name}/{sub.last_name} {sub.first_name} ({sub.pk}){extension}'
+            compression = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            archive.write(path, member, compress_type=compression)
+    return total, missing
+
+
+WRITERS = {GRADES: _write_grades, FILES: _write_files}
+
+
+def build(kind: str, params: dict, name: str, using: str) -> dict:
+    """
+    Будує файл експорту (якщо його ще немає) і видаляє старі версії того самого експорту
+
+    Returns:
+        dict: path (відносно EXPORT_ROOT), rows, missing (файли робіт, яких немає на диску)
+    """
+    path = artifact_path(name)
+    rows = missing = None
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        try:
+            # Storage paths of files resolve to the media root of this school
+            with schools.using_school(schools.slug_for_alias(using)):
+                rows, missing = WRITERS[kind](_queryset(kind, params, using), temporary)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+    _prune(path)
+    return {'path': name, 'rows': rows, 'missing': missing}
+
+
+def _prune(path: str) -> None:
+    # Same kind and parameters, older data
+    directory, current = os.path.split(path)
+    prefix = current.rsplit('-', 1)[0] + '-'
+    for entry in os.scandir(directory):
+        if entry.name.startswith(prefix) and entry.name != current and not entry.name.endswith('.tmp'):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Submission, ClassGroup
+from .cache import get_class_groups
 
 class SubmissionForm(forms.ModelForm):
     full_name = forms.CharField(
@@ -30,6 +31,14 @@ class SubmissionForm(forms.ModelForm):
             }),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Render the class select from the cached list instead of querying ClassGroup
+        field = self.fields['class_group']
+        field.widget.choices = [('', field.empty_label)] + [
+            (cls.id, cls.name) for cls in get_class_groups()
+        ]
+
     def clean(self):
         cleaned_data = super().clean()
         file = cleaned_data.get('file')
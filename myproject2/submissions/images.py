@@ -0,0 +1,331 @@
+"""
+Похідні зображень робіт: мініатюри і зменшені прев'ю для перегляду
+
+Оригінал (часто 10+ МБ фото з телефона) декодується один раз для кожного
+розміру: поворот за EXIF, зменшення до рамки size x size, збереження у
+WebP або JPEG без метаданих. Для JPEG декодер одразу читає зменшену
+версію (Image.draft), тож мініатюра не розпаковує всі мегапікселі.
+
+Похідні лежать у settings.IMAGE_DERIVATIVE_ROOT у каталозі з іменем
+SHA-256 оригіналу (utils.file_digest): поки файл не змінився, похідна
+не перегенеровується, а однакові файли ділять одні похідні. Каталог
+обмежений за розміром (IMAGE_DERIVATIVE_MAX_BYTES) і чиститься за LRU:
+час зміни файлу оновлюється при читанні, найстаріші видаляються першими.
+Те саме сховище тримає мініатюри PDF (pdfs.py) і документи, сконвертовані
+зі старих форматів Office (office.py).
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .profiling import timed
+from .utils import file_digest
+
+# Bump when the rendering changes so old derivatives are not served
+DERIVATIVE_VERSION = 1
+
+# Extensions that get derivatives; GIFs are served as is to keep animation
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+
+# Reads refresh the LRU timestamp at most this often (seconds)
+TOUCH_INTERVAL = 60 * 60
+
+# Eviction removes files until usage drops to this share of the limit
+EVICT_TO = 0.9
+
+INFO_TIMEOUT = 7 * 24 * 60 * 60
+
+# Per-process estimate of the store size; None until the first scan.
+# Other workers write too, so the estimate only decides when to rescan.
+_usage = None
+_usage_lock = threading.Lock()
+
+
+def is_image(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def sizes() -> Tuple[int, ...]:
+    return tuple(sorted(settings.IMAGE_DERIVATIVE_SIZES))
+
+
+def _oriented_size(image) -> Tuple[int, int]:
+    # Orientations 5-8 swap width and height
+    width, height = image.size
+    try:
+        orientation = image.getexif().get(0x0112, 1)
+    except Exception:
+        orientation = 1
+    if orientation in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def image_info(file_path: str) -> Optional[dict]:
+    """
+    Повертає розміри зображення з урахуванням повороту EXIF
+
+    Читається лише заголовок файлу; результат кешується за хешем.
+
+    Args:
+        file_path: Шлях до оригіналу
+
+    Returns:
+        dict або None: {'digest', 'width', 'height'}, None якщо файл не зображення
+    """
+    from PIL import Image
+
+    digest = file_digest(file_path)
+    key = f'image_info:v{DERIVATIVE_VERSION}:{digest}'
+    info = cache.get(key)
+    if info is None:
+        try:
+            with Image.open(file_path) as image:
+                width, height = _oriented_size(image)
+            info = {'digest': digest, 'width': width, 'height': height}
+        except Exception:
+            info = {}
+        cache.set(key, info, INFO_TIMEOUT)
+    return info or None
+
+
+def fitted_size(info: dict, size: int) -> Tuple[int, int]:
+    """Розміри похідної, вписаної в рамку size x size (без збільшення)"""
+    width, height = info['width'], info['height']
+    scale = min(1.0, size / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def useful_sizes(info: dict) -> Tuple[int, ...]:
+    """Розміри рамок, що дають різні похідні: все, що більше оригіналу, - це він сам"""
+    longest = max(info['width'], info['height'])
+    result = []
+    for size in sizes():
+        result.append(size)
+        if size >= longest:
+            break
+    return tuple(result)
+
+
+def derivative_path(digest: str, size, fmt: str) -> str:
+    return os.path.join(
+        settings.IMAGE_DERIVATIVE_ROOT,
+        digest[:2],
+        digest,
+        f'v{DERIVATIVE_VERSION}-{size}.{fmt}',
+    )
+
+
+def _render(file_path: str, size: int, fmt: str, target: str) -> None:
+    from PIL import Image, ImageOps
+
+    with Image.open(file_path) as image:
+        icc_profile = image.info.get('icc_profile')
+        # Let the JPEG decoder scale down by 1/2..1/8 while decoding; the
+        # requested box is in oriented coordinates, so use the longer side
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        pil_format = FORMATS[fmt][0]
+        if pil_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+            if pil_format == 'JPEG' and has_alpha:
+                # JPEG has no alpha: flatten onto white
+                rgba = image.convert('RGBA')
+                image = Image.new('RGB', rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel('A'))
+            else:
+                image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        options = {'quality': settings.IMAGE_DERIVATIVE_QUALITY}
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        if pil_format == 'JPEG':
+            options.update(optimize=True, progressive=size > 256)
+        else:
+            options['method'] = 4
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write to a temporary file and rename: concurrent requests for the
+        # same derivative never see a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, pil_format, **options)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+@timed('convert')
+def get_derivative(file_path: str, size: int, fmt: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Повертає шлях до похідної, створюючи її за потреби
+
+    Args:
+        file_path: Шлях до оригіналу
+        size: Сторона рамки з settings.IMAGE_DERIVATIVE_SIZES
+        fmt: 'webp' або 'jpg'
+
+    Returns:
+        tuple: (шлях до файлу, повідомлення про помилку)
+    """
+    if size not in sizes() or fmt not in FORMATS:
+        return None, "Непідтримуваний розмір або формат"
+
+    info = image_info(file_path)
+    if info is None:
+        return None, "Файл не вдалося прочитати як зображення"
+
+    # Boxes larger than the image all produce the original size
+    size = min(size, useful_sizes(info)[-1])
+    target = derivative_path(info['digest'], size, fmt)
+    hit = touch(target)
+    metrics.cache_lookup('image_derivative', hit)
+    if not hit:
+        started = time.perf_counter()
+        try:
+            save_derivative(file_path, size, fmt, target)
+        except Exception as e:
+            metrics.CONVERTER_FAILURES.inc(format='image')
+            return None, f"Помилка при обробці зображення: {str(e)}"
+        metrics.CONVERTER_SECONDS.observe(time.perf_counter() - started, format='image')
+    return target, None
+
+
+def touch(target: str) -> bool:
+    """Позначає похідну як щойно використану; False, якщо її немає"""
+    try:
+        stat = os.stat(target)
+    except FileNotFoundError:
+        return False
+    if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+        try:
+            os.utime(target)
+        except OSError:
+            pass
+    return True
+
+
+def add_file(source_path: str, target: str) -> None:
+    """Переносить готовий файл у сховище (наприклад, сконвертований документ)"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # The source may be on another filesystem (/tmp): move it next to the
+    # target first so the final rename is atomic
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    os.close(fd)
+    try:
+        shutil.move(source_path, tmp_path)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    _account(os.path.getsize(target))
+
+
+def save_derivative(source_path: str, size: int, fmt: str, target: str) -> None:
+    """Рендерить source_path у сховище похідних (теж для растрів сторінок PDF)"""
+    _render(source_path, size, fmt, target)
+    _account(os.path.getsize(target))
+
+
+def _scan():
+    files = []
+    root = settings.IMAGE_DERIVATIVE_ROOT
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def evict(max_bytes: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Видаляє найдавніше використані похідні, поки сховище більше за ліміт
+
+    Returns:
+        tuple: (кількість видалених файлів, розмір сховища після чистки)
+    """
+    global _usage
+    if max_bytes is None:
+        max_bytes = settings.IMAGE_DERIVATIVE_MAX_BYTES
+    files = _scan()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    if total > max_bytes:
+        goal = max_bytes * EVICT_TO
+        for _, size, path in sorted(files):
+            if total <= goal:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            else:
+                removed += 1
+            total -= size
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+    with _usage_lock:
+        _usage = total
+    return removed, total
+
+
+def _account(added: int) -> None:
+    global _usage
+    with _usage_lock:
+        if _usage is not None:
+            _usage += added
+        due = _usage is None or _usage > settings.IMAGE_DERIVATIVE_MAX_BYTES
+    if due:
+        evict()
+
+
+def srcsets(info: dict, url: str) -> dict:
+    """
+    Готує srcset для кожного формату: "url?size=480&format=webp 480w, ..."
+
+    Args:
+        info: Результат image_info
+        url: Адреса view image_derivative без параметрів
+
+    Returns:
+        dict: {'webp': ..., 'jpg': ..., 'width': ..., 'height': ..., 'fallback': ...}
+    """
+    version = info['digest'][:12]
+    result = {'width': info['width'], 'height': info['height']}
+    entries = [(size, fitted_size(info, size)[0]) for size in useful_sizes(info)]
+    for fmt in FORMATS:
+        result[fmt] = ', '.join(
+            f'{url}?size={size}&format={fmt}&v={version} {width}w' for size, width in entries
+        )
+    # Plain src for browsers without srcset: the largest JPEG not above 1600
+    fallback = [size for size, _ in entries if size <= 1600][-1]
+    result['fallback'] = f'{url}?size={fallback}&format=jpg&v={version}'
+    return result
+
+
+def thumbnail_url(info: dict, url: str, fmt: str = 'webp') -> str:
+    version = info['digest'][:12]
+    return f'{url}?size={sizes()[0]}&format={fmt}&v={version}'
@@ -0,0 +1,282 @@
+"""
+Черга фонових завдань у базі школи, без Redis чи іншого брокера
+
+Завдання - рядок Job у тій самій базі, що й роботи: view ставить його
+через enqueue() (або enqueue_on_commit(), щоб обробник не побачив
+незакомічених даних), а виконують його процеси команди run_jobs.
+
+Обробник бере завдання з найбільшим пріоритетом, час якого настав, і
+позначає його своїм одним умовним UPDATE: з двох процесів, що обрали те
+саме завдання, оновить рядок лише один. Разом із завданням обробник
+отримує оренду на JOB_LEASE_SECONDS і продовжує її з окремого потоку,
+поки завдання виконується. Якщо процес зник (kill -9, перезапуск
+сервера), оренда спливає і завдання бере інший обробник.
+
+Завдання, що впало з винятком, повертається в чергу з експоненційною
+затримкою (JOB_BACKOFF_BASE * 2^спроба, не більше JOB_BACKOFF_MAX, з
+випадковим розкидом), а після max_attempts спроб позначається помилкою.
+Ключ дедуплікації не дає поставити друге таке саме завдання, поки перше
+ще в черзі або виконується: enqueue тоді повертає наявне.
+
+Самі завдання - звичайні функції, зареєстровані декоратором @task (див.
+tasks.py). Вони виконуються в контексті школи, якій належить база, тож
+усі запити без явного using() ідуть у неї. Аргументи і результат
+зберігаються як JSON.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+import traceback
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import metrics, schools
+
+logger = logging.getLogger(__name__)
+
+# Task name -> options and function, filled by @task
+TASKS = {}
+
+# Candidates tried per claim when other workers keep taking them first
+CLAIM_ATTEMPTS = 5
+
+# (job, alias) being run in this context, for set_progress
+_current = contextvars.ContextVar('current_job', default=None)
+
+
+def task(name: str, priority: int = 0, max_attempts: Optional[int] = None, lease: Optional[int] = None):
+    """
+    Реєструє функцію як фонове завдання
+
+    Args:
+        name: Назва завдання в черзі
+        priority: Пріоритет за замовчуванням (більший виконується раніше)
+        max_attempts: Спроб до остаточної помилки (типово JOB_MAX_ATTEMPTS)
+        lease: Оренда, с (типово JOB_LEASE_SECONDS)
+    """
+    def decorator(func):
+        TASKS[name] = {
+            'func': func,
+            'priority': priority,
+            'max_attempts': max_attempts,
+            'lease': lease,
+        }
+        return func
+    return decorator
+
+
+def _lease(job) -> timedelta:
+    spec = TASKS.get(job.task) or {}
+    return timedelta(seconds=spec.get('lease') or settings.JOB_LEASE_SECONDS)
+
+
+def enqueue(name: str, *args, priority: Optional[int] = None, dedup_key: Optional[str] = None,
+            delay: float = 0, using: Optional[str] = None):
+    """
+    Ставить завдання в чергу
+
+    Args:
+        name: Назва зареєстрованого завдання
+        *args: Аргументи функції (мають серіалізуватися в JSON)
+        priority: Пріоритет замість типового для завдання
+        dedup_key: Поки завдання з таким ключем у черзі чи виконується, нове не ставиться
+        delay: Виконати не раніше ніж через стільки секунд
+        using: База школи (типово - поточна)
+
+    Returns:
+        Job: Нове завдання або вже наявне з тим самим ключем
+    """
+    from .models import Job
+
+    if name not in TASKS:
+        raise ValueError(f'Невідоме завдання: {name}')
+    spec = TASKS[name]
+    alias = using or schools.current_alias()
+    values = {
+        'task': name,
+        'args': list(args),
+        'priority': spec['priority'] if priority is None else priority,
+        'dedup_key': dedup_key,
+        'max_attempts': spec['max_attempts'] or settings.JOB_MAX_ATTEMPTS,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    if dedup_key is None:
+        return Job.objects.using(alias).create(**values)
+
+    # The active job may finish between the failed insert and the lookup; then insert again
+    for _ in range(3):
+        try:
+            with transaction.atomic(using=alias):
+                return Job.objects.using(alias).create(**values)
+        except IntegrityError:
+            existing = Job.objects.using(alias).filter(dedup_key=dedup_key, status__in=Job.ACTIVE).first()
+            if existing is not None:
+                return existing
+    raise IntegrityError(f'Не вдалося поставити завдання з ключем {dedup_key}')
+
+
+def enqueue_on_commit(name: str, *args, using: Optional[str] = None, **options) -> None:
+    """Як enqueue, але після коміту поточної транзакції"""
+    alias = using or schools.current_alias()
+    transaction.on_commit(lambda: enqueue(name, *args, using=alias, **options), using=alias)
+
+
+def claim(worker: str, using: str = 'default'):
+    """
+    Бере наступне готове завдання і орендує його для обробника
+
+    Returns:
+        Job або None, якщо готових завдань немає
+    """
+    from .models import Job
+
+    jobs = Job.objects.using(using)
+    for _ in range(CLAIM_ATTEMPTS):
+        now = timezone.now()
+        ready = Q(status='queued', run_at__lte=now) | Q(status='running', lease_until__lt=now)
+        candidate = jobs.filter(ready).order_by('-priority', 'run_at', 'id').first()
+        if candidate is None:
+            return None
+
+        if candidate.status == 'running' and candidate.attempts >= candidate.max_attempts:
+            # The worker died on the last attempt; most likely the job itself kills it
+            jobs.filter(pk=candidate.pk, status='running', attempts=candidate.attempts).update(
+                status='failed', error='Обробник зник, не завершивши останню спробу', finished_at=now,
+                lease_until=None)
+            metrics.JOBS.inc(task=candidate.task, result='lost')
+            continue
+
+        # attempts works as a version: only one worker moves it from the value it read
+        claimed = jobs.filter(pk=candidate.pk, status=candidate.status, attempts=candidate.attempts).update(
+            status='running',
+            worker=worker,
+            attempts=F('attempts') + 1,
+            progress=0,
+            lease_until=now + _lease(candidate),
+            started_at=now,
+        )
+        if claimed:
+            return jobs.get(pk=candidate.pk)
+    return None
+
+
+def _owned(job, using: str):
+    from .models import Job
+    return Job.objects.using(using).filter(pk=job.pk, status='running', worker=job.worker, attempts=job.attempts)
+
+
+def extend_lease(job, using: str = 'default') -> bool:
+    """Продовжує оренду; False, якщо завдання вже забрав інший обробник"""
+    return bool(_owned(job, using).update(lease_until=timezone.now() + _lease(job)))
+
+
+def complete(job, result=None, using: str = 'default') -> bool:
+    return bool(_owned(job, using).update(
+        status='done', result=result, error='', progress=100, lease_until=None, finished_at=timezone.now()))
+
+
+def set_progress(percent: float) -> None:
+    """Записує, яку частину поточного завдання виконано (для сторінок, що його чекають)"""
+    current = _current.get()
+    if current is None:
+        # Called outside a worker, e.g. when the export is built in the request
+        return
+    job, using = current
+    percent = max(0, min(99, int(percent)))
+    # One write per percent at most
+    if percent != job.progress:
+        job.progress = percent
+        _owned(job, using).update(progress=percent)
+
+
+def backoff(attempts: int) -> float:
+    """Затримка перед повтором після attempts невдалих спроб, с"""
+    delay = min(settings.JOB_BACKOFF_MAX, settings.JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+    # Jobs that failed together (e.g. while the disk was full) should not all come back together
+    return delay * random.uniform(0.5, 1)
+
+
+def fail(job, error: str, using: str = 'default') -> bool:
+    """Повертає завдання в чергу із затримкою або, якщо спроби вичерпано, позначає помилкою"""
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        return bool(_owned(job, using).update(
+            status='failed', error=error, lease_until=None, finished_at=now))
+    return bool(_owned(job, using).update(
+        status='queued', error=error, lease_until=None,
+        run_at=now + timedelta(seconds=backoff(job.attempts))))
+
+
+def _keep_leased(job, using: str, done: threading.Event) -> None:
+    interval = _lease(job).total_seconds() / 3
+    try:
+        while not done.wait(interval):
+            try:
+                extended = extend_lease(job, using)
+            except DatabaseError:
+                # A busy database; there are two more tries before the lease runs out
+                logger.warning('Could not extend the lease of job %s', job.pk, exc_info=True)
+                continue
+            if not extended:
+                logger.warning('Job %s lease was taken over by another worker', job.pk)
+                return
+    finally:
+        # The heartbeat thread has its own connection
+        connections.close_all()
+
+
+def run(job, using: str = 'default') -> str:
+    """
+    Виконує орендоване завдання і записує результат
+
+    Returns:
+        str: 'done', 'retry', 'failed' або 'lost' (оренду забрав інший обробник)
+    """
+    spec = TASKS.get(job.task)
+    done = threading.Event()
+    heartbeat = threading.Thread(target=_keep_leased, args=(job, using, done),
+                                 name=f'job-{job.pk}-lease', daemon=True)
+    heartbeat.start()
+    started = time.perf_counter()
+    error = None
+    try:
+        if spec is None:
+            raise LookupError(f'Завдання {job.task} не зареєстроване в цьому процесі')
+        token = _current.set((job, using))
+        try:
+            with schools.using_school(schools.slug_for_alias(using)):
+                result = spec['func'](*job.args)
+        finally:
+            _current.reset(token)
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+        error = traceback.format_exc()
+    finally:
+        # The heartbeat stops before the final update, or it would see the job as taken
+        done.set()
+        heartbeat.join()
+
+    if error is None:
+        outcome = 'done' if complete(job, result, using) else 'lost'
+    elif not fail(job, error, using):
+        outcome = 'lost'
+    else:
+        outcome = 'failed' if job.attempts >= job.max_attempts else 'retry'
+    metrics.JOB_SECONDS.observe(time.perf_counter() - started, task=job.task)
+    metrics.JOBS.inc(task=job.task, result=outcome)
+    return outcome
+
+
+def purge(using: str = 'default') -> int:
+    """Видаляє завершені завдання, старші за JOB_RETENTION_DAYS; повертає їх кількість"""
+    from .models import Job
+    cutoff = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    deleted, _ = Job.objects.using(using).filter(status__in=('done', 'failed'), finished_at__lt=cutoff).delete()
+    return deleted
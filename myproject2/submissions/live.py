@@ -0,0 +1,243 @@
+"""
+Живе оновлення панелі вчителя через Server-Sent Events
+
+Джерело подій - журнал дій (ActivityLog): здача роботи, оцінка і коментар
+уже записуються туди з посиланням на роботу, а id запису журналу
+монотонний і служить id події SSE. Після перепідключення браузер сам
+надсилає Last-Event-ID, і потік продовжує з того ж місця.
+
+Кожен відкритий потік підписаний на локального розсильника процесу: запис
+журналу в цьому ж процесі будить його одразу (publish після коміту).
+Записи з інших робочих процесів видно через лічильник версії у спільному
+кеші (той самий механізм, що й у cache.py): потік перевіряє його раз на
+LIVE_POLL_INTERVAL секунд і лише тоді звертається до бази. Для кількох
+серверів потрібен спільний для них бекенд кешу.
+
+Прокинувшись, потік чекає LIVE_BATCH_DELAY, щоб під час дедлайну кілька
+робіт пішли одним пакетом, читає нові записи журналу для свого класу і
+надсилає відрендерені рядки таблиці. Якщо пропущено більше LIVE_BACKLOG
+записів, сторінка просто перезавантажується.
+
+Під ASGI потік - асинхронний генератор і не займає робочий потік; під
+WSGI це звичайний генератор, який тримає потік сервера, поки відкрита
+сторінка.
+"""
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import router, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import get_script_prefix, set_script_prefix
+
+from . import cache as fragment_cache
+from . import pdfs, schools
+
+# Version counter in the shared cache, bumped by every published change
+VERSION_NAMESPACE = 'live'
+
+# Journal actions shown on the dashboard
+ACTIONS = ('submission', 'grading', 'comment')
+
+# alias -> callbacks of the streams open in this process
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(alias: str, wake) -> None:
+    with _subscribers_lock:
+        _subscribers.setdefault(alias, set()).add(wake)
+
+
+def unsubscribe(alias: str, wake) -> None:
+    with _subscribers_lock:
+        _subscribers.get(alias, set()).discard(wake)
+
+
+def _notify(alias: str) -> None:
+    fragment_cache.bump_version(VERSION_NAMESPACE, alias)
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(alias, ()))
+    for wake in callbacks:
+        wake()
+
+
+def publish(using: Optional[str] = None) -> None:
+    """Повідомляє потоки про нові записи журналу (після коміту транзакції)"""
+    alias = using or schools.current_alias()
+    transaction.on_commit(lambda: _notify(alias), using=alias)
+
+
+def latest_event_id(using: Optional[str] = None) -> int:
+    """id останнього запису журналу: з нього починає потік щойно відкритої сторінки"""
+    from .models import ActivityLog
+    return ActivityLog.objects.using(using).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def format_event(name: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {name}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False))
+    return '\n'.join(lines) + '\n\n'
+
+
+class Stream:
+    """Стан одного SSE-з'єднання: школа, фільтр класу і останній надісланий запис журналу"""
+
+    def __init__(self, class_group_id: Optional[int], after: int):
+        from .models import ActivityLog
+        self.alias = router.db_for_read(ActivityLog)
+        self.class_group_id = class_group_id
+        self.after = after
+        self.version = fragment_cache.get_version(VERSION_NAMESPACE, self.alias)
+        # The body is read after SchoolMiddleware has reset both, so rows keep them here
+        self.school = schools.current_school()
+        self.script_prefix = get_script_prefix()
+
+    @contextmanager
+    def school_context(self):
+        """Школа і префікс URL запиту, що відкрив потік: посилання і файли рядків ведуть до неї"""
+        previous = get_script_prefix()
+        set_script_prefix(self.script_prefix)
+        try:
+            with schools.using_school(self.school):
+                yield
+        finally:
+            set_script_prefix(previous)
+
+    def fetch_for_school(self) -> str:
+        with self.school_context():
+            return self.fetch()
+
+    def changed(self) -> bool:
+        """Чи змінилося щось в інших процесах з минулої перевірки"""
+        version = fragment_cache.get_version(VERSION_NAMESPACE, self.alias)
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+    def fetch(self) -> str:
+        """Нові записи журналу як текст SSE (порожній рядок, якщо нічого нового)"""
+        from .models import ActivityLog, Submission
+
+        logs = ActivityLog.objects.using(self.alias).filter(
+            id__gt=self.after, action_type__in=ACTIONS, submission__isnull=False)
+        if self.class_group_id:
+            logs = logs.filter(submission__class_group_id=self.class_group_id)
+        rows = list(logs.order_by('id').values_list('id', 'action_type', 'submission_id')[:settings.LIVE_BACKLOG + 1])
+        if not rows:
+            return ''
+        if len(rows) > settings.LIVE_BACKLOG:
+            # Too much was missed to patch row by row
+            self.after = latest_event_id(self.alias)
+            return format_event('reload', {}, self.after)
+
+        # Several actions on one submission become one row update
+        kinds = {}
+        for _, action, submission_id in rows:
+            if action == 'submission' or submission_id not in kinds:
+                kinds[submission_id] = 'submission' if action == 'submission' else 'update'
+        self.after = rows[-1][0]
+
+        submissions = (
+            Submission.objects.using(self.alias).filter(id__in=kinds)
+            .select_related('class_group', 'pdf').defer('pdf__page_texts')
+            .annotate(comment_count=Count('comments')).order_by('submitted_at', 'id')
+        )
+        pdf_thumbnails = pdfs.rasterizer() is not None
+        chunks = []
+        for submission in submissions:
+            html = render_to_string('submissions/dashboard_row.html', {
+                'submission': submission,
+                'pdf_thumbnails': pdf_thumbnails,
+            })
+            chunks.append(format_event(kinds[submission.id], {
+                'id': submission.id,
+                'grade': submission.grade or '',
+                'html': html,
+            }, self.after))
+        return ''.join(chunks)
+
+
+def _opening() -> str:
+    # The browser waits this long before reconnecting after the stream ends
+    return f'retry: {settings.LIVE_RETRY_MS}\n\n'
+
+
+def events(stream: Stream):
+    """Потік SSE для WSGI: тримає потік сервера, поки відкрита сторінка"""
+    woken = threading.Event()
+    subscribe(stream.alias, woken.set)
+    try:
+        yield _opening()
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < settings.LIVE_MAX_SECONDS:
+            woken.wait(settings.LIVE_POLL_INTERVAL)
+            # Local changes bump the version too; checking it every time keeps it current
+            changed = stream.changed()
+            if woken.is_set() or changed:
+                time.sleep(settings.LIVE_BATCH_DELAY)
+                woken.clear()
+                chunk = stream.fetch_for_school()
+                if chunk:
+                    last_sent = time.monotonic()
+                    yield chunk
+            if time.monotonic() - last_sent >= settings.LIVE_HEARTBEAT:
+                last_sent = time.monotonic()
+                yield ': ping\n\n'
+    finally:
+        unsubscribe(stream.alias, woken.set)
+
+
+async def aevents(stream: Stream):
+    """Потік SSE для ASGI: між подіями чекає в циклі подій, без робочого потоку"""
+    loop = asyncio.get_running_loop()
+    woken = asyncio.Event()
+
+    def wake():
+        # Called from whichever thread committed the change
+        loop.call_soon_threadsafe(woken.set)
+
+    subscribe(stream.alias, wake)
+    try:
+        yield _opening()
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < settings.LIVE_MAX_SECONDS:
+            try:
+                await asyncio.wait_for(woken.wait(), settings.LIVE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            changed = await sync_to_async(stream.changed)()
+            if woken.is_set() or changed:
+                await asyncio.sleep(settings.LIVE_BATCH_DELAY)
+                woken.clear()
+                chunk = await sync_to_async(stream.fetch_for_school)()
+                if chunk:
+                    last_sent = time.monotonic()
+                    yield chunk
+            if time.monotonic() - last_sent >= settings.LIVE_HEARTBEAT:
+                last_sent = time.monotonic()
+                yield ': ping\n\n'
+    finally:
+        unsubscribe(stream.alias, wake)
+
+
+def response(request, stream: Stream) -> StreamingHttpResponse:
+    """Відповідь text/event-stream з генератором, що підходить серверу (ASGI чи WSGI)"""
+    content = aevents(stream) if isinstance(request, ASGIRequest) else events(stream)
+    result = StreamingHttpResponse(content, content_type='text/event-stream')
+    result['Cache-Control'] = 'no-cache'
+    # nginx would otherwise hold events back in its buffer
+    result['X-Accel-Buffering'] = 'no'
+    return result
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from submissions import pdfs, schools
+from submissions.models import Submission
+
+
+class Command(BaseCommand):
+    help = 'Аналізує PDF робіт без актуального результату: сторінки, текст (усі бази або вказану)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help="Псевдонім бази (за замовчуванням - 'default' і всі школи)")
+        parser.add_argument('--force', action='store_true', help='Переаналізувати всі PDF')
+
+    def handle(self, *args, **options):
+        if options['database']:
+            aliases = [options['database']]
+        else:
+            aliases = ['default'] + [schools.register_database(slug) for slug in schools.load_registry()]
+
+        for alias in aliases:
+            started = time.perf_counter()
+            if options['force']:
+                queryset = Submission.objects.using(alias).filter(file__iendswith='.pdf')
+            else:
+                queryset = pdfs.pending(alias)
+            done = failed = 0
+            for pk in list(queryset.values_list('pk', flat=True)):
+                document = pdfs.analyze_submission(pk, alias, force=options['force'])
+                if document is None:
+                    continue
+                if document.status == 'done':
+                    done += 1
+                else:
+                    failed += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{alias}: проаналізовано {done} PDF, з помилками {failed} '
+                f'за {time.perf_counter() - started:.1f} с'
+            ))
@@ -0,0 +1,194 @@
+import importlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from submissions import benchmarks, utils
+
+# Imported by the worker before measuring, so import time is not billed to the conversion
+PRELOAD = ('docx', 'openpyxl', 'pptx', 'odf.opendocument', 'odf.table', 'odf.draw', 'odf.teletype')
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк конвертерів попереднього перегляду на згенерованому корпусі: час, пік пам\'яті і '
+        'розмір HTML для кожного формату і розміру; з --baseline завершується помилкою при регресії'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', help='Лише випадки, назва яких містить один із рядків')
+        parser.add_argument('--repeat', type=int, default=3, help='Конвертацій кожного файлу (береться медіана)')
+        parser.add_argument('--timeout', type=float, default=60, help='Ліміт часу на випадок, с')
+        parser.add_argument('--corpus', help='Каталог корпусу (за замовчуванням benchmarks/corpus)')
+        parser.add_argument('--output', help='Файл результату (за замовчуванням benchmarks/converters-<час>-<коміт>.json)')
+        parser.add_argument('--baseline', help='Попередній результат; регресія відносно нього - помилка')
+        parser.add_argument('--time-threshold', type=float, default=0.3, help='Допустиме зростання часу (0.3 = 30%%)')
+        parser.add_argument('--rss-threshold', type=float, default=0.3, help='Допустиме зростання пам\'яті')
+        parser.add_argument('--size-threshold', type=float, default=0.1, help='Допустима зміна розміру HTML')
+        parser.add_argument('--min-ms', type=float, default=20, help='Менші зміни часу вважаються шумом')
+        parser.add_argument('--min-mb', type=float, default=5, help='Менші зміни пам\'яті вважаються шумом')
+        parser.add_argument('--worker', help='Внутрішній режим: один випадок в окремому процесі')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.run_worker(options['worker'], options)
+            return
+
+        names = [name for name in benchmarks.CASES
+                 if not options['only'] or any(part in name for part in options['only'])]
+        if not names:
+            raise CommandError('Жоден випадок не відповідає --only')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline.get('corpus_version') != benchmarks.CORPUS_VERSION:
+                raise CommandError('Базовий результат зроблено на іншій версії корпусу')
+
+        directory = benchmarks.corpus_dir(options['corpus'])
+        started = time.perf_counter()
+        paths = benchmarks.build_corpus(directory, names)
+        self.stdout.write(f'Корпус {directory}: {len(paths)} файлів ({time.perf_counter() - started:.1f} с)')
+
+        results = {}
+        for name in names:
+            results[name] = self.measure(name, paths[name], options)
+            self.report(name, results[name])
+
+        commit, dirty = benchmarks.git_revision()
+        data = {
+            'created_at': timezone.now().isoformat(),
+            'commit': commit,
+            'dirty': dirty,
+            'python': platform.python_version(),
+            'corpus_version': benchmarks.CORPUS_VERSION,
+            'repeat': options['repeat'],
+            'cases': results,
+        }
+        output = options['output']
+        if not output:
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            output = os.path.join(settings.BASE_DIR, 'benchmarks',
+                                  f'converters-{stamp}-{(commit or "nogit")[:8]}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результат: {output}')
+
+        if baseline is not None:
+            regressions = self.compare(baseline['cases'], results, options)
+            if regressions:
+                raise CommandError(f'Регресій: {regressions}')
+            self.stdout.write(self.style.SUCCESS('Регресій немає'))
+
+    def run_worker(self, name, options):
+        """Конвертує файл випадку repeat разів і друкує виміри рядком JSON"""
+        extension = benchmarks.CASES[name][0]
+        path = benchmarks.build_corpus(benchmarks.corpus_dir(options['corpus']), [name])[name]
+        converter = getattr(utils, benchmarks.CONVERTERS[extension])
+        for module in PRELOAD:
+            importlib.import_module(module)
+
+        rss_before = _peak_rss_mb()
+        timings = []
+        html, error = '', None
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            html, error = converter(path)
+            timings.append((time.perf_counter() - started) * 1000)
+        peak = _peak_rss_mb()
+        self.stdout.write(json.dumps({
+            'timings': timings,
+            'peak_rss_mb': peak,
+            'rss_growth_mb': peak - rss_before,
+            'html_bytes': len(html.encode('utf-8')),
+            'error': error,
+        }))
+
+    def measure(self, name, path, options):
+        extension, _, params = benchmarks.CASES[name]
+        result = {
+            'format': extension,
+            'params': params,
+            'file_bytes': os.path.getsize(path),
+            'status': 'ok',
+        }
+        # A fresh process per case: peak RSS belongs to this file only, and a runaway case can be killed
+        command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_converters',
+                   '--worker', name, '--repeat', str(options['repeat'])]
+        if options['corpus']:
+            command += ['--corpus', options['corpus']]
+        try:
+            process = subprocess.run(command, capture_output=True, text=True, timeout=options['timeout'])
+        except subprocess.TimeoutExpired:
+            result['status'] = 'timeout'
+            return result
+        if process.returncode != 0:
+            # Killed by the OOM killer or crashed inside a C extension
+            result['status'] = f'crashed ({process.returncode})'
+            return result
+        measured = json.loads(process.stdout.strip().splitlines()[-1])
+
+        result.update({
+            'wall_ms': round(statistics.median(measured['timings']), 2),
+            'wall_ms_min': round(min(measured['timings']), 2),
+            'peak_rss_mb': round(measured['peak_rss_mb'], 1),
+            'rss_growth_mb': round(measured['rss_growth_mb'], 1),
+            'html_bytes': measured['html_bytes'],
+        })
+        if measured['error']:
+            result['status'] = 'error'
+            result['error'] = measured['error']
+        return result
+
+    def report(self, name, result):
+        if result['status'] not in ('ok', 'error'):
+            self.stdout.write(self.style.ERROR(f'{name:<22} {result["status"]}'))
+            return
+        line = (f'{name:<22} {result["wall_ms"]:10.1f} мс  +{result["rss_growth_mb"]:7.1f} МБ  '
+                f'HTML {result["html_bytes"] / 1024:10.1f} КБ')
+        if result['status'] == 'error':
+            line = self.style.WARNING(f'{line}  {result["error"]}')
+        self.stdout.write(line)
+
+    def compare(self, before_cases, after_cases, options):
+        """Друкує регресії відносно baseline; повертає їх кількість"""
+        checks = (
+            ('wall_ms', 'час', options['time_threshold'], options['min_ms']),
+            ('rss_growth_mb', "пам'ять", options['rss_threshold'], options['min_mb']),
+        )
+        regressions = 0
+        for name, after in after_cases.items():
+            before = before_cases.get(name)
+            if before is None:
+                continue
+            problems = []
+            if before['status'] == 'ok' and after['status'] != 'ok':
+                problems.append(f'{before["status"]} -> {after["status"]}')
+            elif before['status'] == 'ok':
+                for key, label, threshold, slack in checks:
+                    old, new = before[key], after[key]
+                    if new > old * (1 + threshold) and new - old > slack:
+                        problems.append(f'{label} {old} -> {new}')
+                old_size, new_size = before['html_bytes'], after['html_bytes']
+                if abs(new_size - old_size) > old_size * options['size_threshold']:
+                    problems.append(f'HTML {old_size} -> {new_size} байт')
+            if problems:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f'РЕГРЕСІЯ {name}: ' + '; '.join(problems)))
+        return regressions
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from submissions import cache as fragment_cache
+
+
+class Command(BaseCommand):
+    help = 'Вимірює запити/сек для стрічки робіт і форми здачі з кешем фрагментів і без нього'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Кількість запитів на кожен URL')
+        parser.add_argument('--pages', type=int, default=3, help='Скільки сторінок стрічки чергувати')
+
+    def run(self, client, urls, count):
+        started = time.perf_counter()
+        for i in range(count):
+            response = client.get(urls[i % len(urls)])
+            if response.status_code != 200:
+                raise RuntimeError(f'{urls[i % len(urls)]}: HTTP {response.status_code}')
+        return count / (time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        feed_urls = [f'/success/?page={page}' for page in range(1, options['pages'] + 1)]
+        targets = [('Стрічка /success/', feed_urls), ('Форма здачі /', ['/'])]
+        client = Client()
+
+        fragment_cache.reset_stats()
+        for label, urls in targets:
+            with override_settings(FRAGMENT_CACHE_ENABLED=False):
+                before = self.run(client, urls, count)
+            after = self.run(client, urls, count)
+            self.stdout.write(
+                f'{label:<20} без кешу {before:8.1f} req/s   з кешем {after:8.1f} req/s   x{after / before:.1f}'
+            )
+
+        for namespace, stats in fragment_cache.get_stats().items():
+            self.stdout.write(f"{namespace}: hit rate {stats['hit_rate']:.1%} ({stats['hits']}/{stats['hits'] + stats['misses']})")
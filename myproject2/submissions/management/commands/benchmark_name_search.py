@@ -0,0 +1,107 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from submissions import schools, search
+from submissions.models import ClassGroup, Submission
+from submissions.utils import normalize_name
+
+SYLLABLES = ['шев', 'ко', 'ва', 'бон', 'дар', 'тка', 'кра', 'ол', 'ій', 'мель', 'пет', 'ри', 'гри',
+             'лис', 'мо', 'роз', 'сав', 'мар', 'руд', 'зін', 'гон', 'ча', 'ле', 'щер', 'бі', 'юр']
+ENDINGS = ['енко', 'ук', 'чук', 'ишин', 'ський', 'ович', 'ів', 'ак', 'ець', 'ченко']
+FIRST_NAMES = ['Тарас', 'Олексій', 'Марія', 'Юлія', 'Ігор', 'Ярослава', 'Євген', 'Ольга', 'Дмитро',
+               'Софія', 'Григорій', 'Анастасія', "Мар'яна", 'Ілля', 'Щасний', 'Катерина']
+
+# (label, query) as a teacher would type them
+QUERIES = [
+    ('кирилиця', 'Шевченко'),
+    ('латиниця', 'shevchenko'),
+    ('префікс', 'Шевч'),
+    ('2 літери', 'ше'),
+    ('ім\'я + прізвище', 'Тарас Шевч'),
+    ('одруківка', 'Шевчнко'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Порівнює пошук за ім\'ям (icontains) з індексом транслітерованих імен '
+        'на тимчасовій базі з великою кількістю робіт'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100_000, help='Кількість робіт у тестовій базі')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторів кожного запиту')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            alias = 'name_search_benchmark'
+            config = dict(connections.settings['default'], NAME=os.path.join(tmp, 'db.sqlite3'))
+            connections.settings[alias] = config
+            try:
+                call_command('migrate', database=alias, verbosity=0)
+                with schools.using_school(None):
+                    self.populate(alias, options['count'])
+                    self.compare(alias, options['repeat'])
+            finally:
+                connections[alias].close()
+                del connections.settings[alias]
+
+    def populate(self, alias, count):
+        rng = random.Random(42)
+        class_group = ClassGroup.objects.using(alias).create(name='10-А')
+        surnames = set()
+        while len(surnames) < 5000:
+            root = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+            surnames.add((root + rng.choice(ENDINGS)).capitalize())
+        surnames = sorted(surnames) + ['Шевченко']
+
+        batch = []
+        for i in range(count):
+            last_name, first_name = rng.choice(surnames), rng.choice(FIRST_NAMES)
+            batch.append(Submission(
+                last_name=last_name, first_name=first_name, class_group=class_group,
+                link='https://example.com/', name_key=normalize_name(f'{last_name} {first_name}'),
+            ))
+        # bulk_create skips save() and signals, so the name index is filled in one statement
+        Submission.objects.using(alias).bulk_create(batch, batch_size=2000)
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {search.NAME_TABLE} (rowid, name_key) SELECT id, name_key FROM submissions_submission'
+            )
+            cursor.execute('ANALYZE')
+        self.stdout.write(f'Створено {count} робіт ({len(surnames)} прізвищ)')
+
+    def measure(self, make_queryset, repeat):
+        timings, total = [], 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = make_queryset()
+            # What the dashboard does: one page plus the paginator count
+            list(queryset[:15])
+            total = queryset.count()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), total
+
+    def compare(self, alias, repeat):
+        base = Submission.objects.using(alias).order_by('-submitted_at')
+        for label, query in QUERIES:
+            words = query.split()
+            def icontains():
+                queryset = base
+                for word in words:
+                    queryset = queryset.filter(Q(last_name__icontains=word) | Q(first_name__icontains=word))
+                return queryset
+            before, before_total = self.measure(icontains, repeat)
+            after, after_total = self.measure(lambda: search.filter_by_name(base, query), repeat)
+            self.stdout.write(
+                f'{label:<16} {query!r:<14} icontains {before:7.1f} мс ({before_total:>5})   '
+                f'індекс {after:7.1f} мс ({after_total:>5})'
+            )
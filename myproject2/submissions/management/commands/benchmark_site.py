@@ -0,0 +1,213 @@
+import contextvars
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from submissions import schools, synthetic
+from submissions.benchmarks import git_revision
+from submissions.models import ActivityLog, ClassGroup, Comment, Submission
+from submissions.profiling import percentile
+
+# Views measured by default, in the order they are reported
+VIEWS = ('teacher_dashboard', 'submission_success', 'gradebook', 'view_file', 'export_grades', 'activity_log')
+
+
+# (alias, [count]) of the request being measured
+_counter = contextvars.ContextVar('benchmark_queries', default=None)
+
+
+def _count(execute, sql, params, many, context):
+    current = _counter.get()
+    if current is not None and context['connection'].alias == current[0]:
+        current[1][0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_counter(sender=None, connection=None, **kwargs):
+    # Every connection of the process, including those of aio pool threads
+    if _count not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count)
+
+
+@contextmanager
+def count_queries(alias):
+    """
+    Рахує SQL-запити до бази alias, виконані в цьому контексті: і в потоці
+    запиту, і в пулі aio.run_blocking, куди контекст копіюється
+    """
+    counter = [0]
+    token = _counter.set((alias, counter))
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
+
+
+class Command(BaseCommand):
+    help = (
+        'Вимірює p50/p95/p99 часу відповіді і кількість SQL-запитів основних сторінок '
+        'і зберігає результат у JSON для порівняння між комітами (дані: seed_school)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', help='Школа (за замовчуванням - основна база)')
+        parser.add_argument('--requests', type=int, default=30, help='Запитів на кожну сторінку')
+        parser.add_argument('--warmup', type=int, default=3, help='Запитів на прогрів (не враховуються)')
+        parser.add_argument('--views', nargs='+', choices=VIEWS, default=VIEWS, help='Які сторінки вимірювати')
+        parser.add_argument('--cold', action='store_true', help='Очищати кеш перед кожним запитом')
+        parser.add_argument('--teacher', default='teacher', help='Логін вчителя')
+        parser.add_argument('--output', help='Файл результату (за замовчуванням benchmarks/<час>-<коміт>.json)')
+        parser.add_argument('--compare', help='Попередній результат для порівняння')
+
+    def handle(self, *args, **options):
+        slug = options['school']
+        if slug and slug not in schools.load_registry():
+            raise CommandError(f'Школу {slug} не знайдено (див. school_create)')
+        alias = schools.register_database(slug) if slug else 'default'
+        prefix = f'/{settings.SCHOOL_PATH_PREFIX}/{slug}' if slug else ''
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        # DEBUG would log every query and slow down exactly what is being measured
+        with schools.using_school(slug), override_settings(DEBUG=False):
+            teacher = User.objects.using(alias).filter(username=options['teacher']).first()
+            if teacher is None:
+                raise CommandError(f'Користувача {options["teacher"]} немає (див. seed_school --teacher)')
+            if not Submission.objects.using(alias).exists():
+                raise CommandError(f'{alias}: немає робіт, спершу запустіть seed_school')
+
+            connection_created.connect(install_counter)
+            for connection in connections.all(initialized_only=True):
+                install_counter(connection=connection)
+
+            client = Client()
+            client.force_login(teacher)
+            scenarios = self.scenarios(alias)
+
+            results = {}
+            for name in options['views']:
+                urls = [prefix + url for url in scenarios[name]]
+                results[name] = self.measure(client, alias, urls, options)
+                self.report(name, results[name], baseline)
+
+        commit, dirty = git_revision()
+        data = {
+            'created_at': timezone.now().isoformat(),
+            'commit': commit,
+            'dirty': dirty,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': {
+                'alias': alias,
+                'submissions': Submission.objects.using(alias).count(),
+                'comments': Comment.objects.using(alias).count(),
+                'activity': ActivityLog.objects.using(alias).count(),
+            },
+            'options': {key: options[key] for key in ('requests', 'warmup', 'cold')},
+            'views': results,
+        }
+        output = options['output']
+        if not output:
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            output = os.path.join(settings.BASE_DIR, 'benchmarks', f'{stamp}-{(commit or "nogit")[:8]}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Результат: {output}'))
+
+    def scenarios(self, alias):
+        """URL кожної сторінки; запити по черзі проходять їх усі"""
+        class_groups = list(ClassGroup.objects.using(alias).order_by('id').values_list('id', flat=True)[:3])
+        submissions = Submission.objects.using(alias)
+        last_page = max(1, submissions.count() // 20)
+
+        # One submission of each generated format, so every preview converter is covered
+        files = []
+        for extension in synthetic.GENERATORS:
+            pk = submissions.filter(file__endswith=extension).values_list('id', flat=True).first()
+            if pk:
+                files.append(pk)
+
+        dashboard = reverse('teacher_dashboard')
+        feed = reverse('submission_success')
+        gradebook = reverse('gradebook')
+        export = reverse('export_grades')
+        activity = reverse('activity_log')
+        return {
+            'teacher_dashboard': [dashboard, f'{dashboard}?page={last_page // 2}', f'{dashboard}?search=Шевченко']
+                                 + [f'{dashboard}?class_group={pk}' for pk in class_groups],
+            'submission_success': [feed, f'{feed}?page={last_page // 2}', f'{feed}?search=Коваленко'],
+            'gradebook': [gradebook, f'{gradebook}?view=all_grades', f'{gradebook}?view=all_grades&page=100']
+                         + [f'{gradebook}?class_group={pk}' for pk in class_groups],
+            'view_file': [reverse('view_file', args=[pk]) for pk in files],
+            'export_grades': [f'{export}?class_group={pk}' for pk in class_groups] + [export],
+            'activity_log': [activity, f'{activity}?page=1000', f'{activity}?action_type=grading'],
+        }
+
+    def measure(self, client, alias, urls, options):
+        if not urls:
+            return None
+        timings, queries, sizes, statuses = [], [], [], {}
+        for i in range(options['warmup'] + options['requests']):
+            url = urls[i % len(urls)]
+            if options['cold']:
+                cache.clear()
+            with count_queries(alias) as counter:
+                started = time.perf_counter()
+                response = client.get(url)
+                # Streaming responses do their work while being read
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise CommandError(f'{url}: HTTP {response.status_code}')
+            if i < options['warmup']:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(counter[0])
+            sizes.append(len(body))
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        timings.sort()
+        return {
+            'urls': urls,
+            'requests': len(timings),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'max_ms': round(timings[-1], 2),
+            'queries_mean': round(sum(queries) / len(queries), 1),
+            'queries_max': max(queries),
+            'bytes_mean': sum(sizes) // len(sizes),
+            'status': statuses,
+        }
+
+    def report(self, name, result, baseline):
+        if result is None:
+            self.stdout.write(self.style.WARNING(f'{name:<20} немає даних (потрібні роботи з файлами)'))
+            return
+        line = (f"{name:<20} p50 {result['p50_ms']:8.1f}  p95 {result['p95_ms']:8.1f}  "
+                f"p99 {result['p99_ms']:8.1f} мс   запитів SQL {result['queries_mean']:7.1f}")
+        before = ((baseline or {}).get('views') or {}).get(name)
+        if before:
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+            line += f"   p95 {change:+.0%}, SQL {result['queries_mean'] - before['queries_mean']:+.1f}"
+            style = self.style.ERROR if change > 0.1 else self.style.SUCCESS if change < -0.1 else str
+            line = style(line)
+        self.stdout.write(line)
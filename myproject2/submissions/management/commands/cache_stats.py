@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from submissions import cache as fragment_cache
+
+
+class Command(BaseCommand):
+    help = 'Показує статистику влучань у кеш фрагментів (стрічка, списки класів)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулити лічильники')
+
+    def handle(self, *args, **options):
+        for namespace, stats in fragment_cache.get_stats().items():
+            self.stdout.write(
+                f"{namespace:<10} версія {stats['version']:<19} "
+                f"влучань {stats['hits']:<8} промахів {stats['misses']:<8} "
+                f"hit rate {stats['hit_rate']:.1%}"
+            )
+        if options['reset']:
+            fragment_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Лічильники обнулено'))
@@ -0,0 +1,544 @@
+import http.client
+import importlib.util
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from submissions import synthetic
+from submissions.benchmarks import git_revision
+from submissions.profiling import percentile
+
+# Settings of a server started by the harness: the project settings with every path in a temp dir
+SERVER_SETTINGS = '''
+from myproject2.settings import *
+
+DEBUG = False
+DATABASES['default']['NAME'] = {root!r} + '/db.sqlite3'
+MEDIA_ROOT = {root!r} + '/media'
+SCHOOLS_ROOT = {root!r} + '/schools'
+IMAGE_DERIVATIVE_ROOT = {root!r} + '/derivatives'
+METRICS_DIR = {root!r} + '/metrics'
+QUERY_WATCH_LOG = {root!r} + '/logs/queries.jsonl'
+CACHES['default']['LOCATION'] = {root!r} + '/cache'
+'''
+
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+CLASS_OPTION = re.compile(r'<option value="(\d+)"')
+CSRF_COOKIE = re.compile(r'csrftoken=([^;]+)')
+SESSION_COOKIE = re.compile(r'sessionid=([^;]+)')
+
+# Teacher account created by --prepare; teachers preview submissions during the rush
+TEACHER = ('rush_teacher', 'rush-teacher-password')
+
+# Server-side counters read from /metrics before and after the rush
+SERVER_COUNTERS = ('sqlite_locked_errors_total', 'sqlite_lock_waits_total')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _process_tree(pid: int) -> list:
+    """pid і всі його нащадки (робочі процеси gunicorn)"""
+    pids, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    queue.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def disk_write_bytes(pids) -> int:
+    """Байти, які процеси записали на диск (/proc/<pid>/io, лише Linux)"""
+    total = 0
+    for pid in {child for pid in pids for child in _process_tree(pid)}:
+        try:
+            with open(f'/proc/{pid}/io') as f:
+                for line in f:
+                    if line.startswith('write_bytes:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+def multipart(fields: dict, file_field: str, file_name: str, content: bytes):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{file_name}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode()
+    )
+    parts.append(content)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def send_slowly(connection, path: str, body: bytes, headers: dict, rate_kb: float):
+    """POST з обмеженою швидкістю надсилання, як з повільного мобільного інтернету"""
+    connection.putrequest('POST', path)
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.putheader('Content-Length', str(len(body)))
+    connection.endheaders()
+    # About ten sends per second
+    chunk = max(1024, int(rate_kb * 1024 / 10))
+    for start in range(0, len(body), chunk):
+        connection.send(body[start:start + chunk])
+        time.sleep(chunk / (rate_kb * 1024))
+
+
+class Command(BaseCommand):
+    help = (
+        'Навантаження «дедлайн о 23:59»: N учнів одночасно здають роботи з файлами реалістичних розмірів. '
+        'Звіт: пропускна здатність, p50/p99, помилки і блокування SQLite, підсилення запису на диск'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Адреса запущеного сервера (за замовчуванням команда запускає свій)')
+        parser.add_argument('--pid', type=int, nargs='+', default=[],
+                            help='PID сервера за --url для підрахунку записів на диск')
+        parser.add_argument('--students', type=int, default=300, help='Скільки учнів здають роботу')
+        parser.add_argument('--concurrency', type=int, default=50, help='Скільки учнів надсилають одночасно')
+        parser.add_argument('--ramp', type=float, default=30,
+                            help='За скільки секунд до дедлайну приходять учні (густіше під кінець)')
+        parser.add_argument('--files', type=int, default=40, help='Різних файлів у пулі')
+        parser.add_argument('--timeout', type=float, default=60, help='Тайм-аут одного HTTP-запиту, с')
+        parser.add_argument('--production', action='store_true',
+                            help='Свій сервер з профілем SQLITE_PRODUCTION (WAL, IMMEDIATE)')
+        parser.add_argument('--threads', type=int, default=0,
+                            help='Потоків власного сервера (gunicorn gthread; 0 - runserver)')
+        parser.add_argument('--workers', type=int, default=1, help='Процесів власного сервера (gunicorn, uvicorn)')
+        parser.add_argument('--asgi', action='store_true',
+                            help='Свій сервер під ASGI (uvicorn) замість WSGI, для порівняння')
+        parser.add_argument('--upload-rate', type=float, default=0,
+                            help='Швидкість надсилання файлу одним учнем, КБ/с (0 - без обмеження)')
+        parser.add_argument('--teachers', type=int, default=0,
+                            help='Вчителів, що під час навантаження відкривають перегляд робіт')
+        parser.add_argument('--seed', type=int, default=1, help='Зерно генератора')
+        parser.add_argument('--output', help='Зберегти результат у JSON')
+        parser.add_argument('--compare', help='Попередній результат (наприклад, WSGI) для порівняння')
+        parser.add_argument('--prepare', type=int, help='Внутрішній режим: створити класи в базі сервера')
+
+    def handle(self, *args, **options):
+        if options['prepare']:
+            self.prepare(options['prepare'])
+            return
+        if options['teachers'] and options['url']:
+            # Teachers open submissions by id, which is only predictable in the harness's own fresh database
+            raise CommandError('--teachers працює лише з власним сервером команди (без --url)')
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        payloads = self.generate_payloads(rng, options['files'])
+        sizes = sorted(len(content) for _, content in payloads)
+        self.stdout.write(
+            f'Файлів: {len(payloads)} за {time.perf_counter() - started:.1f} с, '
+            f'медіана {sizes[len(sizes) // 2] / 1024:.0f} КБ, максимум {sizes[-1] / 1024 / 1024:.1f} МБ'
+        )
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        if options['url']:
+            result = self.rush(options['url'].rstrip('/'), options['pid'], None, payloads, rng, options)
+        else:
+            with tempfile.TemporaryDirectory(prefix='deadline-rush-') as root:
+                process, url = self.start_server(root, options)
+                try:
+                    result = self.rush(url, [process.pid], root, payloads, rng, options)
+                finally:
+                    process.terminate()
+                    process.wait(10)
+        result['server'] = self.server_kind(options)
+        self.report(result)
+        if baseline is not None:
+            self.compare(baseline, result)
+
+        if options['output']:
+            commit, dirty = git_revision()
+            result.update({'commit': commit, 'dirty': dirty,
+                           'options': {key: options[key] for key in
+                                       ('students', 'concurrency', 'ramp', 'production', 'workers', 'threads',
+                                        'asgi', 'upload_rate', 'teachers')}})
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результат: {options["output"]}')
+
+    def prepare(self, count):
+        from django.contrib.auth.models import User
+        from submissions.models import ClassGroup
+        for n in range(count):
+            ClassGroup.objects.get_or_create(name=f'{5 + n % 7}-{"АБВГДЕЄЖ"[n // 7 % 8]}')
+        if not User.objects.filter(username=TEACHER[0]).exists():
+            User.objects.create_user(TEACHER[0], password=TEACHER[1], is_staff=True)
+
+    def server_kind(self, options):
+        if options['url']:
+            return options['url']
+        if options['asgi']:
+            return f"uvicorn x{options['workers']}"
+        if options['workers'] > 1 or options['threads']:
+            return f"gunicorn x{options['workers']}, {max(1, options['threads'])} потоків"
+        return 'runserver'
+
+    def generate_payloads(self, rng, count):
+        """(ім'я файлу, вміст) у пропорціях форматів seed_school і з реалістичними розмірами"""
+        payloads = []
+        for n in range(count):
+            extension = synthetic.pick_format(rng)
+            content = synthetic.make_upload(extension, rng, synthetic.upload_size(rng))
+            payloads.append((f'robota_{n}{extension}', content))
+        return payloads
+
+    def start_server(self, root, options):
+        with open(os.path.join(root, 'rush_settings.py'), 'w', encoding='utf-8') as f:
+            f.write(SERVER_SETTINGS.format(root=root))
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='rush_settings',
+                   PYTHONPATH=os.pathsep.join([root, str(settings.BASE_DIR), os.environ.get('PYTHONPATH', '')]),
+                   SQLITE_PRODUCTION='1' if options['production'] else '0')
+        manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+        subprocess.run(manage + ['migrate', '-v0'], env=env, check=True)
+        subprocess.run(manage + ['deadline_rush', '--prepare', '7'], env=env, check=True)
+
+        port = _free_port()
+        if options['asgi']:
+            if importlib.util.find_spec('uvicorn') is None:
+                raise CommandError('Для --asgi потрібен uvicorn (pip install uvicorn)')
+            command = [sys.executable, '-m', 'uvicorn', 'myproject2.asgi:application', '--host', '127.0.0.1',
+                       '--port', str(port), '--workers', str(options['workers']), '--no-access-log']
+        elif options['workers'] > 1 or options['threads']:
+            command = [sys.executable, '-m', 'gunicorn', 'myproject2.wsgi', '--bind', f'127.0.0.1:{port}',
+                       '--workers', str(options['workers']), '--threads', str(max(1, options['threads'])),
+                       '--timeout', str(int(options['timeout']) + 5)]
+        else:
+            command = manage + ['runserver', f'127.0.0.1:{port}', '--noreload']
+        process = subprocess.Popen(command, env=env, cwd=str(settings.BASE_DIR),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'Сервер завершився з кодом {process.returncode} (для --workers/--threads потрібен gunicorn)')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return process, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.2)
+        process.kill()
+        raise CommandError('Сервер не запустився за 30 с')
+
+    def server_counters(self, url):
+        parts = urlsplit(url)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+        try:
+            connection.request('GET', parts.path + '/metrics')
+            response = connection.getresponse()
+            text = response.read().decode('utf-8', 'replace')
+        except OSError:
+            return None
+        finally:
+            connection.close()
+        if response.status != 200:
+            return None
+        counters = dict.fromkeys(SERVER_COUNTERS, 0.0)
+        for line in text.splitlines():
+            name = line.split('{', 1)[0].split(' ', 1)[0]
+            if name in counters:
+                counters[name] += float(line.rsplit(' ', 1)[1])
+        return counters
+
+    def student(self, url, payload, arrival, rush_started, rng_seed, options, accepted):
+        """Один учень: відкриває форму і надсилає файл; повертає вимір"""
+        parts = urlsplit(url)
+        rng = random.Random(rng_seed)
+        delay = arrival - (time.perf_counter() - rush_started)
+        if delay > 0:
+            time.sleep(delay)
+        name, content = payload
+        outcome = {'bytes': len(content)}
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=options['timeout'])
+        try:
+            connection.request('GET', parts.path + '/')
+            response = connection.getresponse()
+            page = response.read().decode('utf-8', 'replace')
+            cookie = CSRF_COOKIE.search(response.getheader('Set-Cookie') or '')
+            token = CSRF_INPUT.search(page)
+            classes = CLASS_OPTION.findall(page)
+            if response.status != 200 or not (cookie and token and classes):
+                outcome['result'] = 'form_unavailable'
+                return outcome
+
+            body, content_type = multipart({
+                'csrfmiddlewaretoken': token.group(1),
+                'full_name': f'{rng.choice(synthetic.LAST_NAMES)} {rng.choice(synthetic.FIRST_NAMES)}',
+                'class_group': rng.choice(classes),
+                'link': '',
+            }, 'file', name, content)
+            headers = {
+                'Content-Type': content_type,
+                'Cookie': f'csrftoken={cookie.group(1)}',
+                'Referer': url + '/',
+            }
+            started = time.perf_counter()
+            if options['upload_rate']:
+                send_slowly(connection, parts.path + '/', body, headers, options['upload_rate'])
+            else:
+                connection.request('POST', parts.path + '/', body=body, headers=headers)
+            sent = time.perf_counter()
+            response = connection.getresponse()
+            answer = response.read()
+            outcome['latency_ms'] = (time.perf_counter() - started) * 1000
+            # What the server added after the last byte of the upload arrived
+            outcome['response_ms'] = (time.perf_counter() - sent) * 1000
+            outcome['finished'] = time.perf_counter() - rush_started
+        except socket.timeout:
+            outcome['result'] = 'timeout'
+            return outcome
+        except OSError:
+            outcome['result'] = 'connection_error'
+            return outcome
+        finally:
+            connection.close()
+
+        if response.status == 302:
+            outcome['result'] = 'ok'
+            accepted.append(outcome)
+        elif response.status == 200:
+            # The form came back with validation errors
+            outcome['result'] = 'rejected'
+        elif b'database is locked' in answer:
+            outcome['result'] = 'locked'
+        else:
+            outcome['result'] = f'http_{response.status}'
+        return outcome
+
+    def login(self, url, timeout):
+        """Вхід вчителя TEACHER; повертає sessionid або None"""
+        parts = urlsplit(url)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+        try:
+            connection.request('GET', parts.path + '/teacher/')
+            response = connection.getresponse()
+            page = response.read().decode('utf-8', 'replace')
+            cookie = CSRF_COOKIE.search(response.getheader('Set-Cookie') or '')
+            token = CSRF_INPUT.search(page)
+            if not (cookie and token):
+                return None
+            body = urlencode({'csrfmiddlewaretoken': token.group(1), 'username': TEACHER[0], 'password': TEACHER[1]})
+            connection.request('POST', parts.path + '/teacher/', body=body, headers={
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Cookie': f'csrftoken={cookie.group(1)}',
+                'Referer': url + '/teacher/',
+            })
+            response = connection.getresponse()
+            response.read()
+        except OSError:
+            return None
+        finally:
+            connection.close()
+        session = SESSION_COOKIE.search(response.getheader('Set-Cookie') or '')
+        return session.group(1) if session else None
+
+    def teacher(self, url, rng_seed, options, accepted, done):
+        """Вчитель: відкриває перегляд уже зданих робіт, поки учні здають; повертає виміри"""
+        parts = urlsplit(url)
+        rng = random.Random(rng_seed)
+        session = self.login(url, options['timeout'])
+        if session is None:
+            return [{'result': 'login_failed'}]
+        outcomes = []
+        while not done.is_set():
+            if not accepted:
+                time.sleep(0.2)
+                continue
+            # The server's database starts empty, so accepted submissions have ids 1..n
+            pk = rng.randint(1, len(accepted))
+            outcome = {}
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=options['timeout'])
+            started = time.perf_counter()
+            try:
+                connection.request('GET', f'{parts.path}/teacher/view-file/{pk}/',
+                                   headers={'Cookie': f'sessionid={session}'})
+                response = connection.getresponse()
+                response.read()
+                outcome['latency_ms'] = (time.perf_counter() - started) * 1000
+                outcome['result'] = 'ok' if response.status == 200 else f'http_{response.status}'
+            except socket.timeout:
+                outcome['result'] = 'timeout'
+            except OSError:
+                outcome['result'] = 'connection_error'
+            finally:
+                connection.close()
+            outcomes.append(outcome)
+        return outcomes
+
+    def rush(self, url, pids, root, payloads, rng, options):
+        students = options['students']
+        ramp = options['ramp']
+        # Arrivals pile up towards the deadline at the end of the ramp
+        arrivals = sorted(rng.triangular(0, ramp, ramp) for _ in range(students))
+        plan = [(rng.choice(payloads), arrival, rng.getrandbits(32)) for arrival in arrivals]
+
+        counters_before = self.server_counters(url)
+        written_before = disk_write_bytes(pids)
+        stored_before = _tree_size(root) if root else 0
+
+        self.stdout.write(f'{students} учнів за {ramp:.0f} с, одночасно до {options["concurrency"]} -> {url}')
+        accepted, done = [], threading.Event()
+        teachers = ThreadPoolExecutor(max_workers=options['teachers'] or 1)
+        teacher_futures = [teachers.submit(self.teacher, url, rng.getrandbits(32), options, accepted, done)
+                           for _ in range(options['teachers'])]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            futures = [pool.submit(self.student, url, payload, arrival, started, seed, options, accepted)
+                       for payload, arrival, seed in plan]
+            outcomes = [future.result() for future in futures]
+        duration = time.perf_counter() - started
+        done.set()
+        previews = [outcome for future in teacher_futures for outcome in future.result()]
+        teachers.shutdown()
+
+        # Let the server finish background work (PDF analysis, WAL checkpoints) before reading I/O
+        time.sleep(1)
+        written = disk_write_bytes(pids) - written_before
+        counters_after = self.server_counters(url)
+
+        by_result = {}
+        for outcome in outcomes:
+            by_result[outcome['result']] = by_result.get(outcome['result'], 0) + 1
+        ok = [outcome for outcome in outcomes if outcome['result'] == 'ok']
+        latencies = sorted(outcome['latency_ms'] for outcome in outcomes if 'latency_ms' in outcome)
+        response_times = sorted(outcome['response_ms'] for outcome in outcomes if 'response_ms' in outcome)
+        ok_latencies = sorted(outcome['latency_ms'] for outcome in ok)
+        payload_bytes = sum(outcome['bytes'] for outcome in ok)
+        last_finish = max((outcome['finished'] for outcome in ok), default=duration)
+
+        result = {
+            'url': url,
+            'students': students,
+            'duration_s': round(duration, 2),
+            'results': by_result,
+            'error_rate': round(1 - len(ok) / students, 4),
+            'throughput_per_s': round(len(ok) / last_finish, 2) if ok else 0,
+            'uploaded_mb': round(payload_bytes / 1024 / 1024, 2),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 1) if latencies else None,
+                'p90': round(percentile(latencies, 90), 1) if latencies else None,
+                'p99': round(percentile(latencies, 99), 1) if latencies else None,
+                'max': round(latencies[-1], 1) if latencies else None,
+                'ok_p99': round(percentile(ok_latencies, 99), 1) if ok_latencies else None,
+                # From the last byte of the upload to the answer: the server's own share
+                'response_p50': round(percentile(response_times, 50), 1) if response_times else None,
+                'response_p99': round(percentile(response_times, 99), 1) if response_times else None,
+            },
+            'disk_written_mb': round(written / 1024 / 1024, 2) if pids else None,
+            'write_amplification': round(written / payload_bytes, 2) if pids and payload_bytes else None,
+        }
+        if options['teachers']:
+            preview_results = {}
+            for outcome in previews:
+                preview_results[outcome['result']] = preview_results.get(outcome['result'], 0) + 1
+            preview_latencies = sorted(outcome['latency_ms'] for outcome in previews if outcome['result'] == 'ok')
+            result['previews'] = {
+                'teachers': options['teachers'],
+                'results': preview_results,
+                'per_s': round(len(preview_latencies) / duration, 2),
+                'p50_ms': round(percentile(preview_latencies, 50), 1) if preview_latencies else None,
+                'p99_ms': round(percentile(preview_latencies, 99), 1) if preview_latencies else None,
+            }
+        if root:
+            stored = _tree_size(root) - stored_before
+            result['stored_mb'] = round(stored / 1024 / 1024, 2)
+            result['storage_amplification'] = round(stored / payload_bytes, 2) if payload_bytes else None
+        if counters_before is not None and counters_after is not None:
+            locked = counters_after['sqlite_locked_errors_total'] - counters_before['sqlite_locked_errors_total']
+            waits = counters_after['sqlite_lock_waits_total'] - counters_before['sqlite_lock_waits_total']
+            result['sqlite_locked_errors'] = int(locked)
+            result['sqlite_lock_waits'] = int(waits)
+            result['lock_timeout_rate'] = round(locked / students, 4)
+        return result
+
+    def report(self, result):
+        latency = result['latency_ms']
+        self.stdout.write(
+            f"Прийнято {result['results'].get('ok', 0)}/{result['students']} за {result['duration_s']} с: "
+            f"{result['throughput_per_s']} робіт/с, {result['uploaded_mb']} МБ"
+        )
+        if latency['p50'] is not None:
+            self.stdout.write(f"Відповідь на POST: p50 {latency['p50']} мс, p90 {latency['p90']} мс, "
+                              f"p99 {latency['p99']} мс, максимум {latency['max']} мс")
+            self.stdout.write(f"Після завантаження: p50 {latency['response_p50']} мс, p99 {latency['response_p99']} мс")
+        failures = {key: count for key, count in result['results'].items() if key != 'ok'}
+        style = self.style.ERROR if failures else self.style.SUCCESS
+        self.stdout.write(style(f"Помилки: {result['error_rate']:.1%} {failures or ''}"))
+        if 'sqlite_locked_errors' in result:
+            self.stdout.write(f"SQLite: database is locked {result['sqlite_locked_errors']} "
+                              f"({result['lock_timeout_rate']:.1%}), довгих очікувань блокування {result['sqlite_lock_waits']}")
+        else:
+            self.stdout.write('SQLite: /metrics недоступний, блокування не пораховано')
+        if result['write_amplification'] is not None:
+            self.stdout.write(f"Записано на диск {result['disk_written_mb']} МБ, "
+                              f"підсилення запису x{result['write_amplification']}")
+        if result.get('storage_amplification') is not None:
+            self.stdout.write(f"Приріст файлів і бази {result['stored_mb']} МБ (x{result['storage_amplification']})")
+        previews = result.get('previews')
+        if previews:
+            failures = {key: count for key, count in previews['results'].items() if key != 'ok'}
+            style = self.style.ERROR if failures else str
+            self.stdout.write(style(f"Перегляди вчителів ({previews['teachers']}): {previews['per_s']}/с, "
+                                    f"p50 {previews['p50_ms']} мс, p99 {previews['p99_ms']} мс {failures or ''}"))
+
+    def compare(self, before, after):
+        """Друкує зміни відносно попереднього результату (наприклад, ASGI проти WSGI)"""
+        rows = (
+            ('Прийнято за секунду', before.get('throughput_per_s'), after.get('throughput_per_s'), False),
+            ('Помилки', before.get('error_rate'), after.get('error_rate'), True),
+            ('p99 POST, мс', before['latency_ms'].get('p99'), after['latency_ms'].get('p99'), True),
+            ('p99 після завантаження, мс', before['latency_ms'].get('response_p99'),
+             after['latency_ms'].get('response_p99'), True),
+            ('p99 перегляду, мс', (before.get('previews') or {}).get('p99_ms'),
+             (after.get('previews') or {}).get('p99_ms'), True),
+        )
+        self.stdout.write(f"Порівняння: {before.get('server', '?')} -> {after['server']}")
+        for label, old, new, lower_is_better in rows:
+            if old is None or new is None:
+                continue
+            better = new < old if lower_is_better else new > old
+            style = self.style.SUCCESS if better else self.style.ERROR if new != old else str
+            self.stdout.write(style(f'  {label:<28} {old:>10} -> {new}'))
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from submissions import images
+
+
+class Command(BaseCommand):
+    help = 'Видаляє найдавніше використані зменшені копії зображень понад ліміт сховища'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-mb', type=int, help='Ліміт у МБ (типово IMAGE_DERIVATIVE_MAX_BYTES)')
+
+    def handle(self, *args, **options):
+        max_bytes = settings.IMAGE_DERIVATIVE_MAX_BYTES
+        if options['max_mb'] is not None:
+            max_bytes = options['max_mb'] * 1024 * 1024
+        removed, total = images.evict(max_bytes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Видалено файлів: {removed}, у сховищі {total / 1024 / 1024:.1f} МБ '
+            f'з {max_bytes / 1024 / 1024:.0f} МБ'
+        ))
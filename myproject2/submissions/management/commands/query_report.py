@@ -0,0 +1,50 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from submissions import querywatch
+
+
+class Command(BaseCommand):
+    help = 'Зведення повільних запитів і N+1 з журналу QUERY_WATCH_LOG за сторінками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help='За скільки останніх годин (за замовчуванням 24)')
+        parser.add_argument('--limit', type=int, default=20, help='Скільки проблем показати')
+        parser.add_argument('--log', default=None, help='Файл журналу (за замовчуванням QUERY_WATCH_LOG)')
+
+    def handle(self, *args, **options):
+        log_path = options['log'] or settings.QUERY_WATCH_LOG
+        since = time.time() - options['hours'] * 3600
+
+        groups = defaultdict(lambda: {'requests': 0, 'worst': 0.0, 'total_ms': 0.0, 'where': None})
+        for event in querywatch.read_events(log_path, since):
+            kind = event['event']
+            key = (kind, event.get('view'), querywatch.shape(event['sql']))
+            group = groups[key]
+            group['requests'] += 1
+            if kind == 'n_plus_one':
+                group['worst'] = max(group['worst'], event['count'])
+                group['total_ms'] += event['total_ms']
+            else:
+                group['worst'] = max(group['worst'], event['duration_ms'])
+                group['total_ms'] += event['duration_ms']
+            group['where'] = event.get('template') or (event.get('stack') or ['?'])[0]
+
+        if not groups:
+            self.stdout.write(f'У {log_path} немає подій за вказаний період')
+            return
+
+        # Most total time first: that is what a fix would save
+        ranked = sorted(groups.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        for (kind, view, sql), group in ranked[:options['limit']]:
+            if kind == 'n_plus_one':
+                title = f"N+1 до {int(group['worst'])} запитів"
+            else:
+                title = f"Повільний запит до {group['worst']:.0f} мс"
+            self.stdout.write(self.style.WARNING(f'{title} | {view} | {group["requests"]} разів, {group["total_ms"]:.0f} мс'))
+            self.stdout.write(f'    {group["where"]}')
+            self.stdout.write(f'    {sql[:200]}')
+        self.stdout.write(self.style.SUCCESS(f'Проблем: {len(groups)}, показано {min(len(groups), options["limit"])}'))
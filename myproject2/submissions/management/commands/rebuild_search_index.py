@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from submissions import schools, search
+
+
+class Command(BaseCommand):
+    help = 'Перебудовує повнотекстовий індекс робіт і коментарів (усі бази або вказану)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help="Псевдонім бази (за замовчуванням - 'default' і всі школи)")
+
+    def handle(self, *args, **options):
+        if options['database']:
+            aliases = [options['database']]
+        else:
+            aliases = ['default'] + [schools.register_database(slug) for slug in schools.load_registry()]
+
+        for alias in aliases:
+            started = time.perf_counter()
+            count = search.rebuild(alias)
+            self.stdout.write(self.style.SUCCESS(
+                f'{alias}: проіндексовано {count} робіт за {time.perf_counter() - started:.1f} с'
+            ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from submissions import code_similarity, schools, similarity
+
+
+class Command(BaseCommand):
+    help = 'Перераховує MinHash-підписи документів і відбитки коду для пошуку схожих робіт (усі бази або вказану)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help="Псевдонім бази (за замовчуванням - 'default' і всі школи)")
+
+    def handle(self, *args, **options):
+        if options['database']:
+            aliases = [options['database']]
+        else:
+            aliases = ['default'] + [schools.register_database(slug) for slug in schools.load_registry()]
+
+        for alias in aliases:
+            started = time.perf_counter()
+            documents = similarity.rebuild(alias)
+            code_files = code_similarity.rebuild(alias)
+            self.stdout.write(self.style.SUCCESS(
+                f'{alias}: {documents} документів і {code_files} файлів коду '
+                f'за {time.perf_counter() - started:.1f} с'
+            ))
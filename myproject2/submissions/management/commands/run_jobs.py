@@ -0,0 +1,141 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from submissions import jobs, schools
+
+# Seconds between deletions of old finished jobs in each worker
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Виконує фонові завдання з черги в базі (основна база і всі школи або вказана) кількома '
+        'процесами; SIGTERM або Ctrl+C - дочекатися поточних завдань і вийти, повторно - зупинити одразу'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', help='Лише ця школа (за замовчуванням - основна база і всі школи)')
+        parser.add_argument('--processes', type=int, default=settings.JOB_WORKER_PROCESSES,
+                            help='Кількість процесів-обробників')
+        parser.add_argument('--poll', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help='Пауза обробника без завдань, с')
+        parser.add_argument('--grace', type=float, default=settings.JOB_SHUTDOWN_GRACE,
+                            help='Скільки чекати завершення поточних завдань при зупинці, с')
+        parser.add_argument('--burst', action='store_true', help='Вийти, коли черга порожня')
+        parser.add_argument('--worker', action='store_true', help='Внутрішній режим: один процес-обробник')
+
+    def handle(self, *args, **options):
+        slug = options['school']
+        if slug and slug not in schools.load_registry():
+            raise CommandError(f'Школу {slug} не знайдено (див. school_create)')
+        if options['worker']:
+            self.run_worker(options)
+        else:
+            self.supervise(options)
+
+    def aliases(self, slug):
+        if slug:
+            return [schools.register_database(slug)]
+        # Read every round: schools created while the workers run are picked up
+        return ['default'] + [schools.register_database(name) for name in schools.load_registry()]
+
+    def run_worker(self, options):
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            # The current job runs to the end; the loop exits afterwards
+            stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        turn = 0
+        purged_at = 0.0
+        try:
+            while not stopping.is_set():
+                aliases = self.aliases(options['school'])
+                # Start from a different school each round so a busy one does not starve the rest
+                turn = (turn + 1) % len(aliases)
+                outcome = None
+                for alias in aliases[turn:] + aliases[:turn]:
+                    job = jobs.claim(name, alias)
+                    if job is None:
+                        continue
+                    started = time.perf_counter()
+                    outcome = jobs.run(job, alias)
+                    self.stdout.write(f'{alias} #{job.pk} {job.task}{tuple(job.args)}: {outcome} '
+                                      f'({time.perf_counter() - started:.1f} с, спроба {job.attempts})')
+                    break
+                if outcome is not None:
+                    continue
+                if options['burst']:
+                    break
+                if time.monotonic() - purged_at > PURGE_INTERVAL:
+                    purged_at = time.monotonic()
+                    for alias in aliases:
+                        jobs.purge(alias)
+                stopping.wait(options['poll'])
+        finally:
+            connections.close_all()
+
+    def spawn(self, options):
+        command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'run_jobs', '--worker',
+                   '--poll', str(options['poll'])]
+        if options['school']:
+            command += ['--school', options['school']]
+        if options['burst']:
+            command.append('--burst')
+        return subprocess.Popen(command)
+
+    def supervise(self, options):
+        children = [self.spawn(options) for _ in range(max(1, options['processes']))]
+        self.stdout.write(f'Обробників: {len(children)} (pid {", ".join(str(c.pid) for c in children)})')
+        stopping_since = []
+
+        def stop(signum, frame):
+            if stopping_since:
+                self.kill(children)
+                return
+            stopping_since.append(time.monotonic())
+            self.stdout.write(f'Зупинка: чекаємо поточні завдання до {options["grace"]:.0f} с')
+            for child in children:
+                if child.poll() is None:
+                    child.send_signal(signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        while True:
+            alive = [child for child in children if child.poll() is None]
+            if not alive and (stopping_since or options['burst']):
+                break
+            if stopping_since and time.monotonic() - stopping_since[0] > options['grace']:
+                # Their jobs go back to the queue when the leases run out
+                self.stdout.write(self.style.WARNING(f'Не завершилися вчасно: {len(alive)}, зупиняємо примусово'))
+                self.kill(alive)
+                break
+            if not stopping_since and not options['burst']:
+                for i, child in enumerate(children):
+                    if child.returncode is not None:
+                        self.stdout.write(self.style.WARNING(
+                            f'Обробник {child.pid} завершився з кодом {child.returncode}, перезапуск'))
+                        children[i] = self.spawn(options)
+            time.sleep(0.5)
+        self.stdout.write(self.style.SUCCESS('Обробники зупинені'))
+
+    def kill(self, children):
+        for child in children:
+            if child.poll() is None:
+                child.kill()
+        for child in children:
+            child.wait()
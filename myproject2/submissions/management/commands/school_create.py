@@ -0,0 +1,48 @@
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from submissions import schools
+
+
+class Command(BaseCommand):
+    help = 'Створює школу: окрему базу SQLite і каталог файлів, та застосовує міграції'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Ідентифікатор школи (латиниця, цифри, - та _)')
+        parser.add_argument('--name', default='', help='Назва школи')
+        parser.add_argument('--host', action='append', default=[], dest='hosts',
+                            help='Хост, за яким відкривається школа (можна кілька)')
+
+    def handle(self, *args, **options):
+        slug = options['slug']
+        if not schools.SLUG_RE.match(slug):
+            raise CommandError(f'Некоректний ідентифікатор школи: {slug}')
+
+        registry = schools.load_registry()
+        if slug in registry:
+            raise CommandError(f'Школа {slug} вже існує')
+
+        hosts = [host.lower() for host in options['hosts']]
+        for other, config in registry.items():
+            taken = set(hosts) & set(config.get('hosts', []))
+            if taken:
+                raise CommandError(f"Хост {', '.join(taken)} вже належить школі {other}")
+
+        os.makedirs(schools.media_root(slug), exist_ok=True)
+        registry[slug] = {'name': options['name'] or slug, 'hosts': hosts}
+        schools.save_registry(registry)
+        settings.SCHOOLS[slug] = registry[slug]
+
+        alias = schools.register_database(slug)
+        call_command('migrate', database=alias, interactive=False, verbosity=0)
+
+        self.stdout.write(self.style.SUCCESS(f'Школу {slug} створено ({schools.db_path(slug)})'))
+        self.stdout.write(
+            f'Адреса: /{settings.SCHOOL_PATH_PREFIX}/{slug}/'
+            + (f" або http://{hosts[0]}/" if hosts else '')
+        )
+        self.stdout.write(f'Вчитель: python manage.py createsuperuser --database {alias}')
+        self.stdout.write('Перезапустіть сервер, щоб він побачив нову школу.')
@@ -0,0 +1,29 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from submissions import schools
+
+
+class Command(BaseCommand):
+    help = 'Застосовує міграції до баз усіх шкіл (або вказаних)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Школи (за замовчуванням - усі)')
+        parser.add_argument('--include-default', action='store_true',
+                            help="Також мігрувати базу 'default'")
+
+    def handle(self, *args, **options):
+        registry = schools.load_registry()
+        slugs = options['slugs'] or list(registry)
+        unknown = [slug for slug in slugs if slug not in registry]
+        if unknown:
+            raise CommandError(f"Невідомі школи: {', '.join(unknown)}")
+
+        aliases = [schools.register_database(slug) for slug in slugs]
+        if options['include_default']:
+            aliases.insert(0, 'default')
+
+        for alias in aliases:
+            self.stdout.write(f'Міграції для {alias}...')
+            call_command('migrate', database=alias, interactive=False, verbosity=max(0, options['verbosity'] - 1))
+        self.stdout.write(self.style.SUCCESS(f'Оновлено баз: {len(aliases)}'))
@@ -0,0 +1,126 @@
+import os
+import shutil
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from submissions import schools
+from submissions.models import ActivityLog, ClassGroup, Comment, Submission
+
+USER_FIELDS = ['password', 'first_name', 'last_name', 'email', 'is_staff', 'is_superuser', 'is_active']
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносить класи разом з роботами, коментарями, журналом дій і файлами '
+        "з однієї бази в іншу (школа або 'default'), наприклад при переході "
+        'зі спільної бази на окремі бази шкіл'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='source', required=True, help="Школа-джерело або 'default'")
+        parser.add_argument('--to', dest='target', required=True, help="Школа-призначення або 'default'")
+        parser.add_argument('--class', dest='classes', action='append', default=[],
+                            help='Назва класу (можна кілька; за замовчуванням - усі)')
+        parser.add_argument('--dry-run', action='store_true', help='Лише показати, що буде перенесено')
+
+    def resolve(self, value):
+        if value == 'default':
+            return None, 'default'
+        if value not in schools.load_registry():
+            raise CommandError(f'Невідома школа: {value}')
+        return value, schools.register_database(value)
+
+    def handle(self, *args, **options):
+        source_slug, self.source = self.resolve(options['source'])
+        target_slug, self.target = self.resolve(options['target'])
+        if self.source == self.target:
+            raise CommandError('Джерело і призначення збігаються')
+        self.source_root = schools.media_root(source_slug)
+        self.target_root = schools.media_root(target_slug)
+
+        class_groups = ClassGroup.objects.using(self.source).all()
+        if options['classes']:
+            class_groups = class_groups.filter(name__in=options['classes'])
+
+        for class_group in list(class_groups):
+            submissions = Submission.objects.using(self.source).filter(class_group=class_group)
+            if options['dry_run']:
+                self.stdout.write(f'{class_group.name}: {submissions.count()} робіт')
+                continue
+            moved = self.move_class(class_group, list(submissions))
+            self.stdout.write(self.style.SUCCESS(f'{class_group.name}: перенесено {moved} робіт'))
+
+    def map_user(self, user_id):
+        """Знаходить або створює того самого користувача (за username) у базі-призначенні"""
+        if user_id is None:
+            return None
+        if user_id not in self.users:
+            source_user = User.objects.using(self.source).get(pk=user_id)
+            target_user = User.objects.using(self.target).filter(username=source_user.username).first()
+            if target_user is None:
+                target_user = User(username=source_user.username,
+                                   **{field: getattr(source_user, field) for field in USER_FIELDS})
+                target_user.save(using=self.target)
+            self.users[user_id] = target_user.pk
+        return self.users[user_id]
+
+    def move_class(self, class_group, submissions):
+        self.users = {}
+        files = [sub.file.name for sub in submissions if sub.file]
+        conflicts = [name for name in files if os.path.exists(os.path.join(self.target_root, name))]
+        if conflicts:
+            raise CommandError(f"Файли вже існують у призначенні: {', '.join(conflicts[:5])}")
+
+        copied = []
+        try:
+            with transaction.atomic(using=self.target):
+                # Files are copied first so that save() signals (e.g. the search
+                # index) already see them in the target media root
+                for name in files:
+                    source_path = os.path.join(self.source_root, name)
+                    if os.path.exists(source_path):
+                        target_path = os.path.join(self.target_root, name)
+                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                        shutil.copy2(source_path, target_path)
+                        copied.append(target_path)
+
+                target_class, _ = ClassGroup.objects.using(self.target).get_or_create(name=class_group.name)
+                for sub in submissions:
+                    copy = Submission(
+                        first_name=sub.first_name, last_name=sub.last_name, class_group=target_class,
+                        file=sub.file.name or None, link=sub.link, grade=sub.grade,
+                        teacher_id=self.map_user(sub.teacher_id),
+                    )
+                    copy.save(using=self.target)
+                    # auto_now_add fields are restored with update()
+                    Submission.objects.using(self.target).filter(pk=copy.pk).update(submitted_at=sub.submitted_at)
+
+                    for comment in Comment.objects.using(self.source).filter(submission=sub):
+                        new_comment = Comment(submission=copy, author_id=self.map_user(comment.author_id), text=comment.text)
+                        new_comment.save(using=self.target)
+                        Comment.objects.using(self.target).filter(pk=new_comment.pk).update(created_at=comment.created_at)
+
+                    for log in ActivityLog.objects.using(self.source).filter(submission=sub):
+                        new_log = ActivityLog(actor_id=self.map_user(log.actor_id), action_type=log.action_type,
+                                              description=log.description, submission=copy)
+                        new_log.save(using=self.target)
+                        ActivityLog.objects.using(self.target).filter(pk=new_log.pk).update(timestamp=log.timestamp)
+        except BaseException:
+            # The rows were rolled back; leftover copies would fail the conflict check on every rerun
+            for path in copied:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        with transaction.atomic(using=self.source):
+            ActivityLog.objects.using(self.source).filter(submission__class_group=class_group).delete()
+            class_group.delete(using=self.source)
+
+        for name in files:
+            source_path = os.path.join(self.source_root, name)
+            if os.path.exists(source_path):
+                os.remove(source_path)
+
+        return len(submissions)
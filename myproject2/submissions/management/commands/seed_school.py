@@ -0,0 +1,207 @@
+import functools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from submissions import cache as fragment_cache
+from submissions import schools, search, synthetic, utils
+from submissions.models import ActivityLog, ClassGroup, Comment, Submission
+from submissions.utils import normalize_name
+
+CLASS_LETTERS = 'АБВГДЕЄЖ'
+
+COMMENTS = (
+    'Добре, але додай висновки.',
+    'Перевір оформлення таблиці.',
+    'Чудова робота!',
+    'Не вистачає джерел.',
+    'Виправ помилки в третьому завданні і здай ще раз.',
+    'Код працює, але назви змінних неінформативні.',
+)
+
+
+@contextmanager
+def explicit_timestamps():
+    # bulk_create fills auto_now_add fields with "now"; keep the generated dates
+    fields = [
+        Submission._meta.get_field('submitted_at'),
+        Comment._meta.get_field('created_at'),
+        ActivityLog._meta.get_field('timestamp'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def shared_text_extraction():
+    # Seeded submissions share a few hundred files; parse each one once while indexing
+    original = utils.extract_text
+    utils.extract_text = functools.lru_cache(maxsize=None)(original)
+    try:
+        yield
+    finally:
+        utils.extract_text = original
+
+
+class Command(BaseCommand):
+    help = (
+        'Заповнює школу синтетичними даними для бенчмарків: класи, учні, роботи зі '
+        'справжніми файлами (docx, xlsx, pptx, odt, zip, jpg, py), оцінки, коментарі і журнал дій'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', help='Школа (за замовчуванням - основна база)')
+        parser.add_argument('--classes', type=int, default=24, help='Кількість класів')
+        parser.add_argument('--students', type=int, default=28, help='Учнів у класі')
+        parser.add_argument('--submissions', type=int, default=100_000, help='Кількість робіт')
+        parser.add_argument('--unique-files', type=int, default=300,
+                            help='Різних файлів; роботи посилаються на них по черзі, щоб не займати гігабайти')
+        parser.add_argument('--links', type=float, default=0.1, help='Частка робіт-посилань')
+        parser.add_argument('--graded', type=float, default=0.6, help='Частка оцінених робіт')
+        parser.add_argument('--commented', type=float, default=0.3, help='Частка робіт з коментарями')
+        parser.add_argument('--days', type=int, default=120, help='За скільки днів розподілити роботи')
+        parser.add_argument('--seed', type=int, default=1, help='Зерно генератора (однакове - однакові дані)')
+        parser.add_argument('--teacher', default='teacher', help='Логін вчителя (створюється, якщо немає)')
+        parser.add_argument('--password', default='teacher', help='Пароль нового вчителя')
+        parser.add_argument('--batch', type=int, default=5000, help='Розмір пакета вставки')
+        parser.add_argument('--skip-index', action='store_true', help='Не перебудовувати пошуковий індекс')
+
+    def handle(self, *args, **options):
+        slug = options['school']
+        if slug and slug not in schools.load_registry():
+            raise CommandError(f'Школу {slug} не знайдено (див. school_create)')
+        alias = schools.register_database(slug) if slug else 'default'
+
+        started = time.perf_counter()
+        with schools.using_school(slug), explicit_timestamps():
+            self.seed(alias, options)
+            if not options['skip_index']:
+                index_started = time.perf_counter()
+                with shared_text_extraction():
+                    search.rebuild(alias)
+                self.stdout.write(f'Пошуковий індекс: {time.perf_counter() - index_started:.1f} с')
+            # Bulk inserts send no signals: drop the cached feed and class lists by hand
+            fragment_cache.bump_version(fragment_cache.FEED, alias)
+            fragment_cache.bump_version(fragment_cache.CLASSES, alias)
+        self.stdout.write(self.style.SUCCESS(f'{alias}: готово за {time.perf_counter() - started:.1f} с'))
+        self.stdout.write('Схожість робіт: python manage.py rebuild_similarity_index' + (f' --database {alias}' if slug else ''))
+
+    def seed(self, alias, options):
+        rng = random.Random(options['seed'])
+
+        teacher = User.objects.using(alias).filter(username=options['teacher']).first()
+        if teacher is None:
+            teacher = User(username=options['teacher'], is_staff=True)
+            teacher.set_password(options['password'])
+            teacher.save(using=alias)
+
+        class_groups = []
+        for n in range(options['classes']):
+            # 5-А ... 11-А, then 5-Б ... 11-Б and so on
+            parallel = n // 7
+            letter = CLASS_LETTERS[parallel] if parallel < len(CLASS_LETTERS) else str(parallel + 1)
+            name = f'{5 + n % 7}-{letter}'
+            class_groups.append(ClassGroup.objects.using(alias).get_or_create(name=name)[0])
+
+        all_names = [(last, first) for last in synthetic.LAST_NAMES for first in synthetic.FIRST_NAMES]
+        students = [
+            (class_group, last, first)
+            for class_group in class_groups
+            for last, first in rng.sample(all_names, min(options['students'], len(all_names)))
+        ]
+
+        files = self.generate_files(rng, options['unique_files'])
+
+        now = timezone.now()
+        total = options['submissions']
+        created = comments = 0
+        for offset in range(0, total, options['batch']):
+            batch = []
+            for n in range(offset, min(total, offset + options['batch'])):
+                class_group, last, first = rng.choice(students)
+                submission = Submission(
+                    first_name=first,
+                    last_name=last,
+                    class_group=class_group,
+                    submitted_at=now - timedelta(seconds=rng.randrange(options['days'] * 86400)),
+                    name_key=normalize_name(f'{last} {first}'),
+                )
+                if rng.random() < options['links'] or not files:
+                    submission.link = f'https://docs.google.com/document/d/{rng.getrandbits(64):x}'
+                else:
+                    submission.file.name = files[n % len(files)]
+                if rng.random() < options['graded']:
+                    submission.grade = str(rng.randint(1, 12))
+                    submission.teacher = teacher
+                batch.append(submission)
+
+            with transaction.atomic(using=alias):
+                Submission.objects.using(alias).bulk_create(batch)
+                comments += self.add_history(alias, rng, batch, teacher, options['commented'])
+            created += len(batch)
+            self.stdout.write(f'  робіт {created}/{total}, коментарів {comments}')
+
+    def generate_files(self, rng, count):
+        storage = Submission._meta.get_field('file').storage
+        files = []
+        started = time.perf_counter()
+        for n in range(count):
+            extension = synthetic.pick_format(rng)
+            # Every tenth file is a few times larger than a typical one
+            scale = rng.randint(3, 8) if n % 10 == 0 else 1
+            content = synthetic.make_file(extension, rng, scale)
+            files.append(storage.save(f'seed/{n:05d}{extension}', ContentFile(content)))
+        self.stdout.write(f'Файлів: {count} за {time.perf_counter() - started:.1f} с')
+        return files
+
+    def add_history(self, alias, rng, submissions, teacher, commented):
+        """Коментарі і журнал дій для вставлених робіт; повертає кількість коментарів"""
+        new_comments = []
+        logs = []
+        for submission in submissions:
+            name = f'{submission.last_name} {submission.first_name}'
+            logs.append(ActivityLog(
+                action_type='submission',
+                description=f'Учень {name} здав роботу ({submission.class_group.name})',
+                submission=submission,
+                timestamp=submission.submitted_at,
+            ))
+            if submission.grade:
+                logs.append(ActivityLog(
+                    actor=teacher,
+                    action_type='grading',
+                    description=f'Оцінено роботу: {name} - {submission.grade}',
+                    submission=submission,
+                    timestamp=submission.submitted_at + timedelta(hours=rng.randint(1, 72)),
+                ))
+            if rng.random() < commented:
+                for _ in range(rng.randint(1, 3)):
+                    created_at = submission.submitted_at + timedelta(hours=rng.randint(1, 96))
+                    new_comments.append(Comment(
+                        submission=submission,
+                        author=teacher,
+                        text=rng.choice(COMMENTS),
+                        created_at=created_at,
+                    ))
+                    logs.append(ActivityLog(
+                        actor=teacher,
+                        action_type='comment',
+                        description=f'Додано коментар до роботи {name}',
+                        submission=submission,
+                        timestamp=created_at,
+                    ))
+        Comment.objects.using(alias).bulk_create(new_comments)
+        ActivityLog.objects.using(alias).bulk_create(logs)
+        return len(new_comments)
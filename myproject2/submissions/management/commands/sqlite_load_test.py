@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, transaction
+
+from submissions.profiling import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Паралельне навантаження на SQLite (здача робіт + читання стрічки): '
+        'порівнює звичайні налаштування з профілем SQLITE_PRODUCTION'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Кількість паралельних процесів')
+        parser.add_argument('--duration', type=float, default=10, help='Тривалість кожного прогону, с')
+        parser.add_argument('--worker', action='store_true', help='Внутрішній режим: один процес навантаження')
+        parser.add_argument('--setup', action='store_true', help='Внутрішній режим: підготувати базу прогону')
+        parser.add_argument('--class-group', type=int, help='Внутрішній режим: клас для робіт обробника')
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            self.setup()
+            return
+        if options['worker']:
+            self.run_worker(options['duration'], options['class_group'])
+            return
+
+        with tempfile.TemporaryDirectory() as tmp:
+            results = {}
+            for profile, production in (('default', '0'), ('production', '1')):
+                env = dict(os.environ, SQLITE_PATH=os.path.join(tmp, f'{profile}.sqlite3'),
+                           SQLITE_PRODUCTION=production)
+                results[profile] = self.run_profile(env, options['workers'], options['duration'])
+
+        for profile, result in results.items():
+            self.stdout.write(
+                f"{profile:<11} {result['ops_per_sec']:8.1f} оп/с   "
+                f"помилок блокування {result['lock_errors']:<5} "
+                f"p50 {result['p50_ms']:7.1f} мс   p99 {result['p99_ms']:7.1f} мс"
+            )
+
+    def run_profile(self, env, workers, duration):
+        manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+        subprocess.run(manage + ['migrate', '-v0'], env=env, check=True)
+        # Created before the workers start: a lock error there would crash a worker
+        setup = subprocess.run(manage + ['sqlite_load_test', '--setup'], env=env, check=True,
+                               stdout=subprocess.PIPE, text=True)
+        class_group = setup.stdout.strip().splitlines()[-1]
+
+        processes = [
+            subprocess.Popen(manage + ['sqlite_load_test', '--worker', '--duration', str(duration),
+                                       '--class-group', class_group],
+                             env=env, stdout=subprocess.PIPE, text=True)
+            for _ in range(workers)
+        ]
+        ops, lock_errors, latencies = 0, 0, []
+        for process in processes:
+            out, _ = process.communicate()
+            result = json.loads(out.strip().splitlines()[-1])
+            ops += result['ops']
+            lock_errors += result['lock_errors']
+            latencies.extend(result['latencies'])
+
+        latencies = sorted(latency * 1000 for latency in latencies)
+        return {
+            'ops_per_sec': ops / duration,
+            'lock_errors': lock_errors,
+            'p50_ms': percentile(latencies, 50) if latencies else 0.0,
+            'p99_ms': percentile(latencies, 99) if latencies else 0.0,
+        }
+
+    def setup(self):
+        from submissions.models import ClassGroup
+
+        class_group, _ = ClassGroup.objects.get_or_create(name='load-test')
+        self.stdout.write(str(class_group.pk))
+
+    def run_worker(self, duration, class_group_id):
+        from submissions.models import Submission, log_activity
+
+        ops, lock_errors, latencies = 0, 0, []
+        deadline = time.monotonic() + duration
+        pid = os.getpid()
+        while time.monotonic() < deadline:
+            # Emulate one request: request_started/request_finished close or
+            # keep the connection depending on CONN_MAX_AGE
+            close_old_connections()
+            started = time.monotonic()
+            try:
+                with transaction.atomic():
+                    # Read-then-write inside one transaction, like a resubmission
+                    # check before the insert; with deferred BEGIN the lock upgrade
+                    # is where "database is locked" comes from
+                    Submission.objects.filter(last_name=f'Worker{pid}').exists()
+                    submission = Submission.objects.create(
+                        first_name=str(ops), last_name=f'Worker{pid}',
+                        class_group_id=class_group_id, link='https://example.com/'
+                    )
+                    log_activity(None, 'submission', f'Навантаження {pid}', submission=submission)
+                list(Submission.objects.order_by('-submitted_at')[:15])
+                ops += 1
+                latencies.append(time.monotonic() - started)
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                lock_errors += 1
+            close_old_connections()
+
+        self.stdout.write(json.dumps({'ops': ops, 'lock_errors': lock_errors, 'latencies': latencies}))
@@ -0,0 +1,326 @@
+"""
+Метрики у текстовому форматі Prometheus (/metrics) без зовнішніх сервісів
+
+Кожен процес пише свої лічильники у власний файл METRICS_DIR/metrics-<pid>.db,
+відображений у пам'ять (mmap): збільшення лічильника - запис восьми байтів
+у пам'ять, без системних викликів і без блокувань між процесами. Запит
+/metrics читає файли всіх процесів і складає значення, тож воркери
+gunicorn не потребують спільного сервера метрик.
+
+Файли завершених процесів не видаляються, а зливаються в metrics-archive.db
+(під flock), щоб лічильники не зменшувались після перезапуску воркера.
+Гістограми зберігаються як лічильники кожного кошика плюс _sum і _count.
+
+Очікування блокувань SQLite напряму не видно (busy_timeout чекає всередині
+sqlite3), тому рахуються записи, довші за METRICS_LOCK_WAIT_THRESHOLD, і
+помилки "database is locked".
+"""
+import bisect
+import fcntl
+import functools
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterator, Tuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.utils import OperationalError
+from django.dispatch import receiver
+
+HEADER_SIZE = 8
+
+INITIAL_SIZE = 64 * 1024
+
+ARCHIVE_NAME = 'metrics-archive.db'
+
+LOCK_NAME = 'metrics.lock'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+SIZE_BUCKETS = (10 * 1024, 100 * 1024, 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2,
+                50 * 1024 ** 2, 100 * 1024 ** 2, 500 * 1024 ** 2)
+
+WRITE_STATEMENTS = frozenset(('INSERT', 'UPDATE', 'DELETE', 'REPLAC', 'BEGIN ', 'COMMIT'))
+
+REGISTRY = {}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _entries(data, used: int) -> Iterator[Tuple[str, float, int]]:
+    """(ключ, значення, зміщення значення) записів файлу метрик"""
+    pos = HEADER_SIZE
+    while pos < used:
+        length = struct.unpack_from('I', data, pos)[0]
+        key = bytes(data[pos + 4:pos + 4 + length]).decode('utf-8')
+        value_pos = pos + 4 + _padded(length)
+        yield key, struct.unpack_from('d', data, value_pos)[0], value_pos
+        pos = value_pos + 8
+
+
+def _padded(length: int) -> int:
+    # The 4-byte length plus the key is padded so the double is 8-aligned
+    return length + (-(4 + length)) % 8
+
+
+class MmapStore:
+    """
+    Лічильники одного процесу у файлі, відображеному в пам'ять
+
+    Формат: заголовок з кількістю зайнятих байтів, далі записи
+    [довжина ключа][ключ UTF-8, вирівняний][значення double].
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._used = struct.unpack_from('I', self._mm, 0)[0] or HEADER_SIZE
+        self._positions = {key: pos for key, _, pos in _entries(self._mm, self._used)}
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            pos = self._positions.get(key)
+            if pos is None:
+                pos = self._append(key)
+            struct.pack_into('d', self._mm, pos, struct.unpack_from('d', self._mm, pos)[0] + amount)
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode('utf-8')
+        padded = _padded(len(encoded))
+        size = 4 + padded + 8
+        while self._used + size > len(self._mm):
+            new_size = len(self._mm) * 2
+            self._mm.close()
+            self._file.truncate(new_size)
+            self._mm = mmap.mmap(self._file.fileno(), new_size)
+        struct.pack_into(f'I{padded}sd', self._mm, self._used, len(encoded), encoded, 0.0)
+        pos = self._used + 4 + padded
+        self._used += size
+        # Readers only look up to the header, so publish the entry last
+        struct.pack_into('I', self._mm, 0, self._used)
+        self._positions[key] = pos
+        return pos
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+
+def read_file(path: str) -> Dict[str, float]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER_SIZE:
+        return {}
+    used = struct.unpack_from('I', data, 0)[0]
+    return {key: value for key, value, _ in _entries(data, used)}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge_dead(directory: str) -> None:
+    """Зливає файли завершених процесів в архівний файл"""
+    with open(os.path.join(directory, LOCK_NAME), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = None
+        try:
+            for path in glob.glob(os.path.join(directory, 'metrics-[0-9]*.db')):
+                pid = int(os.path.basename(path)[len('metrics-'):-len('.db')])
+                if pid == os.getpid() or _pid_alive(pid):
+                    continue
+                if archive is None:
+                    archive = MmapStore(os.path.join(directory, ARCHIVE_NAME))
+                for key, value in read_file(path).items():
+                    archive.add(key, value)
+                os.unlink(path)
+        finally:
+            if archive is not None:
+                archive.close()
+
+
+def get_store() -> MmapStore:
+    global _store
+    pid = os.getpid()
+    with _store_lock:
+        # A forked worker must not write into its parent's file
+        if _store is None or _store.pid != pid:
+            directory = settings.METRICS_DIR
+            os.makedirs(directory, exist_ok=True)
+            _merge_dead(directory)
+            _store = MmapStore(os.path.join(directory, f'metrics-{pid}.db'))
+        return _store
+
+
+def _key(name: str, labels: dict) -> str:
+    return _encode_key(name, tuple(sorted(labels.items())))
+
+
+@functools.lru_cache(maxsize=4096)
+def _encode_key(name: str, labels: tuple) -> str:
+    return json.dumps([name, labels], ensure_ascii=False)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        REGISTRY[name] = self
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if settings.METRICS_ENABLED:
+            get_store().add(_key(self.name, labels), amount)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(float(bound) for bound in buckets)
+        REGISTRY[name] = self
+
+    def observe(self, value: float, **labels) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        store = get_store()
+        index = bisect.bisect_left(self.buckets, value)
+        bound = _format_value(self.buckets[index]) if index < len(self.buckets) else '+Inf'
+        # Buckets are stored per bucket and made cumulative when rendered
+        store.add(_key(f'{self.name}_bucket', {**labels, 'le': bound}), 1)
+        store.add(_key(f'{self.name}_sum', labels), value)
+        store.add(_key(f'{self.name}_count', labels), 1)
+
+
+UPLOADS = Counter('submission_uploads_total', 'Submission form posts by result')
+UPLOAD_BYTES = Histogram('submission_upload_bytes', 'Size of uploaded submission files', SIZE_BUCKETS)
+UPLOAD_SECONDS = Histogram('submission_upload_seconds', 'Time to validate and store an upload')
+CONVERTER_SECONDS = Histogram('converter_duration_seconds', 'Preview conversion time by file format')
+CONVERTER_FAILURES = Counter('converter_failures_total', 'Preview conversions that failed, by file format')
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result (hit or miss)')
+ACTIVITY = Counter('activity_events_total', 'Activity log events (grading, comment, submission, login)')
+SQLITE_WRITE_SECONDS = Histogram('sqlite_write_seconds', 'Duration of SQLite write statements')
+SQLITE_LOCK_WAITS = Counter('sqlite_lock_waits_total', 'SQLite writes slower than METRICS_LOCK_WAIT_THRESHOLD')
+SQLITE_LOCKED = Counter('sqlite_locked_errors_total', 'SQLite statements that failed with "database is locked"')
+JOBS = Counter('jobs_total', 'Background jobs run, by task and result (done, retry, failed, lost)')
+JOB_SECONDS = Histogram('job_duration_seconds', 'Background job run time by task')
+
+
+def cache_lookup(cache_name: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache_name, result='hit' if hit else 'miss')
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    if sql[:6].upper() not in WRITE_STATEMENTS:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as e:
+        if 'locked' in str(e):
+            SQLITE_LOCKED.inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        SQLITE_WRITE_SECONDS.observe(elapsed)
+        if elapsed >= settings.METRICS_LOCK_WAIT_THRESHOLD:
+            SQLITE_LOCK_WAITS.inc()
+
+
+@receiver(connection_created)
+def install_sql_wrapper(sender, connection, **kwargs):
+    if (settings.METRICS_ENABLED and connection.vendor == 'sqlite'
+            and _sql_wrapper not in connection.execute_wrappers):
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def collect() -> Dict[str, float]:
+    """Сумує значення з файлів усіх процесів"""
+    directory = settings.METRICS_DIR
+    totals = {}
+    if not os.path.isdir(directory):
+        return totals
+    with open(os.path.join(directory, LOCK_NAME), 'a') as lock:
+        # Shared lock: no file is half-merged into the archive while reading
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        for path in glob.glob(os.path.join(directory, 'metrics-*.db')):
+            try:
+                values = read_file(path)
+            except OSError:
+                continue
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def render() -> str:
+    """Усі метрики у текстовому форматі Prometheus 0.0.4"""
+    samples = {}
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        samples.setdefault(name, []).append((tuple(tuple(pair) for pair in labels), value))
+
+    lines = []
+    for name in sorted(REGISTRY):
+        metric = REGISTRY[name]
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        if metric.kind == 'counter':
+            for labels, value in sorted(samples.get(name, ())):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+            continue
+
+        buckets = {}
+        for labels, value in samples.get(f'{name}_bucket', ()):
+            series = tuple(pair for pair in labels if pair[0] != 'le')
+            bound = dict(labels)['le']
+            buckets.setdefault(series, {})[bound] = value
+        sums = dict(samples.get(f'{name}_sum', ()))
+        counts = dict(samples.get(f'{name}_count', ()))
+        for series in sorted(counts):
+            cumulative = 0.0
+            for bound in [_format_value(b) for b in metric.buckets] + ['+Inf']:
+                cumulative += buckets.get(series, {}).get(bound, 0.0)
+                labels = series + (('le', bound),)
+                lines.append(f'{name}_bucket{_format_labels(labels)} {_format_value(cumulative)}')
+            lines.append(f'{name}_sum{_format_labels(series)} {_format_value(sums.get(series, 0.0))}')
+            lines.append(f'{name}_count{_format_labels(series)} {_format_value(counts[series])}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,65 @@
+import re
+from datetime import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+# Format written by the old grade_submission view:
+#   "📅 03.12.2025 15:56 | 👤 Ім'я Прізвище:\n<текст>", entries joined by SEPARATOR
+SEPARATOR = "----------------------------------------"
+HEADER_RE = re.compile(r'^📅 (?P<timestamp>\d{2}\.\d{2}\.\d{4} \d{2}:\d{2}) \| 👤 [^\n]*:\n', re.DOTALL)
+
+
+def split_legacy_comment(blob):
+    """Розбиває старий текстовий коментар на пари (час або None, текст)"""
+    entries = []
+    for chunk in blob.split(f"\n\n{SEPARATOR}\n\n"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        created_at = None
+        match = HEADER_RE.match(chunk)
+        if match:
+            try:
+                created_at = timezone.make_aware(
+                    datetime.strptime(match.group('timestamp'), "%d.%m.%Y %H:%M")
+                )
+            except ValueError:
+                created_at = None
+            chunk = chunk[match.end():].strip()
+        if chunk:
+            entries.append((created_at, chunk))
+    return entries
+
+
+def forwards(apps, schema_editor):
+    Submission = apps.get_model('submissions', 'Submission')
+    Comment = apps.get_model('submissions', 'Comment')
+    db_alias = schema_editor.connection.alias
+
+    legacy = (
+        Submission.objects.using(db_alias).exclude(comment__isnull=True).exclude(comment='')
+        .only('id', 'comment', 'teacher_id', 'submitted_at')
+    )
+    for submission in legacy.iterator():
+        for created_at, text in split_legacy_comment(submission.comment):
+            comment = Comment.objects.using(db_alias).create(
+                submission_id=submission.id,
+                author_id=submission.teacher_id,
+                text=text,
+            )
+            # created_at is auto_now_add, so the original time is restored afterwards
+            Comment.objects.using(db_alias).filter(pk=comment.pk).update(
+                created_at=created_at or submission.submitted_at
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0004_activitylog_submission_comment'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0005_split_legacy_submission_comments'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='submission',
+            name='comment',
+        ),
+    ]
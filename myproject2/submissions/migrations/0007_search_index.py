@@ -0,0 +1,44 @@
+from django.db import migrations
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS submissions_search "
+        f"USING fts5(name, body, comments, file_name UNINDEXED, tokenize='{TOKENIZER}')"
+    )
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS submissions_comment_search USING fts5(text, tokenize='{TOKENIZER}')"
+    )
+    # Names and comments are indexed right away; file text is added by
+    # rebuild_search_index (an empty file_name makes the next save re-extract it)
+    schema_editor.execute(
+        "INSERT INTO submissions_search (rowid, name, body, comments, file_name) "
+        "SELECT s.id, s.last_name || ' ' || s.first_name, '', "
+        "COALESCE((SELECT group_concat(c.text, char(10)) FROM submissions_comment c WHERE c.submission_id = s.id), ''), '' "
+        "FROM submissions_submission s"
+    )
+    schema_editor.execute(
+        "INSERT INTO submissions_comment_search (rowid, text) SELECT id, text FROM submissions_comment"
+    )
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS submissions_search")
+    schema_editor.execute("DROP TABLE IF EXISTS submissions_comment_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0006_remove_submission_comment'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -0,0 +1,75 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# A frozen copy of submissions.utils.normalize_name as of this migration:
+# later changes to the app code must not change what it writes
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ie',
+    'ж': 'zh', 'з': 'z', 'и': 'y', 'і': 'i', 'ї': 'i', 'й': 'i', 'к': 'k', 'л': 'l',
+    'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ь': '', 'ю': 'iu',
+    'я': 'ia', 'ё': 'e', 'ы': 'y', 'э': 'e', 'ъ': '',
+}
+
+NAME_APOSTROPHE_RE = re.compile(r"['’ʼ`]")
+NAME_JUNK_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(text):
+    text = NAME_APOSTROPHE_RE.sub('', (text or '').casefold())
+    text = ''.join(CYRILLIC_TO_LATIN.get(char, char) for char in text)
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(NAME_JUNK_RE.sub(' ', text).split())
+
+
+def fill_name_keys(apps, schema_editor):
+    Submission = apps.get_model('submissions', 'Submission')
+    alias = schema_editor.connection.alias
+    submissions = list(Submission.objects.using(alias).only('id', 'first_name', 'last_name'))
+    for submission in submissions:
+        submission.name_key = normalize_name(f"{submission.last_name} {submission.first_name}")
+    Submission.objects.using(alias).bulk_update(submissions, ['name_key'], batch_size=1000)
+
+
+def create_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    # The trigram tokenizer lets MATCH find any 3+ character substring of the
+    # key, so prefixes and middles of names hit the index instead of a scan
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS submissions_name_search USING fts5(name_key, tokenize='trigram')"
+    )
+    # Per-trigram document counts, used to skip common trigrams in fuzzy search
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS submissions_name_search_vocab "
+        "USING fts5vocab(submissions_name_search, row)"
+    )
+    schema_editor.execute(
+        "INSERT INTO submissions_name_search (rowid, name_key) SELECT id, name_key FROM submissions_submission"
+    )
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS submissions_name_search_vocab")
+    schema_editor.execute("DROP TABLE IF EXISTS submissions_name_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=400),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
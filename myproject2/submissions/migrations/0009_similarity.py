@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0008_submission_name_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classgroup',
+            name='similarity_threshold',
+            field=models.FloatField(blank=True, help_text='Від 0 до 1; порожнє значення - загальний поріг SIMILARITY_THRESHOLD', null=True, verbose_name='Поріг схожості робіт'),
+        ),
+        migrations.CreateModel(
+            name='DocumentFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('signature', models.BinaryField()),
+                ('shingle_count', models.PositiveIntegerField()),
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='document_fingerprint', to='submissions.submission')),
+            ],
+            options={
+                'verbose_name': 'Відбиток документа',
+                'verbose_name_plural': 'Відбитки документів',
+            },
+        ),
+        migrations.CreateModel(
+            name='LshBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='submissions.submission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='submissions_band_5731ca_idx')],
+            },
+        ),
+    ]
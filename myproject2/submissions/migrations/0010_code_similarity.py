@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0009_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('fingerprint_count', models.PositiveIntegerField()),
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='code_file', to='submissions.submission')),
+            ],
+            options={
+                'verbose_name': 'Файл коду',
+                'verbose_name_plural': 'Файли коду',
+            },
+        ),
+        migrations.CreateModel(
+            name='CodeFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.BigIntegerField()),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='code_fingerprints', to='submissions.submission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hash', 'submission'], name='submissions_hash_5d4950_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0010_code_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'В черзі'), ('done', 'Готово'), ('failed', 'Помилка')], default='pending', max_length=10)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('page_texts', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True)),
+                ('analyzed_at', models.DateTimeField(blank=True, null=True)),
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pdf', to='submissions.submission')),
+            ],
+            options={
+                'verbose_name': 'PDF роботи',
+                'verbose_name_plural': 'PDF робіт',
+            },
+        ),
+    ]
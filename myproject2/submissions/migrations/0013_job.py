@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0012_submission_submitted_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='Завдання')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='Аргументи')),
+                ('priority', models.SmallIntegerField(default=0, help_text='Більший виконується раніше', verbose_name='Пріоритет')),
+                ('status', models.CharField(choices=[('queued', 'В черзі'), ('running', 'Виконується'), ('done', 'Готово'), ('failed', 'Помилка')], default='queued', max_length=10, verbose_name='Стан')),
+                ('dedup_key', models.CharField(blank=True, max_length=200, null=True, verbose_name='Ключ дедуплікації')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Спроб')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Максимум спроб')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раніше')),
+                ('lease_until', models.DateTimeField(blank=True, null=True, verbose_name='Оренда до')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Обробник')),
+                ('error', models.TextField(blank=True, verbose_name='Помилка')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Результат')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Створено')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Почато')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+            ],
+            options={
+                'verbose_name': 'Фонове завдання',
+                'verbose_name_plural': 'Фонові завдання',
+                'indexes': [models.Index(fields=['status', 'priority', 'run_at'], name='job_claim_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ('queued', 'running'))), fields=('dedup_key',), name='job_active_dedup_key')],
+            },
+        ),
+    ]
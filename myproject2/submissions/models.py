@@ -1,9 +1,15 @@
 from django.db import models
 import os
 from datetime import datetime
+from django.utils import timezone
+from . import metrics
 
 class ClassGroup(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name="Клас")
+    similarity_threshold = models.FloatField(
+        blank=True, null=True, verbose_name="Поріг схожості робіт",
+        help_text="Від 0 до 1; порожнє значення - загальний поріг SIMILARITY_THRESHOLD"
+    )
 
     def __str__(self):
         return self.name
@@ -26,14 +32,23 @@ class Submission(models.Model):
     class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE)
     file = models.FileField(upload_to=submission_upload_path, blank=True, null=True)
     link = models.URLField(blank=True, null=True)
-    submitted_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(auto_now_add=True, db_index=True)
     grade = models.CharField(max_length=10, blank=True, null=True)
-    comment = models.TextField(blank=True, null=True, verbose_name="Коментар вчителя")
     teacher = models.ForeignKey('auth.User', on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Вчитель")
+    # Casefolded Latin transliteration of "last first" for name search (utils.normalize_name)
+    name_key = models.CharField(max_length=400, blank=True, db_index=True, editable=False)
     
     def __str__(self):
         return f"{self.last_name} {self.first_name} - {self.class_group.name} ({self.submitted_at.strftime('%Y-%m-%d')})"
     
+    def save(self, *args, **kwargs):
+        from .utils import normalize_name
+        self.name_key = normalize_name(f"{self.last_name} {self.first_name}")
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'first_name', 'last_name'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'name_key'}
+        super().save(*args, **kwargs)
+    
     def get_file_extension(self):
         """Повертає розширення файлу"""
         if self.file:
@@ -66,6 +81,11 @@ class Submission(models.Model):
             return info
         return None
     
+    def has_image_preview(self):
+        """Чи є для файлу зменшені копії (див. images.py)"""
+        from .images import is_image
+        return bool(self.file) and is_image(self.file.name)
+    
     class Meta:
         verbose_name = "Здана робота"
         verbose_name_plural = "Здані роботи"
@@ -85,6 +105,67 @@ class Comment(models.Model):
         verbose_name_plural = "Коментарі"
         ordering = ['created_at']
 
+class DocumentFingerprint(models.Model):
+    """MinHash-підпис тексту роботи (див. similarity.py)"""
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, related_name='document_fingerprint')
+    file_name = models.CharField(max_length=255)
+    signature = models.BinaryField()
+    shingle_count = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = "Відбиток документа"
+        verbose_name_plural = "Відбитки документів"
+
+class LshBucket(models.Model):
+    """Кошик LSH: роботи з однаковим хешем смуги підпису - кандидати у схожі"""
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='lsh_buckets')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [models.Index(fields=['band', 'bucket'])]
+
+class CodeFile(models.Model):
+    """Проіндексований файл коду роботи (див. code_similarity.py)"""
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, related_name='code_file')
+    file_name = models.CharField(max_length=255)
+    fingerprint_count = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = "Файл коду"
+        verbose_name_plural = "Файли коду"
+
+class CodeFingerprint(models.Model):
+    """Хеш k-грами нормалізованих токенів, відібраний winnowing"""
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='code_fingerprints')
+    hash = models.BigIntegerField()
+    
+    class Meta:
+        # Covering index for "which submissions share these hashes"
+        indexes = [models.Index(fields=['hash', 'submission'])]
+
+class PdfDocument(models.Model):
+    """Результат фонового аналізу PDF роботи (див. pdfs.py)"""
+    STATUS_CHOICES = [
+        ('pending', 'В черзі'),
+        ('done', 'Готово'),
+        ('failed', 'Помилка'),
+    ]
+    
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, related_name='pdf')
+    file_name = models.CharField(max_length=255)
+    digest = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    page_texts = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    analyzed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "PDF роботи"
+        verbose_name_plural = "PDF робіт"
+
 class ActivityLog(models.Model):
     ACTION_CHOICES = [
         ('submission', 'Здача роботи'),
@@ -107,11 +188,61 @@ class ActivityLog(models.Model):
         verbose_name_plural = "Журнал дій"
         ordering = ['-timestamp']
 
-def log_activity(actor, action_type, description, submission=None):
-    """Створює запис в журналі дій"""
-    ActivityLog.objects.create(
+def build_activity_log(actor, action_type, description, submission=None):
+    """
+    Готує (без збереження) запис журналу дій, наприклад для bulk_create;
+    метрику ACTIVITY тоді рахує той, хто зберігає
+    """
+    return ActivityLog(
         actor=actor if actor and actor.is_authenticated else None,
         action_type=action_type,
         description=description,
         submission=submission
     )
+
+def log_activity(actor, action_type, description, submission=None):
+    """Створює запис в журналі дій"""
+    build_activity_log(actor, action_type, description, submission).save()
+    metrics.ACTIVITY.inc(action=action_type)
+
+class Job(models.Model):
+    """Фонове завдання в черзі в базі школи (див. jobs.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'В черзі'),
+        ('running', 'Виконується'),
+        ('done', 'Готово'),
+        ('failed', 'Помилка'),
+    ]
+    ACTIVE = ('queued', 'running')
+
+    task = models.CharField(max_length=100, verbose_name="Завдання")
+    args = models.JSONField(default=list, blank=True, verbose_name="Аргументи")
+    priority = models.SmallIntegerField(default=0, verbose_name="Пріоритет", help_text="Більший виконується раніше")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name="Стан")
+    dedup_key = models.CharField(max_length=200, null=True, blank=True, verbose_name="Ключ дедуплікації")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Виконано, %")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Спроб")
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name="Максимум спроб")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Не раніше")
+    lease_until = models.DateTimeField(null=True, blank=True, verbose_name="Оренда до")
+    worker = models.CharField(max_length=100, blank=True, verbose_name="Обробник")
+    error = models.TextField(blank=True, verbose_name="Помилка")
+    result = models.JSONField(null=True, blank=True, verbose_name="Результат")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Створено")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Почато")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершено")
+
+    def __str__(self):
+        return f"{self.task}{self.args} ({self.status})"
+
+    class Meta:
+        verbose_name = "Фонове завдання"
+        verbose_name_plural = "Фонові завдання"
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_at'], name='job_claim_idx'),
+        ]
+        constraints = [
+            # One queued or running job per key; finished ones do not block a new run
+            models.UniqueConstraint(fields=['dedup_key'], condition=models.Q(status__in=('queued', 'running')),
+                                    name='job_active_dedup_key'),
+        ]
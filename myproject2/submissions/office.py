@@ -0,0 +1,353 @@
+"""
+Конвертація старих форматів Office (.doc, .xls, .ppt) у .docx/.xlsx/.pptx
+через LibreOffice, щоб їх показували наявні конвертери з utils.py
+
+Кожен процес тримає невеликий пул конвертерів (OFFICE_CONVERTER_POOL_SIZE),
+що запускаються при першій потребі. Якщо доступний Python-міст UNO
+(пакет python3-uno), конвертер - це запущений soffice --headless, якому
+документи передаються через сокет: ціна запуску (секунди) платиться раз
+на процес. Без UNO кожна конвертація - окремий виклик soffice --convert-to,
+але з постійним профілем для кожного слота пулу, тож профіль не
+створюється щоразу. Зависла конвертація вбивається за таймаутом,
+конвертер перезапускається після OFFICE_CONVERTER_MAX_JOBS документів.
+
+Результат кешується за SHA-256 оригіналу у сховищі похідних (images.py),
+невдача самого документа - у кеші Django, тож битий файл не конвертується
+при кожному перегляді. Тимчасові збої (усі конвертери зайняті, таймаут,
+вбитий процес) не кешуються. Якщо LibreOffice не встановлено, повертається зрозуміле
+повідомлення замість помилки.
+"""
+import atexit
+import importlib.util
+import os
+import pathlib
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import images
+from .profiling import timed
+from .utils import file_digest
+
+# Legacy extension -> (OOXML extension, LibreOffice export filter)
+LEGACY_FORMATS = {
+    '.doc': ('.docx', 'MS Word 2007 XML'),
+    '.xls': ('.xlsx', 'Calc MS Excel 2007 XML'),
+    '.ppt': ('.pptx', 'Impress MS PowerPoint 2007 XML'),
+}
+
+# Seconds for soffice to start listening on its socket
+START_TIMEOUT = 30
+
+FAILURE_TIMEOUT = 24 * 60 * 60
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ConverterError(Exception):
+    """Конвертація не вдалася зараз: конвертери зайняті, таймаут, процес упав"""
+
+
+class ConversionFailed(ConverterError):
+    """LibreOffice не може сконвертувати сам документ; повтор дасть те саме"""
+
+
+def binary() -> Optional[str]:
+    """Шлях до soffice або None, якщо LibreOffice не встановлено"""
+    return shutil.which(settings.OFFICE_CONVERTER_BINARY)
+
+
+def uno_available() -> bool:
+    return importlib.util.find_spec('uno') is not None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _kill_group(process: subprocess.Popen) -> None:
+    # soffice is a wrapper script around soffice.bin: kill both
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _profile_arg(profile_dir: str) -> str:
+    # A private profile per converter: two soffice processes cannot share one
+    return '-env:UserInstallation=' + pathlib.Path(profile_dir).as_uri()
+
+
+class _UnoConverter:
+    """Постійно запущений soffice, документи передаються через UNO"""
+
+    def __init__(self, executable: str):
+        self.jobs = 0
+        self.profile_dir = tempfile.mkdtemp(prefix='soffice-')
+        port = _free_port()
+        self.process = subprocess.Popen(
+            [executable, '--headless', '--invisible', '--nologo', '--norestore',
+             '--nodefault', '--nolockcheck', _profile_arg(self.profile_dir),
+             f'--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        try:
+            self.desktop = self._connect(port)
+        except Exception:
+            self.stop()
+            raise
+
+    def _connect(self, port: int):
+        import uno
+
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+        deadline = time.monotonic() + START_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(
+                    f'uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext'
+                )
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise ConverterError("LibreOffice не запустився")
+                time.sleep(0.2)
+        return context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+
+    @staticmethod
+    def _properties(**values):
+        from com.sun.star.beans import PropertyValue
+
+        result = []
+        for name, value in values.items():
+            prop = PropertyValue()
+            prop.Name = name
+            prop.Value = value
+            result.append(prop)
+        return tuple(result)
+
+    def convert(self, source: str, target: str, filter_name: str) -> None:
+        import uno
+
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(source), '_blank', 0,
+            self._properties(Hidden=True, ReadOnly=True),
+        )
+        if document is None:
+            raise ConversionFailed("LibreOffice не зміг відкрити файл")
+        try:
+            document.storeToURL(uno.systemPathToFileUrl(target), self._properties(FilterName=filter_name))
+        except Exception as e:
+            if not self.alive():
+                # Killed by the watchdog or crashed: says nothing about the document
+                raise
+            raise ConversionFailed("LibreOffice не зміг зберегти файл") from e
+        finally:
+            document.close(True)
+        self.jobs += 1
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self) -> None:
+        # Called by the watchdog: the blocked UNO call fails once the process is gone
+        if self.alive():
+            _kill_group(self.process)
+
+    def stop(self) -> None:
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                _kill_group(self.process)
+                self.process.wait()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class _CommandConverter:
+    """soffice --convert-to на кожен документ, з постійним профілем слота"""
+
+    def __init__(self, executable: str):
+        self.jobs = 0
+        self.executable = executable
+        self.profile_dir = tempfile.mkdtemp(prefix='soffice-')
+        self.process = None
+
+    def convert(self, source: str, target: str, filter_name: str) -> None:
+        extension = os.path.splitext(target)[1]
+        out_dir = os.path.dirname(target)
+        self.process = subprocess.Popen(
+            [self.executable, '--headless', '--nologo', '--norestore', '--nolockcheck',
+             _profile_arg(self.profile_dir),
+             '--convert-to', f'{extension[1:]}:{filter_name}', '--outdir', out_dir, source],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True,
+        )
+        try:
+            _, stderr = self.process.communicate(timeout=settings.OFFICE_CONVERTER_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            _kill_group(self.process)
+            self.process.communicate()
+            raise ConverterError("Перевищено час конвертації")
+        produced = os.path.join(out_dir, os.path.splitext(os.path.basename(source))[0] + extension)
+        if self.process.returncode < 0:
+            # Killed by a signal (the watchdog, the OOM killer), not refused by LibreOffice
+            raise ConverterError("Конвертацію перервано")
+        if self.process.returncode != 0 or not os.path.exists(produced):
+            message = stderr.decode(errors='replace').strip()[:200]
+            raise ConversionFailed(f"LibreOffice не зміг сконвертувати файл {message}".strip())
+        if produced != target:
+            os.replace(produced, target)
+        self.jobs += 1
+
+    def alive(self) -> bool:
+        return True
+
+    def kill(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            _kill_group(self.process)
+
+    def stop(self) -> None:
+        self.kill()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class ConverterPool:
+    """
+    Пул конвертерів процесу: не більше size одночасних конвертацій,
+    конвертери запускаються при першій потребі і використовуються повторно
+    """
+
+    def __init__(self, executable: str, size: int, use_uno: bool):
+        self.executable = executable
+        self.use_uno = use_uno
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+
+    def _start(self):
+        if self.use_uno:
+            return _UnoConverter(self.executable)
+        return _CommandConverter(self.executable)
+
+    def convert(self, source: str, target: str, filter_name: str) -> None:
+        timeout = settings.OFFICE_CONVERTER_TIMEOUT
+        if not self._slots.acquire(timeout=timeout):
+            raise ConverterError("Усі конвертери зайняті, спробуйте пізніше")
+        try:
+            try:
+                converter = self._idle.get_nowait()
+            except queue.Empty:
+                converter = self._start()
+            if not converter.alive():
+                converter.stop()
+                converter = self._start()
+
+            watchdog = threading.Timer(timeout, converter.kill)
+            watchdog.daemon = True
+            watchdog.start()
+            try:
+                converter.convert(source, target, filter_name)
+            except Exception:
+                # A failed or killed converter may be in any state: replace it
+                converter.stop()
+                raise
+            finally:
+                watchdog.cancel()
+
+            if converter.jobs >= settings.OFFICE_CONVERTER_MAX_JOBS:
+                # LibreOffice grows over time; recycle it
+                converter.stop()
+            else:
+                self._idle.put(converter)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+def get_pool() -> Optional[ConverterPool]:
+    """Пул цього процесу або None, якщо LibreOffice не встановлено"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            executable = binary()
+            if executable is None:
+                return None
+            _pool = ConverterPool(executable, settings.OFFICE_CONVERTER_POOL_SIZE, uno_available())
+            atexit.register(_pool.close)
+        return _pool
+
+
+def is_legacy(file_ext: str) -> bool:
+    return file_ext.lower() in LEGACY_FORMATS
+
+
+@timed('convert')
+def convert_legacy(file_path: str, file_ext: str,
+                   raise_temporary: bool = False) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Повертає шлях до .docx/.xlsx/.pptx-версії старого документа Office
+
+    Невдача самого документа запам'ятовується на FAILURE_TIMEOUT; тимчасові
+    (зайняті конвертери, таймаут) - ні, наступний перегляд пробує знову.
+
+    Args:
+        file_path: Шлях до .doc, .xls або .ppt
+        file_ext: Розширення файлу
+        raise_temporary: Тимчасову помилку піднімати винятком (для фонових
+            завдань, які черга повторить пізніше), а не повертати
+
+    Returns:
+        tuple: (шлях до сконвертованого файлу, повідомлення про помилку)
+    """
+    new_ext, filter_name = LEGACY_FORMATS[file_ext.lower()]
+    digest = file_digest(file_path)
+    target = images.derivative_path(digest, 'office', new_ext[1:])
+    if images.touch(target):
+        return target, None
+
+    failure_key = f'office_failed:{digest}'
+    failure = cache.get(failure_key)
+    if failure:
+        return None, failure
+
+    pool = get_pool()
+    if pool is None:
+        return None, "Для перегляду цього формату на сервері потрібен LibreOffice. Завантажте файл, щоб відкрити його."
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # LibreOffice picks the import filter by extension, so keep it
+        source = os.path.join(tmp_dir, 'source' + file_ext.lower())
+        os.symlink(os.path.abspath(file_path), source)
+        converted = os.path.join(tmp_dir, 'converted', 'source' + new_ext)
+        os.makedirs(os.path.dirname(converted))
+        try:
+            pool.convert(source, converted, filter_name)
+        except ConversionFailed as e:
+            error_message = f"Помилка конвертації: {str(e)}"
+            cache.set(failure_key, error_message, FAILURE_TIMEOUT)
+            return None, error_message
+        except Exception as e:
+            if raise_temporary:
+                raise
+            return None, f"Помилка конвертації: {str(e)}"
+        images.add_file(converted, target)
+    return target, None
@@ -0,0 +1,284 @@
+"""
+Фоновий аналіз PDF робіт: кількість сторінок, текст кожної сторінки і
+мініатюра першої сторінки
+
+Запит завантаження PDF не відкриває: після коміту робота ставиться в
+пул потоків процесу (PDF_ANALYSIS_WORKERS), а результат зберігається в
+PdfDocument разом із SHA-256 файлу. Повторний аналіз робиться лише коли
+хеш змінився; однаковий файл в іншій роботі копіює готовий результат.
+Коли текст готовий, оновлюються повнотекстовий пошук і підписи схожості.
+Завдання, втрачені при перезапуску процесу, доробляє команда analyze_pdfs.
+З JOBS_ENABLED аналіз замість пулу йде в чергу завдань (jobs.py) і
+переживає перезапуск.
+
+Текст витягує pypdf (чистий Python). Мініатюра першої сторінки
+растеризується лише за запитом і лише якщо є pdftoppm (poppler); вона
+зберігається у сховищі похідних зображень (images.py).
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from . import images, jobs, metrics, schools
+from .profiling import timed
+from .utils import MAX_EXTRACTED_TEXT, file_digest
+
+logger = logging.getLogger(__name__)
+
+# Text is taken from at most this many pages (the page count is always exact)
+MAX_TEXT_PAGES = 1000
+
+RASTER_TIMEOUT = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_pdf(submission) -> bool:
+    return bool(submission.file) and submission.get_file_extension().lower() == '.pdf'
+
+
+def rasterizer() -> Optional[str]:
+    """Шлях до pdftoppm або None, якщо мініатюри PDF недоступні"""
+    return shutil.which(settings.PDF_RASTERIZER)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PDF_ANALYSIS_WORKERS,
+                thread_name_prefix='pdf-analysis',
+            )
+        return _executor
+
+
+def schedule(submission, using: str = 'default') -> None:
+    """Ставить аналіз PDF роботи в чергу після коміту поточної транзакції"""
+    if not is_pdf(submission):
+        return
+    pk = submission.pk
+    if settings.JOBS_ENABLED:
+        jobs.enqueue_on_commit('analyze_pdf', pk, dedup_key=f'analyze_pdf:{pk}', using=using)
+    elif settings.PDF_ANALYSIS_BACKGROUND:
+        transaction.on_commit(lambda: _get_executor().submit(_run, pk, using), using=using)
+    else:
+        transaction.on_commit(lambda: analyze_submission(pk, using), using=using)
+
+
+def _run(pk: int, using: str) -> None:
+    try:
+        analyze_submission(pk, using)
+    except Exception:
+        logger.exception('PDF analysis of submission %s failed', pk)
+    finally:
+        # Worker threads open their own connections; do not leak them
+        connections.close_all()
+
+
+def analyze_file(file_path: str) -> dict:
+    """
+    Читає PDF: кількість сторінок, назву з метаданих і текст сторінок
+
+    Args:
+        file_path: Шлях до PDF
+
+    Returns:
+        dict: Поля PdfDocument (status, page_count, title, page_texts, error)
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return {'status': 'failed', 'error': "Бібліотека pypdf не встановлена"}
+
+    try:
+        reader = PdfReader(file_path)
+        if reader.is_encrypted:
+            # Many "protected" PDFs only restrict printing and open with an empty password
+            reader.decrypt('')
+        page_count = len(reader.pages)
+        page_texts = []
+        total = 0
+        for number, page in enumerate(reader.pages):
+            if number >= MAX_TEXT_PAGES or total >= MAX_EXTRACTED_TEXT:
+                break
+            try:
+                text = page.extract_text() or ''
+            except Exception:
+                # One broken page should not lose the rest of the document
+                text = ''
+            text = text.replace('\x00', '')[:MAX_EXTRACTED_TEXT - total]
+            total += len(text)
+            page_texts.append(text)
+        title = ''
+        if reader.metadata and reader.metadata.title:
+            title = str(reader.metadata.title)[:255]
+    except Exception as e:
+        return {'status': 'failed', 'error': f"Помилка при читанні PDF: {str(e)}"}
+
+    return {
+        'status': 'done',
+        'page_count': page_count,
+        'title': title,
+        'page_texts': page_texts,
+        'error': '',
+    }
+
+
+def analyze_submission(pk: int, using: str = 'default', force: bool = False):
+    """
+    Аналізує PDF роботи, якщо файл змінився з минулого аналізу (або force)
+
+    Returns:
+        PdfDocument або None, якщо робота не PDF
+    """
+    from . import search, similarity
+    from .models import PdfDocument, Submission
+
+    submission = Submission.objects.using(using).filter(pk=pk).first()
+    if submission is None or not is_pdf(submission):
+        return None
+
+    # The file lives in the media root of the school that owns the database
+    with schools.using_school(schools.slug_for_alias(using)):
+        file_path = submission.file.path
+        digest = file_digest(file_path)
+        document = PdfDocument.objects.using(using).filter(submission_id=pk).first()
+        if (document is not None and document.digest == digest
+                and document.file_name == submission.file.name
+                and document.status != 'pending' and not force):
+            return document
+
+        same_file = None
+        if not force:
+            same_file = (
+                PdfDocument.objects.using(using)
+                .filter(digest=digest, status='done')
+                .exclude(submission_id=pk)
+                .first()
+            )
+        if same_file is not None:
+            fields = {
+                'status': 'done',
+                'page_count': same_file.page_count,
+                'title': same_file.title,
+                'page_texts': same_file.page_texts,
+                'error': '',
+            }
+        else:
+            started = time.perf_counter()
+            fields = analyze_file(file_path)
+            metrics.CONVERTER_SECONDS.observe(time.perf_counter() - started, format='pdf')
+            if fields['status'] == 'failed':
+                metrics.CONVERTER_FAILURES.inc(format='pdf')
+
+        values = {
+            'file_name': submission.file.name,
+            'digest': digest,
+            'analyzed_at': timezone.now(),
+            'page_count': None,
+            'title': '',
+            'page_texts': [],
+            **fields,
+        }
+        document = _save_document(pk, using, values)
+
+        # The text is there now: refresh the search row and the similarity signature
+        search.index_submission(submission, using, reindex_file=True)
+        similarity.index_submission(submission, using, force=True)
+    return document
+
+
+def _save_document(pk: int, using: str, values: dict):
+    """
+    Зберігає результат окремими UPDATE/INSERT в autocommit
+
+    update_or_create читає рядок у транзакції і потім пише; у SQLite без
+    IMMEDIATE-транзакцій це взаємне блокування з потоком запиту, що саме
+    пише ("database is locked" без очікування). Одиночний запис просто
+    чекає на busy timeout.
+    """
+    from .models import PdfDocument
+
+    queryset = PdfDocument.objects.using(using).filter(submission_id=pk)
+    if not queryset.update(**values):
+        try:
+            with transaction.atomic(using=using):
+                PdfDocument.objects.using(using).create(submission_id=pk, **values)
+        except IntegrityError:
+            # Another worker inserted the row first
+            queryset.update(**values)
+    return queryset.get()
+
+
+def stored_text(submission, using: str = 'default') -> str:
+    """Текст PDF з останнього аналізу ('' поки аналіз не завершено)"""
+    from .models import PdfDocument
+
+    document = (
+        PdfDocument.objects.using(using)
+        .filter(submission_id=submission.pk, status='done', file_name=submission.file.name)
+        .values_list('page_texts', flat=True)
+        .first()
+    )
+    return '\n'.join(text for text in document or [] if text)
+
+
+def pending(using: str = 'default'):
+    """PDF-роботи без актуального аналізу (нові, у черзі або з іншим файлом)"""
+    from django.db.models import F, Q
+    from .models import Submission
+
+    return (
+        Submission.objects.using(using)
+        .filter(file__iendswith='.pdf')
+        .filter(
+            Q(pdf__isnull=True)
+            | Q(pdf__status='pending')
+            | ~Q(pdf__file_name=F('file'))
+        )
+    )
+
+
+@timed('convert')
+def get_thumbnail(submission) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Мініатюра першої сторінки PDF, растеризована при першому запиті
+
+    Returns:
+        tuple: (шлях до WebP, повідомлення про помилку)
+    """
+    file_path = submission.file.path
+    size = images.sizes()[0]
+    target = images.derivative_path(file_digest(file_path), f'pdf{size}', 'webp')
+    if images.touch(target):
+        return target, None
+
+    executable = rasterizer()
+    if executable is None:
+        return None, "Мініатюри PDF недоступні: не встановлено pdftoppm"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        prefix = os.path.join(tmp_dir, 'page')
+        try:
+            # Rasterize at twice the box so downscaling keeps text readable
+            subprocess.run(
+                [executable, '-f', '1', '-l', '1', '-singlefile', '-png',
+                 '-scale-to', str(size * 2), file_path, prefix],
+                check=True, capture_output=True, timeout=RASTER_TIMEOUT,
+            )
+            images.save_derivative(prefix + '.png', size, 'webp', target)
+        except (OSError, subprocess.SubprocessError) as e:
+            return None, f"Помилка при растеризації PDF: {str(e)}"
+    return target, None
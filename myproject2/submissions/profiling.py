@@ -0,0 +1,261 @@
+"""
+Профілювання запитів: куди йде час view_file та інших сторінок
+
+ProfilingMiddleware рахує для кожного запиту кількість і час SQL-запитів
+(execute_wrapper на кожному з'єднанні), час конвертерів попереднього
+перегляду (функції з декоратором timed('convert')) і час рендерингу
+шаблонів. Результат іде у заголовок Server-Timing (видно у DevTools
+браузера; лише для вчителів) і в ковзне вікно останніх PROFILING_WINDOW
+запитів кожного маршруту, з якого сторінка статистики рахує p50/p95/p99.
+
+Накладні витрати - кілька викликів perf_counter на запит і один на
+SQL-запит, тож профілювання можна не вимикати. Вікна живуть у пам'яті
+процесу і раз на PROFILING_FLUSH_INTERVAL секунд копіюються в кеш, звідки
+сторінка статистики збирає дані всіх процесів.
+
+Час шаблонів включає SQL-запити лінивих QuerySet, виконаних під час
+рендерингу, тож суми частин можуть перевищувати загальний час.
+"""
+import contextvars
+import functools
+import os
+import socket
+import threading
+import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Columns of a sample; 'queries' is a count, the rest are milliseconds
+METRICS = ('total', 'sql', 'queries', 'convert', 'template')
+
+PERCENTILES = (50, 95, 99)
+
+WORKERS_KEY = 'profiling:workers'
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+_samples = {}
+_samples_lock = threading.Lock()
+_last_flush = 0.0
+_worker_key = None
+
+
+class RequestProfile:
+    __slots__ = ('queries', 'timings', 'active')
+
+    def __init__(self):
+        self.queries = 0
+        self.timings = {'sql': 0.0, 'convert': 0.0, 'template': 0.0}
+        self.active = set()
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Додає час блоку (або функції, якщо як декоратор) до поточного запиту
+
+    Вкладені виклики з тим самим ім'ям рахуються один раз: конвертер
+    архіву, що викликає конвертер документа, не подвоює час.
+    """
+    profile = _current.get()
+    if profile is None or name in profile.active:
+        yield
+        return
+    profile.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.timings[name] = profile.timings.get(name, 0.0) + time.perf_counter() - started
+        profile.active.discard(name)
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.timings['sql'] += time.perf_counter() - started
+        profile.queries += 1
+
+
+@receiver(connection_created)
+def install_sql_wrapper(sender, connection, **kwargs):
+    # The wrapper list belongs to the DatabaseWrapper, which outlives reconnects
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def install_template_timing() -> None:
+    """Обгортає рендеринг шаблонів Django (викликається з AppConfig.ready)"""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'profiled', False):
+        return
+    original = Template.render
+
+    @functools.wraps(original)
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return original(self, context, request)
+
+    render.profiled = True
+    Template.render = render
+
+
+class ProfilingMiddleware:
+    """
+    Вимірює запит і записує його у вікно маршруту. Має стояти одразу після
+    SchoolMiddleware, щоб бачити запити сесій і користувачів до бази школи.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile, started, getattr(request, 'user', None))
+
+    async def __acall__(self, request):
+        # sync_to_async and aio.run_blocking copy the context, so SQL and converters in threads still count
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        # request.user loads the session lazily, which is not allowed on the event loop
+        user = await request.auser() if hasattr(request, 'auser') else None
+        return self.finish(request, response, profile, started, user)
+
+    def finish(self, request, response, profile, started, user):
+        total = time.perf_counter() - started
+
+        match = request.resolver_match
+        if match is not None:
+            record(match.view_name, total, profile)
+
+        if user is not None and user.is_authenticated:
+            response['Server-Timing'] = server_timing(total, profile)
+        return response
+
+
+def server_timing(total: float, profile: RequestProfile) -> str:
+    """Значення заголовка Server-Timing (тривалості в мілісекундах)"""
+    timings = profile.timings
+    parts = [
+        f'app;dur={total * 1000:.1f};desc="Total"',
+        f'sql;dur={timings["sql"] * 1000:.1f};desc="SQL ({profile.queries} queries)"',
+    ]
+    if timings['convert']:
+        parts.append(f'convert;dur={timings["convert"] * 1000:.1f};desc="Converters"')
+    if timings['template']:
+        parts.append(f'tpl;dur={timings["template"] * 1000:.1f};desc="Templates"')
+    return ', '.join(parts)
+
+
+def record(view_name: str, total: float, profile: RequestProfile) -> None:
+    timings = profile.timings
+    sample = (
+        total * 1000,
+        timings['sql'] * 1000,
+        profile.queries,
+        timings['convert'] * 1000,
+        timings['template'] * 1000,
+    )
+    with _samples_lock:
+        window = _samples.get(view_name)
+        if window is None:
+            window = _samples[view_name] = deque(maxlen=settings.PROFILING_WINDOW)
+        window.append(sample)
+    if time.monotonic() - _last_flush >= settings.PROFILING_FLUSH_INTERVAL:
+        flush()
+
+
+def _snapshot() -> dict:
+    """Вікна процесу як масиви стовпців (компактно для кешу)"""
+    with _samples_lock:
+        windows = {name: list(window) for name, window in _samples.items()}
+    return {
+        name: {metric: array('f', column) for metric, column in zip(METRICS, zip(*samples))}
+        for name, samples in windows.items()
+        if samples
+    }
+
+
+def flush() -> None:
+    """Копіює вікна цього процесу в кеш для сторінки статистики"""
+    global _last_flush, _worker_key
+    _last_flush = time.monotonic()
+    if _worker_key is None:
+        _worker_key = f'profiling:samples:{socket.gethostname()}:{os.getpid()}'
+    retention = settings.PROFILING_RETENTION
+    cache.set(_worker_key, _snapshot(), retention)
+    # Racing workers may drop each other from the list; they re-add themselves next flush
+    workers = cache.get(WORKERS_KEY) or {}
+    now = time.time()
+    workers = {key: seen for key, seen in workers.items() if now - seen < retention}
+    workers[_worker_key] = now
+    cache.set(WORKERS_KEY, workers, retention)
+
+
+def percentile(values: list, q: int) -> float:
+    # Nearest-rank percentile of sorted values
+    index = max(0, min(len(values) - 1, -(-len(values) * q // 100) - 1))
+    return values[index]
+
+
+def stats() -> list:
+    """
+    Перцентилі за маршрутами з усіх процесів
+
+    Returns:
+        list: dict з view_name, count і {метрика: (p50, p95, p99)},
+        відсортовані за p95 загального часу, найповільніші першими
+    """
+    flush()
+    workers = cache.get(WORKERS_KEY) or {}
+    merged = {}
+    for snapshot in cache.get_many(list(workers)).values():
+        for name, columns in snapshot.items():
+            target = merged.setdefault(name, {metric: [] for metric in METRICS})
+            for metric in METRICS:
+                target[metric].extend(columns.get(metric, ()))
+
+    rows = []
+    for name, columns in merged.items():
+        row = {'view_name': name, 'count': len(columns['total'])}
+        for metric in METRICS:
+            values = sorted(columns[metric])
+            row[metric] = tuple(percentile(values, q) for q in PERCENTILES) if values else (0, 0, 0)
+        rows.append(row)
+    rows.sort(key=lambda row: row['total'][1], reverse=True)
+    return rows
@@ -0,0 +1,216 @@
+"""
+Пошук повільних запитів і N+1 (вмикається QUERY_WATCH_ENABLED)
+
+QueryWatchMiddleware бачить кожен SQL-запит запиту через execute_wrapper.
+Запит, довший за QUERY_WATCH_SLOW_MS, записується зі стеком виклику.
+Однакова «форма» запиту (SQL з плейсхолдерами, списки IN згорнуті), що
+повторюється QUERY_WATCH_REPEAT_THRESHOLD разів за один HTTP-запит, - це
+N+1: записується кількість повторів, сумарний час, місце в коді і рядок
+шаблону, з якого запит виконано (наприклад, {{ submission.comments.count }}
+у циклі).
+
+Стек збирається лише для запитів, що вже потрапили у звіт, тож накладні
+витрати на решту запитів - підрахунок у словнику. Події пишуться рядками
+JSON у QUERY_WATCH_LOG і попередженням у лог submissions.querywatch;
+команда query_report зводить їх за сторінками.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Application frames kept in a stack trace
+STACK_DEPTH = 8
+
+MAX_SQL_CHARS = 2000
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+_current = contextvars.ContextVar('query_watch', default=None)
+
+_write_lock = threading.Lock()
+
+# Instrumentation wrappers around every query; they are never the culprit
+_skipped_files = frozenset(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('querywatch.py', 'profiling.py', 'metrics.py')
+)
+
+
+class RequestQueries:
+    __slots__ = ('shapes', 'events')
+
+    def __init__(self):
+        # shape -> [count, total seconds, location of the first repeat]
+        self.shapes = {}
+        self.events = []
+
+
+def shape(sql: str) -> str:
+    """SQL без змінної частини: параметри вже плейсхолдери, списки IN згортаються"""
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def _template_line(frame):
+    # The innermost template node being rendered, if any
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+def _app_stack(frame) -> list:
+    """Кадри коду проєкту (без Django і бібліотек), від найглибшого"""
+    base = str(settings.BASE_DIR)
+    stack = []
+    while frame is not None and len(stack) < STACK_DEPTH:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base) and filename not in _skipped_files
+                and 'site-packages' not in filename):
+            stack.append(f'{os.path.relpath(filename, base)}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return stack
+
+
+def _location(frame) -> dict:
+    return {'stack': _app_stack(frame), 'template': _template_line(frame)}
+
+
+def _wrapper(execute, sql, params, many, context):
+    watched = _current.get()
+    if watched is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        key = shape(sql)
+        entry = watched.shapes.get(key)
+        if entry is None:
+            entry = watched.shapes[key] = [0, 0.0, None]
+        entry[0] += 1
+        entry[1] += elapsed
+        if entry[0] == settings.QUERY_WATCH_REPEAT_THRESHOLD:
+            entry[2] = _location(sys._getframe(1))
+        if elapsed * 1000 >= settings.QUERY_WATCH_SLOW_MS:
+            watched.events.append({
+                'event': 'slow_query',
+                'duration_ms': round(elapsed * 1000, 2),
+                'sql': sql[:MAX_SQL_CHARS],
+                **_location(sys._getframe(1)),
+            })
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    if settings.QUERY_WATCH_ENABLED and _wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_wrapper)
+
+
+class QueryWatchMiddleware:
+    """Збирає запити одного HTTP-запиту і записує знайдене після відповіді"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_WATCH_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        watched = RequestQueries()
+        token = _current.set(watched)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, watched)
+        return response
+
+    async def __acall__(self, request):
+        watched = RequestQueries()
+        token = _current.set(watched)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        if watched.shapes:
+            # Writing the report is file I/O: keep it off the event loop
+            await sync_to_async(self.finish, thread_sensitive=False)(request, watched)
+        return response
+
+    def finish(self, request, watched):
+        events = watched.events
+        for key, (count, total, location) in watched.shapes.items():
+            if location is not None:
+                events.append({
+                    'event': 'n_plus_one',
+                    'count': count,
+                    'total_ms': round(total * 1000, 2),
+                    'sql': key[:MAX_SQL_CHARS],
+                    **location,
+                })
+        if events:
+            match = request.resolver_match
+            report(match.view_name if match else None, request.path, events)
+
+
+def report(view_name, path: str, events: list) -> None:
+    """Пише події в QUERY_WATCH_LOG (рядки JSON) і в лог"""
+    now = time.time()
+    lines = []
+    for event in events:
+        event = {'time': now, 'view': view_name, 'path': path, **event}
+        lines.append(json.dumps(event, ensure_ascii=False))
+        where = event['template'] or (event['stack'][0] if event['stack'] else '?')
+        if event['event'] == 'slow_query':
+            logger.warning('Slow query (%.1f ms) in %s at %s', event['duration_ms'], view_name, where)
+        else:
+            logger.warning('N+1: %d identical queries in %s at %s', event['count'], view_name, where)
+
+    log_path = settings.QUERY_WATCH_LOG
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with _write_lock, open(log_path, 'a', encoding='utf-8') as f:
+        # One write per request: appends from several processes do not interleave
+        f.write('\n'.join(lines) + '\n')
+
+
+def read_events(log_path: str, since: float = 0):
+    """Події з журналу, новіші за since (час Unix)"""
+    try:
+        f = open(log_path, encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # A line cut by a crash or a concurrent rotation
+                continue
+            if event.get('time', 0) >= since:
+                yield event
@@ -0,0 +1,24 @@
+"""
+Маршрутизатор баз даних для мультишкільного режиму (див. schools.py)
+"""
+from .schools import current_alias
+
+
+class SchoolRouter:
+    """
+    Спрямовує всі запити до бази поточної школи. Кожна база школи містить
+    повну схему (включно з користувачами і сесіями), тому зв'язки між
+    моделями завжди лишаються в межах однієї бази.
+    """
+
+    def _db_for(self, hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return current_alias()
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(hints)
@@ -0,0 +1,186 @@
+"""
+Мультишкільний режим: кожна школа має власну базу SQLite і каталог файлів
+
+Реєстр шкіл зберігається у SCHOOLS_ROOT/schools.json:
+
+    {"lyceum1": {"name": "Ліцей №1", "hosts": ["lyceum1.example.com"]}}
+
+Школа визначається за хостом запиту або за префіксом шляху /s/<slug>/.
+Запити без школи працюють зі звичайною базою 'default' і MEDIA_ROOT,
+тож одношкільне розгортання не змінюється.
+"""
+import copy
+import json
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import Http404
+from django.urls import get_script_prefix, set_script_prefix
+from django.utils._os import safe_join
+
+SLUG_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,49}$')
+
+_current_school: ContextVar[Optional[str]] = ContextVar('current_school', default=None)
+
+
+def registry_path() -> str:
+    return os.path.join(settings.SCHOOLS_ROOT, 'schools.json')
+
+
+def load_registry() -> dict:
+    try:
+        with open(registry_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_registry(registry: dict) -> None:
+    os.makedirs(settings.SCHOOLS_ROOT, exist_ok=True)
+    tmp_path = registry_path() + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, registry_path())
+
+
+def db_alias(slug: Optional[str]) -> str:
+    return f'school_{slug}' if slug else DEFAULT_DB_ALIAS
+
+
+def slug_for_alias(alias: str) -> Optional[str]:
+    return alias[len('school_'):] if alias.startswith('school_') else None
+
+
+def db_path(slug: str) -> str:
+    return os.path.join(settings.SCHOOLS_ROOT, slug, 'db.sqlite3')
+
+
+def media_root(slug: Optional[str] = None) -> str:
+    if not slug:
+        return settings.MEDIA_ROOT
+    return os.path.join(settings.SCHOOLS_ROOT, slug, 'media')
+
+
+def media_url(slug: Optional[str] = None) -> str:
+    if not slug:
+        return settings.MEDIA_URL
+    return f'{settings.SCHOOL_MEDIA_URL}{slug}/'
+
+
+def register_database(slug: str) -> str:
+    """Додає з'єднання школи під час роботи (після school_create)"""
+    alias = db_alias(slug)
+    if alias not in connections.settings:
+        config = copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS])
+        config['NAME'] = db_path(slug)
+        config['TEST'] = {**config.get('TEST', {}), 'NAME': None}
+        connections.settings[alias] = config
+        settings.DATABASES[alias] = config
+    return alias
+
+
+def current_school() -> Optional[str]:
+    return _current_school.get()
+
+
+def current_alias() -> str:
+    return db_alias(current_school())
+
+
+@contextmanager
+def using_school(slug: Optional[str]):
+    """Виконує код у контексті школи (для management-команд і фонових задач)"""
+    token = _current_school.set(slug)
+    try:
+        yield
+    finally:
+        _current_school.reset(token)
+
+
+class SchoolMiddleware:
+    """
+    Визначає школу за хостом або префіксом /s/<slug>/ і спрямовує всі запити
+    до її бази. Має стояти першим у MIDDLEWARE, щоб сесії та користувачі
+    також читались з бази школи.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Under ASGI the whole chain stays async, so async views run on the event loop
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        script_prefix, token = self.enter(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self.leave(script_prefix, token)
+
+    async def __acall__(self, request):
+        script_prefix, token = self.enter(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            self.leave(script_prefix, token)
+
+    def enter(self, request):
+        schools = settings.SCHOOLS
+        slug = None
+
+        host = request.get_host().split(':')[0].lower()
+        for candidate, config in schools.items():
+            if host in config.get('hosts', []):
+                slug = candidate
+                break
+
+        script_prefix = get_script_prefix()
+        prefix = f"/{settings.SCHOOL_PATH_PREFIX}/"
+        if slug is None and request.path_info.startswith(prefix):
+            candidate, _, rest = request.path_info[len(prefix):].partition('/')
+            if candidate not in schools:
+                raise Http404('Школу не знайдено')
+            slug = candidate
+            # Strip the prefix for URL resolution and keep it for reverse()
+            request.path_info = '/' + rest
+            script_name = request.META.get('SCRIPT_NAME', '').rstrip('/')
+            set_script_prefix(f"{script_name}{prefix}{slug}/")
+
+        request.school = slug
+        return script_prefix, _current_school.set(slug)
+
+    def leave(self, script_prefix, token):
+        _current_school.reset(token)
+        set_script_prefix(script_prefix)
+
+
+class SchoolFileSystemStorage(FileSystemStorage):
+    """Файлове сховище, що зберігає файли в каталозі поточної школи"""
+
+    @property
+    def base_location(self):
+        return media_root(current_school())
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        return media_url(current_school())
+
+    def path(self, name):
+        return safe_join(self.location, name)
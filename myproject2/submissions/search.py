@@ -0,0 +1,283 @@
+"""
+Повнотекстовий пошук по роботах і коментарях (SQLite FTS5)
+
+Індекс робіт: ім'я учня, текст файлу (utils.extract_text) і всі коментарі.
+Окремий індекс коментарів використовує адмінка. Індекс імен (триграми по
+Submission.name_key) дає пошук за частиною прізвища незалежно від мови
+введення і терпить одруківки. Індекси оновлюються сигналами (signals.py)
+і перебудовуються командою rebuild_search_index.
+"""
+import re
+from difflib import SequenceMatcher
+from html import escape
+from typing import List, Optional, Tuple
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from . import pdfs, schools
+
+SUBMISSION_TABLE = 'submissions_search'
+COMMENT_TABLE = 'submissions_comment_search'
+NAME_TABLE = 'submissions_name_search'
+NAME_VOCAB_TABLE = 'submissions_name_search_vocab'
+
+# Column weights for bm25(): name, body, comments
+RANK_WEIGHTS = (10.0, 1.0, 2.0)
+
+MAX_RESULTS = 200
+
+# Trigram matching needs at least this many characters
+TRIGRAM = 3
+# Fuzzy name search: how many index rows the rarest query trigrams may
+# cover and the minimal difflib ratio between a query word and the
+# closest word of the name
+FUZZY_CANDIDATES = 5000
+FUZZY_MIN_RATIO = 0.75
+# Letters that differ between Ukrainian and Russian-style transliteration
+# (Hryhoriev / Grigoriev) are compared as equal in fuzzy search
+_LOOSE_LETTERS = str.maketrans('hyj', 'gii')
+
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+
+
+def is_supported(using: str = 'default') -> bool:
+    return connections[using].vendor == 'sqlite'
+
+
+def build_match_query(query: str) -> str:
+    """Перетворює введений текст на безпечний FTS5-запит (усі слова, пошук за префіксом)"""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _submission_text(submission, using: str) -> Tuple[str, str]:
+    from .utils import extract_text
+    name = f"{submission.last_name} {submission.first_name}"
+    body = ''
+    if pdfs.is_pdf(submission):
+        # PDFs are parsed in the background (pdfs.py), never in the request
+        body = pdfs.stored_text(submission, using)
+    elif submission.file:
+        # The file lives in the media root of the school that owns the database
+        with schools.using_school(schools.slug_for_alias(using)):
+            body, _ = extract_text(submission.file.path, submission.get_file_extension())
+    return name, body
+
+
+def _comments_text(submission_id: int, using: str) -> str:
+    from .models import Comment
+    texts = Comment.objects.using(using).filter(submission_id=submission_id).values_list('text', flat=True)
+    return '\n'.join(texts)
+
+
+def index_submission(submission, using: str = 'default', reindex_file: bool = False) -> None:
+    """
+    Оновлює рядок роботи в індексі. Текст файлу витягується лише для нової
+    роботи або якщо змінився файл, інакше оновлюються ім'я та коментарі.
+    """
+    if not is_supported(using):
+        return
+    file_name = submission.file.name if submission.file else ''
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'SELECT file_name FROM {SUBMISSION_TABLE} WHERE rowid = %s', [submission.pk])
+        row = cursor.fetchone()
+        comments = _comments_text(submission.pk, using)
+        if row is not None and row[0] == file_name and not reindex_file:
+            cursor.execute(
+                f'UPDATE {SUBMISSION_TABLE} SET name = %s, comments = %s WHERE rowid = %s',
+                [f"{submission.last_name} {submission.first_name}", comments, submission.pk]
+            )
+            return
+        name, body = _submission_text(submission, using)
+        cursor.execute(f'DELETE FROM {SUBMISSION_TABLE} WHERE rowid = %s', [submission.pk])
+        cursor.execute(
+            f'INSERT INTO {SUBMISSION_TABLE} (rowid, name, body, comments, file_name) VALUES (%s, %s, %s, %s, %s)',
+            [submission.pk, name, body, comments, file_name]
+        )
+
+
+def update_comments(submission_id: int, using: str = 'default') -> None:
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {SUBMISSION_TABLE} SET comments = %s WHERE rowid = %s',
+            [_comments_text(submission_id, using), submission_id]
+        )
+
+
+def index_comment(comment, using: str = 'default') -> None:
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s', [comment.pk])
+        cursor.execute(f'INSERT INTO {COMMENT_TABLE} (rowid, text) VALUES (%s, %s)', [comment.pk, comment.text])
+
+
+def index_name(submission, using: str = 'default') -> None:
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {NAME_TABLE} WHERE rowid = %s', [submission.pk])
+        cursor.execute(f'INSERT INTO {NAME_TABLE} (rowid, name_key) VALUES (%s, %s)',
+                       [submission.pk, submission.name_key])
+
+
+def remove(table: str, pk: int, using: str = 'default') -> None:
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+
+
+def _highlight(snippet: str) -> str:
+    return escape(snippet).replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>')
+
+
+def search_submissions(query: str, using: str = 'default', limit: int = MAX_RESULTS) -> List[Tuple[int, str]]:
+    """
+    Шукає роботи за текстом, іменем і коментарями
+
+    Returns:
+        List[Tuple[int, str]]: (id роботи, HTML-фрагмент з підсвіченими збігами),
+        від найкращого збігу до найгіршого
+    """
+    match = build_match_query(query)
+    if not match or not is_supported(using):
+        return []
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({SUBMISSION_TABLE}, -1, %s, %s, '…', 16) "
+            f"FROM {SUBMISSION_TABLE} WHERE {SUBMISSION_TABLE} MATCH %s "
+            f"ORDER BY bm25({SUBMISSION_TABLE}, {weights}) LIMIT %s",
+            [_HIGHLIGHT_START, _HIGHLIGHT_END, match, limit]
+        )
+        return [(row[0], _highlight(row[1])) for row in cursor.fetchall()]
+
+
+def _fuzzy_name_ids(key: str, using: str) -> List[int]:
+    """
+    Імена, схожі на запит з одруківкою: кандидати мають спільні з запитом
+    триграми, далі їх відсіює difflib. Часті триграми (закінчення на зразок
+    «nko») відкидаються за fts5vocab, інакше ранжування перебирало б
+    більшість таблиці.
+    """
+    trigrams = {word[i:i + TRIGRAM] for word in key.split() for i in range(len(word) - TRIGRAM + 1)}
+    if not trigrams:
+        return []
+    with connections[using].cursor() as cursor:
+        placeholders = ', '.join(['%s'] * len(trigrams))
+        cursor.execute(
+            f'SELECT term, doc FROM {NAME_VOCAB_TABLE} WHERE term IN ({placeholders}) ORDER BY doc',
+            sorted(trigrams)
+        )
+        selected, budget = [], 0
+        for term, documents in cursor.fetchall():
+            if selected and budget + documents > FUZZY_CANDIDATES:
+                break
+            selected.append(term)
+            budget += documents
+        if not selected:
+            return []
+        match = ' OR '.join(f'"{trigram}"' for trigram in selected)
+        cursor.execute(
+            f'SELECT rowid, name_key FROM {NAME_TABLE} WHERE {NAME_TABLE} MATCH %s LIMIT %s',
+            [match, FUZZY_CANDIDATES]
+        )
+        rows = cursor.fetchall()
+
+    query_words = key.split()
+    ratios = {}
+
+    def ratio(query_word, word):
+        if (query_word, word) not in ratios:
+            ratios[query_word, word] = SequenceMatcher(
+                None, query_word.translate(_LOOSE_LETTERS), word.translate(_LOOSE_LETTERS)
+            ).ratio()
+        return ratios[query_word, word]
+
+    def similar(name_key):
+        words = name_key.split()
+        return all(max((ratio(query_word, word) for word in words), default=0) >= FUZZY_MIN_RATIO for query_word in query_words)
+
+    return [row[0] for row in rows if similar(row[1])]
+
+
+def filter_by_name(queryset, query: str):
+    """
+    Фільтрує роботи за ім'ям учня
+
+    Запит і імена порівнюються у вигляді utils.normalize_name, тож «Шевченко»,
+    «shevchenko» і «Ševčenko» знаходять одне й те саме. Кожне слово запиту
+    шукається як частина імені; якщо точних збігів немає, повертаються
+    схожі імена (одруківки).
+
+    Args:
+        queryset: QuerySet робіт
+        query (str): Введене ім'я або його частина
+
+    Returns:
+        QuerySet: Відфільтрований queryset (порядок не змінюється)
+    """
+    from .utils import normalize_name
+    key = normalize_name(query)
+    if not key:
+        return queryset
+    using = queryset.db
+    if not is_supported(using):
+        for word in key.split():
+            queryset = queryset.filter(name_key__contains=word)
+        return queryset
+
+    if len(key) < TRIGRAM:
+        # Too short for trigrams: surname prefix via the name_key b-tree index
+        upper = key[:-1] + chr(ord(key[-1]) + 1)
+        return queryset.filter(name_key__gte=key, name_key__lt=upper)
+
+    long_words = [word for word in key.split() if len(word) >= TRIGRAM]
+    short_words = [word for word in key.split() if len(word) < TRIGRAM]
+    exact = queryset
+    if long_words:
+        match = ' '.join(f'"{word}"' for word in long_words)
+        exact = exact.filter(id__in=RawSQL(f'SELECT rowid FROM {NAME_TABLE} WHERE {NAME_TABLE} MATCH %s', [match]))
+    for word in short_words:
+        exact = exact.filter(name_key__contains=word)
+    if exact.exists():
+        return exact
+    return queryset.filter(id__in=_fuzzy_name_ids(key, using))
+
+
+def search_comment_ids(query: str, using: str = 'default', limit: Optional[int] = None) -> List[int]:
+    match = build_match_query(query)
+    if not match or not is_supported(using):
+        return []
+    sql = f'SELECT rowid FROM {COMMENT_TABLE} WHERE {COMMENT_TABLE} MATCH %s ORDER BY rank'
+    params = [match]
+    if limit:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild(using: str = 'default') -> int:
+    """Повністю перебудовує всі індекси; повертає кількість робіт"""
+    from .models import Comment, Submission
+    if not is_supported(using):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SUBMISSION_TABLE}')
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE}')
+        cursor.execute(f'DELETE FROM {NAME_TABLE}')
+    count = 0
+    for submission in Submission.objects.using(using).iterator():
+        index_submission(submission, using, reindex_file=True)
+        index_name(submission, using)
+        count += 1
+    for comment in Comment.objects.using(using).iterator():
+        index_comment(comment, using)
+    return count
@@ -0,0 +1,72 @@
+"""
+Обробники сигналів моделей: інвалідація кешу фрагментів, оновлення
+пошукового індексу, підписів схожості робіт, аналізу PDF і живої панелі
+
+Вміст роботи індексується після коміту (завданням черги або в пулі
+aio), а не в транзакції, що її зберігає.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import aio, jobs, live, pdfs, search, tasks
+from . import cache as fragment_cache
+from .models import ActivityLog, ClassGroup, Comment, Submission
+
+
+def _bump_on_commit(using, *namespaces):
+    # A render between an earlier bump and the commit would cache the old rows under the new version
+    def bump():
+        for namespace in namespaces:
+            fragment_cache.bump_version(namespace, using)
+    transaction.on_commit(bump, using=using)
+
+
+@receiver([post_save, post_delete], sender=Submission)
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_feed(sender, using=None, **kwargs):
+    _bump_on_commit(using, fragment_cache.FEED)
+
+
+@receiver([post_save, post_delete], sender=ClassGroup)
+def invalidate_classes(sender, using=None, **kwargs):
+    # The feed shows class names too
+    _bump_on_commit(using, fragment_cache.CLASSES, fragment_cache.FEED)
+
+
+@receiver(post_save, sender=Submission)
+def index_submission(sender, instance, using, **kwargs):
+    # One short row; the feed search by name finds the work right away
+    search.index_name(instance, using)
+    # Text extraction, FTS, MinHash and winnowing run after the commit, off the upload's transaction
+    pk = instance.pk
+    if settings.JOBS_ENABLED:
+        jobs.enqueue_on_commit('index_submission', pk, dedup_key=f'index_submission:{pk}', using=using)
+    else:
+        transaction.on_commit(lambda: aio.run_in_background(tasks.index_submission, pk, using), using=using)
+    pdfs.schedule(instance, using)
+
+
+@receiver(post_save, sender=ActivityLog)
+def publish_activity(sender, using, created, **kwargs):
+    if created:
+        live.publish(using)
+
+
+@receiver(post_delete, sender=Submission)
+def unindex_submission(sender, instance, using, **kwargs):
+    search.remove(search.SUBMISSION_TABLE, instance.pk, using)
+    search.remove(search.NAME_TABLE, instance.pk, using)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, using, **kwargs):
+    search.index_comment(instance, using)
+    search.update_comments(instance.submission_id, using)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, using, **kwargs):
+    search.remove(search.COMMENT_TABLE, instance.pk, using)
+    search.update_comments(instance.submission_id, using)
@@ -0,0 +1,229 @@
+"""
+Пошук майже однакових робіт (MinHash + LSH)
+
+Текст роботи (utils.extract_text) розбивається на шинґли - послідовності
+з SHINGLE_SIZE слів - і стискається до MinHash-підпису з NUM_PERM чисел.
+Частка однакових позицій двох підписів оцінює схожість Жаккара їхніх
+множин шинґлів. Підпис ділиться на BANDS смуг; хеш кожної смуги - це
+кошик LSH. Кандидати у схожі - роботи, що потрапили хоч в один спільний
+кошик, тож нова робота порівнюється не з усіма, а лише з кількома.
+
+При BANDS=32 по 4 рядки пару зі схожістю 0.5 знайдено з імовірністю ~87%,
+0.6 - ~99%; пороги нижче 0.4 ненадійні.
+"""
+import random
+import re
+import struct
+from collections import defaultdict
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from . import pdfs, schools
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+# Documents shorter than this are too small to compare meaningfully
+MIN_WORDS = 30
+
+# Source code is compared token-wise, not as prose
+EXCLUDED_EXTENSIONS = ['.py', '.js', '.html', '.css', '.json', '.xml', '.url']
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20240901)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), 'little')
+
+
+def shingles(text: str) -> set:
+    """Множина хешів шинґлів з SHINGLE_SIZE слів (регістр не враховується)"""
+    words = _WORD_RE.findall(text.casefold())
+    if len(words) < MIN_WORDS:
+        return set()
+    return {
+        _hash(' '.join(words[i:i + SHINGLE_SIZE]).encode()) & _PRIME
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(hashes: set) -> List[int]:
+    return [min((a * x + b) % _PRIME for x in hashes) & _MAX_HASH for a, b in _PERMUTATIONS]
+
+
+def pack(signature: List[int]) -> bytes:
+    return struct.pack(f'<{NUM_PERM}I', *signature)
+
+
+def unpack(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f'<{NUM_PERM}I', bytes(data))
+
+
+def band_buckets(signature: List[int]) -> List[Tuple[int, int]]:
+    """(номер смуги, хеш смуги) для кожної смуги підпису"""
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = blake2b(struct.pack(f'<{ROWS}I', *rows), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, 'little', signed=True)))
+    return buckets
+
+
+def estimate(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Оцінка схожості Жаккара за двома підписами"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERM
+
+
+def get_threshold(class_group) -> float:
+    if class_group is not None and class_group.similarity_threshold is not None:
+        return class_group.similarity_threshold
+    return settings.SIMILARITY_THRESHOLD
+
+
+def is_document(submission) -> bool:
+    return bool(submission.file) and submission.get_file_extension() not in EXCLUDED_EXTENSIONS
+
+
+def index_submission(submission, using: str = 'default', force: bool = False) -> None:
+    """
+    Оновлює підпис і кошики роботи. Текст витягується лише якщо файл
+    змінився (або force), тож оцінювання і коментарі нічого не коштують.
+    """
+    from .models import DocumentFingerprint, LshBucket
+    from .utils import extract_text
+
+    file_name = submission.file.name if submission.file else ''
+    current = DocumentFingerprint.objects.using(using).filter(submission_id=submission.pk).values_list(
+        'file_name', flat=True).first()
+    if current == file_name and not force:
+        return
+
+    hashes = set()
+    if pdfs.is_pdf(submission):
+        # Filled in by the background analysis, which calls us again with force
+        hashes = shingles(pdfs.stored_text(submission, using))
+    elif is_document(submission):
+        with schools.using_school(schools.slug_for_alias(using)):
+            text, _ = extract_text(submission.file.path, submission.get_file_extension())
+        hashes = shingles(text)
+
+    with transaction.atomic(using=using):
+        LshBucket.objects.using(using).filter(submission_id=submission.pk).delete()
+        if not hashes:
+            # Remember the file anyway so it is not re-extracted on every save
+            DocumentFingerprint.objects.using(using).update_or_create(
+                submission_id=submission.pk,
+                defaults={'file_name': file_name, 'signature': b'', 'shingle_count': 0}
+            )
+            return
+        signature = minhash(hashes)
+        DocumentFingerprint.objects.using(using).update_or_create(
+            submission_id=submission.pk,
+            defaults={'file_name': file_name, 'signature': pack(signature), 'shingle_count': len(hashes)}
+        )
+        LshBucket.objects.using(using).bulk_create([
+            LshBucket(submission_id=submission.pk, band=band, bucket=bucket)
+            for band, bucket in band_buckets(signature)
+        ])
+
+
+def _signatures(submission_ids, using: str) -> Dict[int, Tuple[int, ...]]:
+    from .models import DocumentFingerprint
+    rows = DocumentFingerprint.objects.using(using).filter(
+        submission_id__in=submission_ids, shingle_count__gt=0
+    ).values_list('submission_id', 'signature')
+    return {submission_id: unpack(signature) for submission_id, signature in rows}
+
+
+def find_similar(submission, using: Optional[str] = None, threshold: Optional[float] = None) -> List[Tuple[object, float]]:
+    """
+    Знаходить схожі роботи того самого класу
+
+    Returns:
+        List[Tuple[Submission, float]]: (робота, оцінка схожості 0..1),
+        від найсхожішої
+    """
+    from .models import LshBucket, Submission
+    using = using or submission._state.db or 'default'
+    if threshold is None:
+        threshold = get_threshold(submission.class_group)
+
+    own = list(LshBucket.objects.using(using).filter(submission_id=submission.pk).values_list('band', 'bucket'))
+    if not own:
+        return []
+    condition = Q()
+    for band, bucket in own:
+        condition |= Q(band=band, bucket=bucket)
+    candidate_ids = set(
+        LshBucket.objects.using(using).filter(condition, submission__class_group_id=submission.class_group_id)
+        .exclude(submission_id=submission.pk).values_list('submission_id', flat=True)
+    )
+    if not candidate_ids:
+        return []
+
+    signatures = _signatures(candidate_ids | {submission.pk}, using)
+    mine = signatures.pop(submission.pk, None)
+    if mine is None:
+        return []
+    scores = {pk: estimate(mine, signature) for pk, signature in signatures.items()}
+    scores = {pk: score for pk, score in scores.items() if score >= threshold}
+    matches = Submission.objects.using(using).filter(id__in=scores).select_related('class_group')
+    return sorted(((match, scores[match.pk]) for match in matches), key=lambda item: -item[1])
+
+
+def similar_pairs(class_group, using: Optional[str] = None, threshold: Optional[float] = None) -> List[Tuple[object, object, float]]:
+    """
+    Усі пари схожих робіт класу (для звіту)
+
+    Returns:
+        List[Tuple[Submission, Submission, float]]: пари з оцінкою схожості,
+        від найсхожішої
+    """
+    from .models import LshBucket, Submission
+    using = using or class_group._state.db or 'default'
+    if threshold is None:
+        threshold = get_threshold(class_group)
+
+    groups = defaultdict(list)
+    rows = LshBucket.objects.using(using).filter(submission__class_group=class_group).values_list(
+        'band', 'bucket', 'submission_id')
+    for band, bucket, submission_id in rows:
+        groups[band, bucket].append(submission_id)
+
+    candidates = set()
+    for members in groups.values():
+        if len(members) > 1:
+            members.sort()
+            candidates.update((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+    if not candidates:
+        return []
+
+    signatures = _signatures({pk for pair in candidates for pk in pair}, using)
+    scored = []
+    for a, b in candidates:
+        if a in signatures and b in signatures:
+            score = estimate(signatures[a], signatures[b])
+            if score >= threshold:
+                scored.append((a, b, score))
+    submissions = Submission.objects.using(using).in_bulk({pk for a, b, _ in scored for pk in (a, b)})
+    scored.sort(key=lambda item: -item[2])
+    return [(submissions[a], submissions[b], score) for a, b, score in scored]
+
+
+def rebuild(using: str = 'default') -> int:
+    """Перераховує підписи всіх робіт; повертає кількість документів з підписом"""
+    from .models import DocumentFingerprint, Submission
+    for submission in Submission.objects.using(using).iterator():
+        index_submission(submission, using, force=True)
+    return DocumentFingerprint.objects.using(using).filter(shingle_count__gt=0).count()
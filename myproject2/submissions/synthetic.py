@@ -0,0 +1,246 @@
+"""
+Синтетичні дані для навантажувальних тестів і бенчмарків
+
+Генератори створюють справжні файли тих форматів, які здають учні
+(.docx, .xlsx, .pptx, .odt, .zip, .jpg, .py), з українським текстом і
+правдоподібною структурою: абзаци і заголовки, таблиця оцінок, слайди зі
+списками, архів з кодом у підкаталогах, фото з EXIF-орієнтацією. Розмір
+задається параметром scale (приблизно лінійно), тож той самий генератор
+дає і типову роботу, і великий файл для перевірки меж.
+
+Для навантажувальних тестів upload_size дає розмір завантаження з
+логнормального розподілу (медіана - сотні кілобайтів, довгий хвіст фото і
+сканів), а make_upload - файл приблизно такого розміру.
+
+Генератори детерміновані: однаковий random.Random(seed) дає той самий
+вміст (текст, кількість сторінок, рядків і слайдів), тож бенчмарки можна
+порівнювати між комітами. Байти Office-файлів можуть відрізнятися лише
+часовими мітками всередині ZIP-контейнера.
+"""
+import io
+import math
+import random
+import zipfile
+
+WORDS = (
+    'робота учень клас урок завдання відповідь питання приклад задача розв\'язок '
+    'функція змінна цикл умова масив рядок число формула графік таблиця '
+    'історія література мова природа фізика хімія біологія географія '
+    'рівняння енергія швидкість маса сила час простір клітина організм '
+    'держава народ війна мир культура мистецтво твір автор герой сюжет '
+    'тому отже оскільки також однак проте крім того наприклад зокрема '
+    'важливий основний головний новий цікавий складний простий великий малий'
+).split()
+
+LAST_NAMES = (
+    'Шевченко Коваленко Бондаренко Ткаченко Кравченко Олійник Шевчук Поліщук '
+    'Бойко Ткачук Мельник Лисенко Марченко Руденко Савченко Петренко Мороз '
+    'Клименко Павленко Левченко Гончаренко Кузьменко Романенко Литвиненко '
+    'Карпенко Собко Дяченко Панченко Федоренко Гуменюк Зінченко Остапчук'
+).split()
+
+FIRST_NAMES = (
+    'Олександр Андрій Дмитро Максим Іван Артем Назар Богдан Матвій Тарас '
+    'Марія Анна Софія Вікторія Дарина Олена Юлія Катерина Ірина Злата '
+    'Ярослав Остап Роман Денис Мирослава Соломія Христина Оксана'
+).split()
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(words // 2, words * 3 // 2)))
+    return text[0].upper() + text[1:] + '.'
+
+
+def paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return ' '.join(sentence(rng) for _ in range(rng.randint(2, sentences)))
+
+
+def make_docx(rng: random.Random, scale: int = 1) -> bytes:
+    from docx import Document
+
+    document = Document()
+    document.add_heading(sentence(rng, 4).rstrip('.'), level=1)
+    for section in range(2 * scale):
+        document.add_heading(sentence(rng, 3).rstrip('.'), level=2)
+        for _ in range(rng.randint(2, 5)):
+            document.add_paragraph(paragraph(rng))
+        if section % 2:
+            table = document.add_table(rows=4, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = rng.choice(WORDS)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_xlsx(rng: random.Random, scale: int = 1) -> bytes:
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Оцінки'
+    sheet.append(['Прізвище', "Ім'я"] + [f'Урок {n}' for n in range(1, 9)] + ['Середній'])
+    for row in range(2, 2 + 30 * scale):
+        sheet.append([rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES)]
+                     + [rng.randint(1, 12) for _ in range(8)]
+                     + [f'=AVERAGE(C{row}:J{row})'])
+    notes = workbook.create_sheet('Нотатки')
+    for _ in range(5 * scale):
+        notes.append([sentence(rng)])
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def make_pptx(rng: random.Random, scale: int = 1) -> bytes:
+    from pptx import Presentation
+
+    presentation = Presentation()
+    title_slide = presentation.slides.add_slide(presentation.slide_layouts[0])
+    title_slide.shapes.title.text = sentence(rng, 4).rstrip('.')
+    title_slide.placeholders[1].text = f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}'
+    for _ in range(5 * scale):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = sentence(rng, 3).rstrip('.')
+        body = slide.placeholders[1].text_frame
+        body.text = sentence(rng, 8)
+        for _ in range(rng.randint(2, 4)):
+            body.add_paragraph().text = sentence(rng, 8)
+    out = io.BytesIO()
+    presentation.save(out)
+    return out.getvalue()
+
+
+def make_odt(rng: random.Random, scale: int = 1) -> bytes:
+    from odf.opendocument import OpenDocumentText
+    from odf.text import H, P
+
+    document = OpenDocumentText()
+    document.text.addElement(H(outlinelevel=1, text=sentence(rng, 4).rstrip('.')))
+    for _ in range(6 * scale):
+        document.text.addElement(P(text=paragraph(rng)))
+    out = io.BytesIO()
+    document.write(out)
+    return out.getvalue()
+
+
+def make_code(rng: random.Random, scale: int = 1) -> bytes:
+    lines = [f'"""{sentence(rng, 6)}"""', '']
+    for n in range(8 * scale):
+        name = f'{rng.choice(["solve", "count", "read", "check", "print"])}_{n}'
+        lines += [
+            f'def {name}(values):',
+            f'    # {sentence(rng, 6)}',
+            '    result = 0',
+            '    for value in values:',
+            f'        if value % {rng.randint(2, 9)} == 0:',
+            '            result += value',
+            '    return result',
+            '',
+        ]
+    lines += ['', "if __name__ == '__main__':", f'    print(solve_0(range({rng.randint(10, 1000)})))', '']
+    return '\n'.join(lines).encode('utf-8')
+
+
+def make_zip(rng: random.Random, scale: int = 1) -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('README.md', f'# {sentence(rng, 4)}\n\n{paragraph(rng)}\n')
+        for n in range(3 * scale):
+            archive.writestr(f'project/task_{n}.py', make_code(rng))
+        archive.writestr('project/data/input.txt', '\n'.join(str(rng.randint(0, 999)) for _ in range(200)))
+        archive.writestr('report.docx', make_docx(rng))
+    return out.getvalue()
+
+
+def make_jpg(rng: random.Random, scale: int = 1) -> bytes:
+    from PIL import Image, ImageDraw
+
+    # A phone photo: large, noisy enough not to compress to nothing, often rotated
+    width, height = 800 * scale, 600 * scale
+    noise = rng.randbytes(width // 4 * (height // 4))
+    image = Image.frombytes('L', (width // 4, height // 4), noise).convert('RGB').resize((width, height))
+    draw = ImageDraw.Draw(image)
+    for _ in range(20):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.rectangle((x, y, x + rng.randint(20, 200), y + rng.randint(10, 60)),
+                       fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    exif = Image.Exif()
+    exif[0x0112] = rng.choice((1, 1, 6, 8))  # Orientation
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=85, exif=exif)
+    return out.getvalue()
+
+
+GENERATORS = {
+    '.docx': make_docx,
+    '.xlsx': make_xlsx,
+    '.pptx': make_pptx,
+    '.odt': make_odt,
+    '.py': make_code,
+    '.zip': make_zip,
+    '.jpg': make_jpg,
+}
+
+# Share of each format among generated submissions
+FORMAT_WEIGHTS = {
+    '.docx': 35,
+    '.xlsx': 10,
+    '.pptx': 15,
+    '.odt': 5,
+    '.py': 15,
+    '.zip': 8,
+    '.jpg': 12,
+}
+
+
+def make_file(extension: str, rng: random.Random, scale: int = 1) -> bytes:
+    """Файл заданого формату (розширення з GENERATORS)"""
+    return GENERATORS[extension](rng, scale)
+
+
+def pick_format(rng: random.Random) -> str:
+    formats = [ext for ext in FORMAT_WEIGHTS if ext in GENERATORS]
+    return rng.choices(formats, weights=[FORMAT_WEIGHTS[ext] for ext in formats])[0]
+
+
+# Upload sizes: median about 300 KB with a long tail of phone photos and scans
+UPLOAD_SIZE_MEDIAN = 300 * 1024
+UPLOAD_SIZE_SIGMA = 1.3
+UPLOAD_SIZE_MAX = 20 * 1024 * 1024
+
+# Where each ZIP-based format keeps embedded pictures
+MEDIA_FOLDERS = {
+    '.docx': 'word/media',
+    '.xlsx': 'xl/media',
+    '.pptx': 'ppt/media',
+    '.odt': 'Pictures',
+    '.zip': 'images',
+}
+
+
+def upload_size(rng: random.Random) -> int:
+    return min(UPLOAD_SIZE_MAX, int(rng.lognormvariate(math.log(UPLOAD_SIZE_MEDIAN), UPLOAD_SIZE_SIGMA)))
+
+
+def make_upload(extension: str, rng: random.Random, size: int) -> bytes:
+    """
+    Файл формату extension приблизно розміру size
+
+    Фото генерується з відповідною роздільністю, документи й архіви
+    доповнюються вкладеним «зображенням». Код лишається своїм розміром:
+    великих .py учні не здають.
+    """
+    if extension == '.jpg':
+        # About 150 KB per 800x600 block
+        return make_jpg(rng, min(8, max(1, round(math.sqrt(size / 150_000)))))
+    content = make_file(extension, rng)
+    folder = MEDIA_FOLDERS.get(extension)
+    if folder is None or len(content) >= size:
+        return content
+    out = io.BytesIO(content)
+    with zipfile.ZipFile(out, 'a') as archive:
+        # Pictures are already compressed, so random bytes stored as-is behave the same
+        archive.writestr(zipfile.ZipInfo(f'{folder}/image1.jpeg'), rng.randbytes(size - len(content)))
+    return out.getvalue()
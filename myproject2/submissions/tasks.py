@@ -0,0 +1,72 @@
+"""
+Фонові завдання черги (jobs.py), які ставлять view і сигнали
+
+Кожне завдання отримує id роботи, а не сам об'єкт: між постановкою і
+виконанням роботу могли змінити чи видалити.
+"""
+import os
+
+from . import archives, code_preview, code_similarity, exports, images, office, pdfs, schools, search, similarity
+from .jobs import task
+from .models import Submission
+
+CODE_EXTENSIONS = ('.py', '.js', '.html', '.css', '.txt', '.md', '.json', '.url')
+
+
+@task('analyze_pdf', priority=10)
+def analyze_pdf(pk):
+    document = pdfs.analyze_submission(pk, schools.current_alias())
+    return document.status if document is not None else None
+
+
+@task('index_submission', priority=5)
+def index_submission(pk, using=None):
+    """
+    Повнотекстовий індекс, підпис схожості і відбитки коду роботи. Файл
+    розбирається лише якщо він новий чи змінився, тож після оцінки чи
+    коментаря це кілька коротких запитів
+    """
+    using = using or schools.current_alias()
+    submission = Submission.objects.using(using).filter(pk=pk).first()
+    if submission is None:
+        return None
+    search.index_submission(submission, using)
+    similarity.index_submission(submission, using)
+    code_similarity.index_submission(submission, using)
+    return None
+
+
+@task('warm_previews', priority=-10)
+def warm_previews(pk):
+    """
+    Готує кешовані частини попереднього перегляду нової роботи, щоб вчитель
+    не чекав на них при першому відкритті: мініатюру зображення, дерево
+    архіву, першу сторінку коду і конвертацію старого формату Office
+    """
+    submission = Submission.objects.filter(pk=pk).first()
+    if submission is None or not submission.file:
+        return None
+    path = submission.file.path
+    if not os.path.exists(path):
+        return None
+    extension = submission.get_file_extension().lower()
+
+    if images.is_image(path):
+        _, error = images.get_derivative(path, images.sizes()[0], 'webp')
+    elif archives.archive_kind(path):
+        _, error = archives.get_archive_tree(path)
+    elif extension in CODE_EXTENSIONS:
+        _, error = code_preview.get_page(path, 0)
+    elif office.is_legacy(extension):
+        # Busy converters and timeouts raise, so the queue retries later
+        _, error = office.convert_legacy(path, extension, raise_temporary=True)
+    else:
+        return None
+    # A file that cannot be previewed is not worth retrying
+    return error
+
+
+@task('export', priority=20)
+def export(kind, params, name, filename):
+    """Файл експорту, на який чекає сторінка вчителя (filename - для завантаження)"""
+    return exports.build(kind, params, name, schools.current_alias())
@@ -7,14 +7,27 @@ urlpatterns = [
     path('teacher/', views.teacher_login, name='teacher_login'),
     path('teacher/logout/', views.teacher_logout, name='teacher_logout'),
     path('teacher/dashboard/', views.teacher_dashboard, name='teacher_dashboard'),
+    path('teacher/dashboard/events/', views.dashboard_events, name='dashboard_events'),
+    path('teacher/grade/bulk/', views.bulk_grade_submissions, name='bulk_grade_submissions'),
     path('teacher/grade/<int:submission_id>/', views.grade_submission, name='grade_submission'),
     path('teacher/student/<str:student_name>/', views.student_detail, name='student_detail'),
     path('teacher/export/', views.export_grades, name='export_grades'),
+    path('teacher/export/files/', views.export_files, name='export_files'),
+    path('teacher/export/job/<int:job_id>/', views.export_status, name='export_status'),
+    path('teacher/export/job/<int:job_id>/download/', views.export_download, name='export_download'),
     path('teacher/gradebook/', views.gradebook, name='gradebook'),
+    path('teacher/similar/', views.similar_submissions, name='similar_submissions'),
+    path('teacher/compare/<int:submission_id>/<int:other_id>/', views.compare_code, name='compare_code'),
     path('submission/<int:submission_id>/', views.submission_detail, name='submission_detail'),
     path('teacher/comment/<int:submission_id>/', views.update_comment, name='update_comment'),
     path('teacher/view-file/<int:submission_id>/', views.view_file, name='view_file'),
+    path('teacher/view-file/<int:submission_id>/member/', views.view_archive_member, name='view_archive_member'),
+    path('teacher/view-file/<int:submission_id>/code/', views.view_code_page, name='view_code_page'),
+    path('teacher/view-file/<int:submission_id>/pdf-thumbnail/', views.pdf_thumbnail, name='pdf_thumbnail'),
+    path('teacher/view-file/<int:submission_id>/image/', views.image_derivative, name='image_derivative'),
     path('teacher/comment/delete/<int:comment_id>/', views.delete_comment, name='delete_comment'),
     path('teacher/activity/', views.activity_log, name='activity_log'),
+    path('teacher/performance/', views.performance_stats, name='performance_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
 
@@ -1,11 +1,19 @@
 """
 Утиліти для конвертації офісних документів у HTML для попереднього перегляду
 """
+import hashlib
 import os
+import re
+import unicodedata
+from contextlib import contextmanager
+from contextvars import ContextVar
 from io import BytesIO
 from typing import Optional, Tuple
 
+from .profiling import timed
 
+
+@timed('convert')
 def convert_docx_to_html(file_path: str) -> Tuple[str, Optional[str]]:
     """
     Конвертує .docx файл у HTML для відображення в браузері
@@ -74,6 +82,7 @@ def convert_docx_to_html(file_path: str) -> Tuple[str, Optional[str]]:
         return "", error_msg
 
 
+@timed('convert')
 def convert_xlsx_to_html(file_path: str, max_rows: int = 100) -> Tuple[str, Optional[str]]:
     """
     Конвертує .xlsx файл у HTML таблиці з підтримкою формул та стилів
@@ -191,6 +200,7 @@ def convert_xlsx_to_html(file_path: str, max_rows: int = 100) -> Tuple[str, Opti
         return "", error_msg
 
 
+@timed('convert')
 def convert_pptx_to_html(file_path: str) -> Tuple[str, Optional[str]]:
     """
     Конвертує .pptx файл у HTML слайди
@@ -252,6 +262,7 @@ def convert_pptx_to_html(file_path: str) -> Tuple[str, Optional[str]]:
         error_msg = f"Помилка при читанні презентації: {str(e)}"
         return "", error_msg
 
+@timed('convert')
 def convert_odt_to_html(file_path: str) -> Tuple[str, Optional[str]]:
     """
     Конвертує .odt файл у HTML
@@ -288,6 +299,7 @@ def convert_odt_to_html(file_path: str) -> Tuple[str, Optional[str]]:
         return "", error_msg
 
 
+@timed('convert')
 def convert_ods_to_html(file_path: str, max_rows: int = 100) -> Tuple[str, Optional[str]]:
     """
     Конвертує .ods файл у HTML таблиці
@@ -355,6 +367,7 @@ def convert_ods_to_html(file_path: str, max_rows: int = 100) -> Tuple[str, Optio
         return "", error_msg
 
 
+@timed('convert')
 def convert_odp_to_html(file_path: str) -> Tuple[str, Optional[str]]:
     """
     Конвертує .odp файл у HTML (витягує текст зі слайдів)
@@ -405,47 +418,141 @@ def convert_odp_to_html(file_path: str) -> Tuple[str, Optional[str]]:
         return "", error_msg
 
 
-def get_archive_content(file_path: str, file_ext: str) -> Tuple[list, Optional[str]]:
+def file_digest(file_path: str) -> str:
     """
-    Повертає список файлів в архіві
+    Повертає SHA-256 файлу (ключ для кешів похідних: дерева архівів, прев'ю тощо)
+    
+    Хеш запам'ятовується в кеші за шляхом, розміром і часом зміни файлу,
+    тож повторні перегляди не перечитують великий файл.
+    
+    Args:
+        file_path: Шлях до файлу
+        
+    Returns:
+        str: Шістнадцятковий SHA-256
     """
-    files_list = []
+    from django.core.cache import cache
+    stat = os.stat(file_path)
+    key = 'file_digest:' + hashlib.md5(f'{file_path}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+    digest = cache.get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        cache.set(key, digest, None)
+    return digest
+
+# Розширення текстових файлів, які читаються як є
+TEXT_EXTENSIONS = ['.py', '.js', '.html', '.css', '.txt', '.md', '.json', '.xml', '.url']
+
+# Обмеження довжини тексту, що потрапляє в пошук/аналіз
+MAX_EXTRACTED_TEXT = 500_000
+
+
+# (file path, extract_text result) set by prepared_text for the current context
+_prepared_text = ContextVar('prepared_text', default=None)
+
+@contextmanager
+def prepared_text(file_path: str, extracted: Tuple[str, Optional[str]]):
+    """
+    extract_text для цього файлу повертає вже витягнутий текст
+    
+    Прийом роботи витягує текст у пулі потоків (aio.run_blocking), і індекси
+    пошуку та схожості в post_save не розбирають файл вдруге в потоці бази.
+    """
+    token = _prepared_text.set((file_path, extracted))
     try:
-        if file_ext == '.zip':
-            import zipfile
-            with zipfile.ZipFile(file_path, 'r') as zf:
-                for info in zf.infolist():
-                    files_list.append({
-                        'name': info.filename,
-                        'size': info.file_size,
-                        'is_dir': info.is_dir()
-                    })
-                    
-        elif file_ext == '.rar':
-            import rarfile
-            with rarfile.RarFile(file_path) as rf:
-                for info in rf.infolist():
-                    files_list.append({
-                        'name': info.filename,
-                        'size': info.file_size,
-                        'is_dir': info.isdir()
-                    })
-                    
-        elif file_ext == '.7z':
-            import py7zr
-            with py7zr.SevenZipFile(file_path, 'r') as zf:
-                for info in zf.list():
-                    files_list.append({
-                        'name': info.filename,
-                        'size': info.uncompressed,
-                        'is_dir': info.is_directory
-                    })
-                    
-        return files_list, None
+        yield
+    finally:
+        _prepared_text.reset(token)
+
+def extract_text(file_path: str, file_ext: str) -> Tuple[str, Optional[str]]:
+    """
+    Витягує простий текст з файлу роботи (для пошуку та порівняння робіт)
+    
+    Args:
+        file_path: Шлях до файлу
+        file_ext: Розширення файлу (наприклад, '.docx')
+        
+    Returns:
+        Tuple[str, Optional[str]]: (текст, повідомлення про помилку)
+    """
+    prepared = _prepared_text.get()
+    if prepared is not None and prepared[0] == file_path:
+        return prepared[1]
+    file_ext = file_ext.lower()
+    parts = []
+    try:
+        if file_ext in TEXT_EXTENSIONS:
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                return f.read(MAX_EXTRACTED_TEXT), None
+        
+        elif file_ext == '.docx':
+            from docx import Document
+            doc = Document(file_path)
+            parts.extend(para.text for para in doc.paragraphs)
+            for table in doc.tables:
+                for row in table.rows:
+                    parts.append(' '.join(cell.text for cell in row.cells))
+        
+        elif file_ext == '.xlsx':
+            from openpyxl import load_workbook
+            wb = load_workbook(file_path, read_only=True, data_only=True)
+            for sheet in wb.worksheets:
+                parts.append(sheet.title)
+                for row in sheet.iter_rows(values_only=True):
+                    parts.append(' '.join(str(value) for value in row if value is not None))
+            wb.close()
+        
+        elif file_ext == '.pptx':
+            from pptx import Presentation
+            prs = Presentation(file_path)
+            for slide in prs.slides:
+                for shape in slide.shapes:
+                    if hasattr(shape, "text"):
+                        parts.append(shape.text)
+        
+        elif file_ext in ['.odt', '.ods', '.odp']:
+            from odf.opendocument import load
+            from odf import teletype
+            from odf.text import P, H
+            doc = load(file_path)
+            for element in doc.getElementsByType(H) + doc.getElementsByType(P):
+                parts.append(teletype.extractText(element))
+        
+        else:
+            return "", None
         
     except Exception as e:
-        error_msg = f"Помилка при читанні архіву: {str(e)}"
-        return [], error_msg
+        return "", f"Помилка при витягуванні тексту: {str(e)}"
+    
+    text = '\n'.join(part for part in parts if part and part.strip())
+    return text[:MAX_EXTRACTED_TEXT], None
+
+# Транслітерація кирилиці (українська КМУ 2010 + російські літери)
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ie',
+    'ж': 'zh', 'з': 'z', 'и': 'y', 'і': 'i', 'ї': 'i', 'й': 'i', 'к': 'k', 'л': 'l',
+    'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ь': '', 'ю': 'iu',
+    'я': 'ia', 'ё': 'e', 'ы': 'y', 'э': 'e', 'ъ': '',
+}
+
+_NAME_APOSTROPHE_RE = re.compile(r"['’ʼ`]")
+_NAME_JUNK_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(text: str) -> str:
+    """
+    Ключ для пошуку за іменем: нижній регістр, кирилиця в латиниці, без
+    діакритики й апострофів. "Шевченко" і "Shevchenko" дають "shevchenko".
+    """
+    text = _NAME_APOSTROPHE_RE.sub('', (text or '').casefold())
+    text = ''.join(CYRILLIC_TO_LATIN.get(char, char) for char in text)
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(_NAME_JUNK_RE.sub(' ', text).split())
 
 def get_file_type_info(file_ext: str) -> dict:
     """
@@ -1,22 +1,48 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.urls import reverse
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
-from django.http import JsonResponse, HttpResponse, FileResponse
-from django.db.models import Q
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, Http404
 from django.core.paginator import Paginator
 from django.views.decorators.http import require_POST
-import csv
+from django.db import router, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+import json
 import os
+import time
 from datetime import datetime
 from collections import defaultdict
-from .models import Submission, ClassGroup, ActivityLog, Comment, log_activity
+from .models import Submission, ClassGroup, ActivityLog, Comment, Job, PdfDocument, log_activity, build_activity_log
 from .forms import SubmissionForm
+from .utils import extract_text, prepared_text
+from . import cache as fragment_cache
+from . import aio, code_preview, code_similarity, exports, jobs, live, metrics, office, pdfs, profiling, search, similarity
 
-def submission_create(request):
+def _attach_comment_counts(submissions):
+    """Ставить comment_count кожній роботі одним запитом замість запиту на рядок"""
+    submissions = list(submissions)
+    counts = dict(
+        Comment.objects.filter(submission__in=[sub.id for sub in submissions])
+        .values_list('submission')
+        .annotate(count=Count('id'))
+    )
+    for sub in submissions:
+        sub.comment_count = counts.get(sub.id, 0)
+    return submissions
+
+@aio.shed_load
+async def submission_create(request):
+    # Async so that under ASGI a slow upload is read by the server, not by a worker thread
     if request.method == 'POST':
-        form = SubmissionForm(request.POST, request.FILES)
-        if form.is_valid():
+        started = time.perf_counter()
+        # Building and validating the form reads the class list from the database
+        form = await sync_to_async(SubmissionForm)(request.POST, request.FILES)
+        if await sync_to_async(form.is_valid)():
             submission = form.save(commit=False)
             
             # Parse full_name into first_name and last_name
@@ -30,41 +56,92 @@ def submission_create(request):
                 submission.last_name = name_parts[0]
                 submission.first_name = ''
             
-            submission.save()
+            extracted = None
+            if submission.file:
+                # What FileField.pre_save would do inside save(), and the text the indexes
+                # read in post_save: the slow parts, and neither needs the database thread
+                try:
+                    await aio.run_blocking(submission.file.save, submission.file.name, submission.file.file, False)
+                except aio.Overloaded:
+                    metrics.UPLOADS.inc(result='overloaded')
+                    raise
+                try:
+                    extracted = await aio.run_blocking(
+                        extract_text, submission.file.path, submission.get_file_extension())
+                except aio.Overloaded:
+                    # The file is already stored; indexing after the commit reads it itself
+                    pass
             
-            # Log activity
-            log_activity(
-                None, 
-                'submission', 
-                f"Учень {submission.last_name} {submission.first_name} здав роботу ({submission.class_group.name})"
-            )
+            try:
+                await sync_to_async(_save_submission)(submission, extracted)
+            except Exception:
+                # No row points to the stored file, and a retry would store a second copy
+                if submission.file:
+                    await sync_to_async(submission.file.delete)(save=False)
+                raise
+
+            metrics.UPLOADS.inc(result='ok')
+            if submission.file:
+                metrics.UPLOAD_BYTES.observe(submission.file.size)
+            metrics.UPLOAD_SECONDS.observe(time.perf_counter() - started)
             
             return redirect('submission_success')
+        metrics.UPLOADS.inc(result='invalid')
     else:
-        form = SubmissionForm()
+        form = await sync_to_async(SubmissionForm)()
     
-    return render(request, 'submissions/submission_form.html', {'form': form})
+    return await sync_to_async(render)(request, 'submissions/submission_form.html', {'form': form})
+
+def _save_submission(submission, extracted=None):
+    if extracted is not None:
+        # Indexing runs on commit, so the prepared text has to outlive the transaction
+        with prepared_text(submission.file.path, extracted):
+            _store_submission(submission)
+    else:
+        _store_submission(submission)
+    if settings.JOBS_ENABLED and submission.file:
+        # Thumbnails and archive trees are ready before the teacher opens the work
+        jobs.enqueue_on_commit('warm_previews', submission.pk, dedup_key=f'warm_previews:{submission.pk}')
+
+def _store_submission(submission):
+    # The row and its log entry together: if either fails, the view removes the stored file
+    with transaction.atomic(using=router.db_for_write(Submission)):
+        submission.save()
+        
+        # Log activity
+        log_activity(
+            None, 
+            'submission', 
+            f"Учень {submission.last_name} {submission.first_name} здав роботу ({submission.class_group.name})",
+            submission=submission
+        )
 
 def submission_success(request):
-    from django.core.paginator import Paginator
-    
-    submissions = Submission.objects.all().order_by('-submitted_at')
-    
-    # Search filter
     search_query = request.GET.get('search', '').strip()
-    if search_query:
-        submissions = submissions.filter(
-            Q(last_name__icontains=search_query) | 
-            Q(first_name__icontains=search_query)
-        )
+    page_number = request.GET.get('page')
     
-    paginator = Paginator(submissions, 15)  # 15 per page
+    def render_feed():
+        submissions = Submission.objects.select_related('class_group').order_by('-submitted_at')
+        
+        # Search filter
+        if search_query:
+            submissions = search.filter_by_name(submissions, search_query)
+        
+        paginator = Paginator(submissions, 15)  # 15 per page
+        page_obj = paginator.get_page(page_number)
+        page_obj.object_list = _attach_comment_counts(page_obj.object_list)
+        
+        return render_to_string('submissions/success_feed_items.html', {
+            'page_obj': page_obj,
+            'search_query': search_query
+        })
     
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # The rendered list is the same for every visitor, so it is cached until
+    # a submission, comment or class changes (see signals.py)
+    feed_html = fragment_cache.get_or_render(fragment_cache.FEED, (page_number, search_query), render_feed)
     
     return render(request, 'submissions/success_feed.html', {
-        'page_obj': page_obj,
+        'feed_html': feed_html,
         'search_query': search_query
     })
 
@@ -88,8 +165,12 @@ def teacher_logout(request):
 
 @login_required
 def teacher_dashboard(request):
-    submissions = Submission.objects.all().order_by('-submitted_at')
-    class_groups = list(ClassGroup.objects.all())
+    # PDF page counts come along in the same query; page text is not needed here
+    submissions = (
+        Submission.objects.all().order_by('-submitted_at')
+        .select_related('class_group', 'pdf').defer('pdf__page_texts')
+    )
+    class_groups = fragment_cache.get_class_groups()
     
     # Filtering
     class_filter = request.GET.get('class_group')
@@ -105,10 +186,7 @@ def teacher_dashboard(request):
             pass
     
     if search_query:
-        submissions = submissions.filter(
-            Q(last_name__icontains=search_query) | 
-            Q(first_name__icontains=search_query)
-        )
+        submissions = search.filter_by_name(submissions, search_query)
     
     if date_filter:
         try:
@@ -118,6 +196,18 @@ def teacher_dashboard(request):
         except ValueError:
             pass
 
+    # Full-text search over file contents and comments, ordered by relevance
+    text_query = request.GET.get('q', '').strip()
+    if text_query:
+        snippets = dict(search.search_submissions(text_query, using=router.db_for_read(Submission)))
+        ranking = {submission_id: position for position, submission_id in enumerate(snippets)}
+        submissions = sorted(
+            submissions.filter(id__in=snippets).select_related('class_group'),
+            key=lambda sub: ranking[sub.id]
+        )
+        for sub in submissions:
+            sub.search_snippet = snippets[sub.id]
+
     # Mark selected class
     for cls in class_groups:
         cls.selected = (cls.id == selected_class_id)
@@ -126,13 +216,61 @@ def teacher_dashboard(request):
     paginator = Paginator(submissions, 15)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = _attach_comment_counts(page_obj.object_list)
 
     return render(request, 'submissions/teacher_dashboard.html', {
         'page_obj': page_obj,
         'class_groups': class_groups,
         'selected_date': date_filter,
+        'text_query': text_query,
+        'pdf_thumbnails': pdfs.rasterizer() is not None,
+        # Events after this journal entry arrive over the live stream
+        'live_after': live.latest_event_id(),
+        # New submissions are inserted only into the unfiltered first page
+        'live_insert': page_obj.number == 1 and not (search_query or date_filter or text_query),
+        'live_class_group': selected_class_id or '',
     })
 
+@login_required
+def dashboard_events(request):
+    """Потік Server-Sent Events з новими роботами, оцінками і коментарями (див. live.py)"""
+    try:
+        class_group_id = int(request.GET.get('class_group') or 0) or None
+        # The browser sends Last-Event-ID itself when it reconnects
+        after = int(request.headers.get('Last-Event-ID') or request.GET.get('after') or 0)
+    except ValueError:
+        return HttpResponse("Некоректний запит", status=400)
+    if not after:
+        after = live.latest_event_id()
+    return live.response(request, live.Stream(class_group_id, after))
+
+def _add_comment(request, submission, text):
+    """Додає окремий коментар до роботи і записує дію в журнал"""
+    comment = Comment.objects.create(
+        submission=submission,
+        author=request.user,
+        text=text
+    )
+    
+    # Log activity
+    log_activity(
+        request.user,
+        'comment',
+        f"Додано коментар до роботи {submission.last_name} {submission.first_name}",
+        submission=submission
+    )
+    return comment
+
+def _comment_payload(comment):
+    """Дані коментаря для JSON-відповіді"""
+    author = comment.author
+    return {
+        'id': comment.id,
+        'text': comment.text,
+        'author': (f"{author.first_name} {author.last_name}" if author.first_name else author.username) if author else '',
+        'created_at': timezone.localtime(comment.created_at).strftime("%d.%m.%Y %H:%M")
+    }
+
 @login_required
 def grade_submission(request, submission_id):
     from django.contrib import messages
@@ -142,35 +280,15 @@ def grade_submission(request, submission_id):
         action = request.POST.get('action')
         
         if action == 'comment':
-            new_comment = request.POST.get('comment')
-            if new_comment:
-                timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
-                # Append new comment to existing ones
-                current_comments = submission.comment or ""
-                separator = "----------------------------------------"
-                
-                new_entry = f"📅 {timestamp} | 👤 {request.user.first_name} {request.user.last_name}:\n{new_comment}"
-                
-                if current_comments:
-                    submission.comment = f"{current_comments}\n\n{separator}\n\n{new_entry}"
-                else:
-                    submission.comment = new_entry
-                
-                submission.teacher = request.user
-                submission.save()
-                
-                # Log activity
-                log_activity(
-                    request.user, 
-                    'comment', 
-                    f"Коментар до роботи: {submission.last_name} {submission.first_name}"
-                )
+            comment_text = request.POST.get('comment', '').strip()
+            if comment_text:
+                comment = _add_comment(request, submission, comment_text)
                 
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     return JsonResponse({
                         'status': 'success', 
                         'message': 'Коментар додано!',
-                        'full_comment': submission.comment
+                        'comment': _comment_payload(comment)
                     })
             
             messages.success(request, 'Коментар збережено!')
@@ -184,7 +302,8 @@ def grade_submission(request, submission_id):
             log_activity(
                 request.user, 
                 'grading', 
-                f"Оцінено роботу: {submission.last_name} {submission.first_name} - {grade}"
+                f"Оцінено роботу: {submission.last_name} {submission.first_name} - {grade}",
+                submission=submission
             )
             
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -195,14 +314,95 @@ def grade_submission(request, submission_id):
         return redirect('view_file', submission_id=submission.id)
     return JsonResponse({'status': 'error'}, status=400)
 
+def _parse_grade(value):
+    """Перевіряє оцінку (ціле число 1-12) і повертає її рядком"""
+    grade = str(value).strip()
+    if not grade.isdigit() or not 1 <= int(grade) <= 12:
+        raise ValueError(f"Некоректна оцінка: {grade or '—'}")
+    return str(int(grade))
+
+@login_required
+@require_POST
+def bulk_grade_submissions(request):
+    """
+    Зберігає одразу кілька оцінок: {"grades": {"<submission_id>": "<grade>", ...}}.
+    Усі пари перевіряються разом; якщо хоч одна некоректна, нічого не записується.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        raw_grades = payload.get('grades', {})
+        if not isinstance(raw_grades, dict) or not raw_grades:
+            raise ValueError
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Некоректний запит'}, status=400)
+
+    grades = {}
+    errors = {}
+    for raw_id, raw_grade in raw_grades.items():
+        try:
+            submission_id = int(raw_id)
+        except (TypeError, ValueError):
+            errors[str(raw_id)] = 'Некоректний ідентифікатор роботи'
+            continue
+        try:
+            grades[submission_id] = _parse_grade(raw_grade)
+        except ValueError as e:
+            errors[str(raw_id)] = str(e)
+
+    # Only the columns needed for the update and the log description
+    submissions = {
+        sub.id: sub for sub in Submission.objects.filter(id__in=grades).only(
+            'id', 'grade', 'teacher', 'last_name', 'first_name'
+        )
+    }
+    for submission_id in grades:
+        if submission_id not in submissions:
+            errors[str(submission_id)] = 'Роботу не знайдено'
+
+    if errors:
+        return JsonResponse({'status': 'error', 'errors': errors}, status=400)
+
+    changed = []
+    logs = []
+    for submission_id, grade in grades.items():
+        submission = submissions[submission_id]
+        if submission.grade == grade and submission.teacher_id == request.user.id:
+            continue
+        submission.grade = grade
+        submission.teacher = request.user
+        changed.append(submission)
+        logs.append(build_activity_log(
+            request.user,
+            'grading',
+            f"Оцінено роботу: {submission.last_name} {submission.first_name} - {grade}",
+            submission=submission
+        ))
+
+    with transaction.atomic(using=router.db_for_write(Submission)):
+        Submission.objects.bulk_update(changed, ['grade', 'teacher'])
+        ActivityLog.objects.bulk_create(logs)
+    if logs:
+        metrics.ACTIVITY.inc(len(logs), action='grading')
+    
+    # bulk_update() and bulk_create() send no post_save signals
+    if changed:
+        fragment_cache.bump_version(fragment_cache.FEED)
+        live.publish()
+
+    return JsonResponse({
+        'status': 'success',
+        'grades': {str(submission_id): grade for submission_id, grade in grades.items()},
+        'updated': len(changed),
+    })
+
 @login_required
 def student_detail(request, student_name):
     try:
         last, first = student_name.split('_')
-        submissions = Submission.objects.filter(
+        submissions = _attach_comment_counts(Submission.objects.filter(
             last_name__iexact=last, 
             first_name__iexact=first
-        ).order_by('-submitted_at')
+        ).select_related('class_group').order_by('-submitted_at'))
     except ValueError:
         submissions = []
         
@@ -213,44 +413,61 @@ def student_detail(request, student_name):
 
 @login_required
 def export_grades(request):
-    class_group_id = request.GET.get('class_group')
-    
-    # Determine filename and filter submissions
-    if class_group_id:
-        try:
-            selected_class = ClassGroup.objects.get(id=class_group_id)
-            submissions = Submission.objects.filter(
-                class_group_id=class_group_id,
-                grade__isnull=False
-            ).order_by('last_name', 'submitted_at')
-            filename = f'grades_{selected_class.name}.csv'
-        except ClassGroup.DoesNotExist:
-            submissions = Submission.objects.filter(grade__isnull=False).order_by('last_name', 'submitted_at')
-            filename = 'grades.csv'
-    else:
-        submissions = Submission.objects.filter(grade__isnull=False).order_by('last_name', 'submitted_at')
-        filename = 'grades_all.csv'
-    
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Прізвище', "Ім'я", 'Клас', 'Дата', 'Оцінка'])
-    
-    for sub in submissions:
-        writer.writerow([
-            sub.last_name, 
-            sub.first_name, 
-            sub.class_group.name,
-            sub.submitted_at.strftime('%Y-%m-%d'), 
-            sub.grade
-        ])
+    params, selected_class = exports.parse_params(request.GET.get('class_group'))
+    return _export(request, exports.GRADES, params, exports.download_name(exports.GRADES, selected_class))
 
-    return response
+@login_required
+def export_files(request):
+    params, selected_class = exports.parse_params(request.GET.get('class_group'))
+    return _export(request, exports.FILES, params, exports.download_name(exports.FILES, selected_class))
+
+def _export(request, kind, params, filename):
+    """Віддає готовий файл експорту або сторінку очікування фонового завдання"""
+    path, job = exports.start(kind, params, filename)
+    if job is None:
+        return aio.file_response(request, open(path, 'rb'), as_attachment=True, filename=filename,
+                                 content_type=exports.CONTENT_TYPES[kind])
+    return render(request, 'submissions/export_progress.html', {
+        'job': job,
+        'filename': filename,
+        'back_url': request.META.get('HTTP_REFERER') or reverse('gradebook'),
+    })
+
+def _export_job(job_id):
+    return get_object_or_404(Job, pk=job_id, task='export')
+
+@login_required
+def export_status(request, job_id):
+    """Стан завдання експорту для сторінки очікування (JSON)"""
+    job = _export_job(job_id)
+    data = {'status': job.status, 'progress': job.progress, 'attempts': job.attempts}
+    if job.status == 'done':
+        data['download_url'] = reverse('export_download', args=[job.pk])
+    elif job.status == 'failed':
+        data['error'] = 'Не вдалося підготувати файл експорту'
+    return JsonResponse(data)
+
+@login_required
+def export_download(request, job_id):
+    job = _export_job(job_id)
+    if job.status != 'done':
+        raise Http404("Експорт ще не готовий")
+    kind, params, _, filename = job.args
+    path = exports.artifact_path(job.result['path'])
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        # Replaced by a newer version of the same export after the data changed
+        url = reverse('export_grades' if kind == exports.GRADES else 'export_files')
+        if params['class_group']:
+            url += f'?class_group={params["class_group"]}'
+        return redirect(url)
+    return aio.file_response(request, file, as_attachment=True, filename=filename,
+                             content_type=exports.CONTENT_TYPES[kind])
 
 @login_required
 def gradebook(request):
-    class_groups = list(ClassGroup.objects.all())
+    class_groups = fragment_cache.get_class_groups()
     selected_class_id = request.GET.get('class_group')
     view_mode = request.GET.get('view')
     
@@ -347,19 +564,7 @@ def submission_detail(request, submission_id):
         if action == 'comment':
             comment_text = request.POST.get('comment', '').strip()
             if comment_text:
-                Comment.objects.create(
-                    submission=submission,
-                    author=request.user,
-                    text=comment_text
-                )
-                
-                # Log activity
-                log_activity(
-                    request.user,
-                    'comment',
-                    f"Додано коментар до роботи {submission.last_name} {submission.first_name}",
-                    submission=submission
-                )
+                _add_comment(request, submission, comment_text)
                 
                 return redirect('submission_detail', submission_id=submission_id)
     
@@ -378,194 +583,358 @@ def submission_detail(request, submission_id):
 def update_comment(request, submission_id):
     if request.method == 'POST':
         submission = get_object_or_404(Submission, id=submission_id)
-        comment = request.POST.get('comment', '').strip()
-        submission.comment = comment
-        submission.teacher = request.user
-        submission.save()
+        comment_text = request.POST.get('comment', '').strip()
+        if not comment_text:
+            return JsonResponse({'status': 'error', 'message': 'Коментар порожній'}, status=400)
         
-        # Log activity
-        log_activity(
-            request.user, 
-            'comment', 
-            f"Коментар до роботи {submission.last_name} {submission.first_name}"
-        )
+        comment = _add_comment(request, submission, comment_text)
         
-        return JsonResponse({'status': 'success', 'comment': comment})
+        return JsonResponse({'status': 'success', 'comment': _comment_payload(comment)})
     return JsonResponse({'status': 'error'}, status=400)
 
-@login_required
-def view_file(request, submission_id):
-    from django.contrib import messages
-    from .models import Comment
+def _build_preview(file_path, file_ext, page=0):
+    """Готує попередній перегляд файлу: тип, сторінку коду, HTML документа або дерево архіву"""
+    started = time.perf_counter()
+    file_format = file_ext.lower().lstrip('.')
+    file_type = 'unknown'
+    code_page = None
+    html_content = None
+    archive_tree = None
+    error_message = None
+
+    # List of archive extensions
+    archive_files = ['.zip', '.rar', '.7z', '.tar', '.gz', '.tgz']
     
-    submission = get_object_or_404(Submission, id=submission_id)
+    # List of office preview extensions
+    office_preview = ['.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt', '.odt', '.ods', '.odp']
     
-    # Handle POST requests (comments and grading)
-    if request.method == 'POST':
-        action = request.POST.get('action')
+    # List of image extensions
+    image_files = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+
+    if file_ext in ['.py', '.js', '.html', '.css', '.txt', '.md', '.json', '.url']:
+        file_type = 'code'
+        from .code_preview import get_page
+        code_page, error_message = get_page(file_path, page)
+            
+    elif file_ext in office_preview:
+        file_type = 'office_preview'
+        from .utils import (
+            convert_docx_to_html, 
+            convert_xlsx_to_html, 
+            convert_pptx_to_html,
+            convert_odt_to_html,
+            convert_ods_to_html,
+            convert_odp_to_html
+        )
+        try:
+            if office.is_legacy(file_ext):
+                # .doc/.xls/.ppt are shown through their OOXML conversion
+                converted, error_message = office.convert_legacy(file_path, file_ext)
+                if converted is None:
+                    file_ext = None
+                else:
+                    file_path = converted
+            if file_ext in ['.docx', '.doc']:
+                html_content, error_message = convert_docx_to_html(file_path)
+            elif file_ext in ['.xlsx', '.xls']:
+                html_content, error_message = convert_xlsx_to_html(file_path)
+            elif file_ext in ['.pptx', '.ppt']:
+                html_content, error_message = convert_pptx_to_html(file_path)
+            elif file_ext == '.odt':
+                html_content, error_message = convert_odt_to_html(file_path)
+            elif file_ext == '.ods':
+                html_content, error_message = convert_ods_to_html(file_path)
+            elif file_ext == '.odp':
+                html_content, error_message = convert_odp_to_html(file_path)
+        except Exception as e:
+            error_message = f"Помилка конвертації: {str(e)}"
+
+    elif file_ext in archive_files:
+        file_type = 'archive'
+        from .archives import get_archive_tree
+        archive_tree, error_message = get_archive_tree(file_path)
         
-        if action == 'comment':
-            comment_text = request.POST.get('comment', '').strip()
-            if comment_text:
-                comment = Comment.objects.create(
-                    submission=submission,
-                    author=request.user,
-                    text=comment_text
-                )
-                
-                # Log activity
-                log_activity(
-                    request.user,
-                    'comment',
-                    f"Додано коментар до роботи {submission.last_name} {submission.first_name}",
-                    submission=submission
-                )
-                
-                # Check if AJAX request
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({
-                        'status': 'success',
-                        'comment': {
-                            'id': comment.id,
-                            'text': comment.text,
-                            'author': f"{comment.author.first_name} {comment.author.last_name}" if comment.author.first_name else comment.author.username,
-                            'created_at': comment.created_at.strftime("%d.%m.%Y %H:%M")
-                        }
-                    })
-                
-                messages.success(request, 'Коментар додано!')
-                return redirect('view_file', submission_id=submission_id)
+    elif file_ext in image_files:
+        file_type = 'image'
         
-        elif action == 'grade':
-            grade = request.POST.get('grade', '').strip()
-            if grade:
-                submission.grade = grade
-                submission.save()
-                
-                log_activity(
-                    request.user,
-                    'grading',
-                    f"Оцінено роботу {submission.last_name} {submission.first_name}: {grade}",
-                    submission=submission
-                )
-                
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({'status': 'success', 'grade': grade})
-                
-                messages.success(request, f'Оцінку {grade} успішно збережено!')
-                return redirect('view_file', submission_id=submission_id)
+    elif file_ext in ['.pdf']:
+        file_type = 'pdf'
+
+    else:
+        file_type = 'office'
+
+    if file_type in ('code', 'office_preview', 'archive'):
+        metrics.CONVERTER_SECONDS.observe(time.perf_counter() - started, format=file_format)
+        if error_message:
+            metrics.CONVERTER_FAILURES.inc(format=file_format)
+
+    return {
+        'file_type': file_type,
+        'code_page': code_page,
+        'html_content': html_content,
+        'archive_tree': archive_tree,
+        'error_message': error_message,
+    }
+
+def _view_file_post(request, submission):
+    """Коментар або оцінка з форми сторінки перегляду; None - показати сторінку"""
+    from django.contrib import messages
     
-    # Navigation logic - sort by submission date
-    all_submissions = Submission.objects.all().order_by('-submitted_at')
-    submission_list = list(all_submissions)
+    action = request.POST.get('action')
     
-    try:
-        current_index = submission_list.index(submission)
-        prev_submission = submission_list[current_index - 1] if current_index > 0 else None
-        next_submission = submission_list[current_index + 1] if current_index < len(submission_list) - 1 else None
-    except ValueError:
-        prev_submission = None
-        next_submission = None
+    if action == 'comment':
+        comment_text = request.POST.get('comment', '').strip()
+        if comment_text:
+            comment = _add_comment(request, submission, comment_text)
+            
+            # Check if AJAX request
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({
+                    'status': 'success',
+                    'comment': _comment_payload(comment)
+                })
+            
+            messages.success(request, 'Коментар додано!')
+            return redirect('view_file', submission_id=submission.id)
+    
+    elif action == 'grade':
+        grade = request.POST.get('grade', '').strip()
+        if grade:
+            submission.grade = grade
+            submission.save()
+            
+            log_activity(
+                request.user,
+                'grading',
+                f"Оцінено роботу {submission.last_name} {submission.first_name}: {grade}",
+                submission=submission
+            )
+            
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'status': 'success', 'grade': grade})
+            
+            messages.success(request, f'Оцінку {grade} успішно збережено!')
+            return redirect('view_file', submission_id=submission.id)
+    return None
+
+@login_required
+@aio.shed_load
+async def view_file(request, submission_id):
+    # Async: the conversion below runs in the bounded pool, not in a request thread
+    submission = await aget_object_or_404(Submission.objects.select_related('class_group'), id=submission_id)
+    
+    # Handle POST requests (comments and grading)
+    if request.method == 'POST':
+        response = await sync_to_async(_view_file_post)(request, submission)
+        if response is not None:
+            return response
 
     if not submission.file and not submission.link:
         return HttpResponse("Файл або посилання не знайдено", status=404)
     
     # If link exists but no file, create a dummy file to prevent errors
     if submission.link and not submission.file:
-        from django.core.files.base import ContentFile
-        file_content = f"[InternetShortcut]\nURL={submission.link}"
-        submission.file.save(f"link_{submission.id}.url", ContentFile(file_content))
-        submission.save()
+        await sync_to_async(_save_link_shortcut)(submission)
     
     # Determine file type and content
-    file_type = 'unknown'
-    content = None
-    html_content = None
-    archive_content = None
-    error_message = None
+    preview = {'file_type': 'unknown', 'code_page': None, 'html_content': None,
+               'archive_tree': None, 'error_message': None}
     file_ext = ''
 
     if submission.file:
         file_ext = submission.get_file_extension().lower()
+        try:
+            page = int(request.GET.get('page', 1)) - 1
+        except ValueError:
+            page = 0
+        preview = await aio.run_blocking(_build_preview, submission.file.path, file_ext, page)
     elif submission.link:
-        file_type = 'link'
+        preview['file_type'] = 'link'
 
-    # List of archive extensions
-    archive_files = ['.zip', '.rar', '.7z', '.tar', '.gz']
-    
-    # List of office preview extensions
-    office_preview = ['.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt', '.odt', '.ods', '.odp']
-    
-    # List of image extensions
-    image_files = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+    return await sync_to_async(_render_file_viewer)(request, submission, file_ext, preview)
 
-    if submission.file:
-        if file_ext in ['.py', '.js', '.html', '.css', '.txt', '.md', '.json', '.url']:
-            file_type = 'code'
-            try:
-                with open(submission.file.path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            except Exception as e:
-                content = f"Помилка при читанні файлу: {str(e)}"
-                
-        elif file_ext in office_preview:
-            file_type = 'office_preview'
-            from .utils import (
-                convert_docx_to_html, 
-                convert_xlsx_to_html, 
-                convert_pptx_to_html,
-                convert_odt_to_html,
-                convert_ods_to_html,
-                convert_odp_to_html
-            )
-            try:
-                if file_ext in ['.docx', '.doc']:
-                    html_content, error_message = convert_docx_to_html(submission.file.path)
-                elif file_ext in ['.xlsx', '.xls']:
-                    html_content, error_message = convert_xlsx_to_html(submission.file.path)
-                elif file_ext in ['.pptx', '.ppt']:
-                    html_content, error_message = convert_pptx_to_html(submission.file.path)
-                elif file_ext == '.odt':
-                    html_content, error_message = convert_odt_to_html(submission.file.path)
-                elif file_ext == '.ods':
-                    html_content, error_message = convert_ods_to_html(submission.file.path)
-                elif file_ext == '.odp':
-                    html_content, error_message = convert_odp_to_html(submission.file.path)
-            except Exception as e:
-                error_message = f"Помилка конвертації: {str(e)}"
-
-        elif file_ext in archive_files:
-            file_type = 'archive'
-            from .utils import get_archive_content
-            archive_content, error_message = get_archive_content(submission.file.path, file_ext)
-            
-        elif file_ext in image_files:
-            file_type = 'image'
-            
-        elif file_ext in ['.pdf']:
-            file_type = 'pdf'
+def _save_link_shortcut(submission):
+    from django.core.files.base import ContentFile
+    file_content = f"[InternetShortcut]\nURL={submission.link}"
+    submission.file.save(f"link_{submission.id}.url", ContentFile(file_content))
+    submission.save()
 
-        else:
-            file_type = 'office'
+def _neighbours(submission):
+    """Попередня і наступна робота в порядку панелі вчителя (новіші спершу)"""
+    moment, pk = submission.submitted_at, submission.id
+    # Ties on the timestamp are broken by id, so every submission has exactly one neighbour each way
+    newer = Submission.objects.filter(Q(submitted_at__gt=moment) | Q(submitted_at=moment, id__gt=pk))
+    older = Submission.objects.filter(Q(submitted_at__lt=moment) | Q(submitted_at=moment, id__lt=pk))
+    prev_submission = newer.order_by('submitted_at', 'id').only('id').first()
+    next_submission = older.order_by('-submitted_at', '-id').only('id').first()
+    return prev_submission, next_submission
+
+def _render_file_viewer(request, submission, file_ext, preview):
+    prev_submission, next_submission = _neighbours(submission)
+
+    # Page count and status of the background PDF analysis
+    pdf_document = None
+    if preview['file_type'] == 'pdf':
+        pdf_document = PdfDocument.objects.filter(submission=submission).defer('page_texts').first()
+
+    # Downscaled, EXIF-rotated copies instead of the full-size original
+    image_srcset = None
+    if preview['file_type'] == 'image' and submission.has_image_preview():
+        from . import images
+        info = images.image_info(submission.file.path)
+        if info:
+            image_srcset = images.srcsets(info, reverse('image_derivative', args=[submission.id]))
 
     # Get all comments for this submission
     comments = submission.comments.all().select_related('author')
 
+    # Near-duplicates in the same class: code by token fingerprints,
+    # documents by MinHash/LSH
+    similar_is_code = code_similarity.is_code(submission)
+    if similar_is_code:
+        similar_submissions = code_similarity.find_similar(submission)
+    else:
+        similar_submissions = similarity.find_similar(submission) if submission.file else []
+
     context = {
         'submission': submission,
         'file_name': os.path.basename(submission.file.name) if submission.file else '',
         'file_ext': file_ext,
-        'file_type': file_type,
-        'content': content,
-        'html_content': html_content,
-        'archive_content': archive_content,
-        'error_message': error_message,
+        **preview,
+        'code_css': code_preview.stylesheet() if preview['code_page'] else '',
+        'image_srcset': image_srcset,
+        'pdf_document': pdf_document,
         'prev_submission': prev_submission,
         'next_submission': next_submission,
         'comments': comments,
+        'similar_submissions': similar_submissions,
+        'similar_is_code': similar_is_code,
+        'similarity_threshold': similarity.get_threshold(submission.class_group),
     }
     return render(request, 'submissions/file_viewer.html', context)
 
+@login_required
+def view_code_page(request, submission_id):
+    """Фрагмент з однією сторінкою коду (для гортання великих файлів без перезавантаження)"""
+    submission = get_object_or_404(Submission, id=submission_id)
+    if not submission.file:
+        return HttpResponse("Файл не знайдено", status=404)
+    
+    try:
+        page = int(request.GET.get('page', 1)) - 1
+    except ValueError:
+        return HttpResponse("Некоректний номер сторінки", status=400)
+    
+    code_page, error_message = code_preview.get_page(submission.file.path, page)
+    if error_message:
+        return HttpResponse(error_message, status=404)
+    
+    return render(request, 'submissions/code_page.html', {
+        'submission': submission,
+        'code_page': code_page,
+        'paged': True,
+    })
+
+@login_required
+@aio.shed_load
+async def image_derivative(request, submission_id):
+    """Віддає зменшену копію зображення роботи (мініатюра або прев'ю з srcset)"""
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from . import images
+    
+    submission = await aget_object_or_404(Submission, id=submission_id)
+    if not submission.file or not images.is_image(submission.file.name):
+        return HttpResponse("Файл не знайдено", status=404)
+    
+    try:
+        size = int(request.GET.get('size', images.sizes()[0]))
+    except ValueError:
+        return HttpResponse("Некоректний розмір", status=400)
+    fmt = request.GET.get('format', 'webp')
+    
+    path, error_message = await aio.run_blocking(images.get_derivative, submission.file.path, size, fmt)
+    if error_message:
+        return HttpResponse(error_message, status=404)
+    
+    # The derivative name holds the source hash, so it doubles as an ETag
+    etag = '"%s-%s"' % (os.path.basename(os.path.dirname(path))[:16], os.path.basename(path))
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    
+    response = aio.file_response(request, open(path, 'rb'), content_type=images.FORMATS[fmt][1])
+    response['ETag'] = etag
+    # URLs with ?v=<hash> change whenever the file does and can be cached for good
+    if request.GET.get('v'):
+        patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+@aio.shed_load
+async def pdf_thumbnail(request, submission_id):
+    """Мініатюра першої сторінки PDF (растеризується при першому запиті)"""
+    from django.utils.cache import patch_cache_control
+    
+    submission = await aget_object_or_404(Submission, id=submission_id)
+    if not pdfs.is_pdf(submission):
+        return HttpResponse("Файл не знайдено", status=404)
+    
+    path, error_message = await aio.run_blocking(pdfs.get_thumbnail, submission)
+    if error_message:
+        return HttpResponse(error_message, status=404)
+    
+    response = aio.file_response(request, open(path, 'rb'), content_type='image/webp')
+    patch_cache_control(response, private=True, max_age=24 * 60 * 60)
+    return response
+
+@login_required
+@aio.shed_load
+async def view_archive_member(request, submission_id):
+    from . import archives
+    import mimetypes
+    
+    submission = await aget_object_or_404(Submission.objects.select_related('class_group'), id=submission_id)
+    member = request.GET.get('path', '')
+    if not submission.file or not member or archives.archive_kind(submission.file.name) is None:
+        return HttpResponse("Файл не знайдено", status=404)
+    
+    name = archives.member_name(member)
+    
+    # Raw bytes for <img>/<object> and downloads; streamed, not cached
+    if request.GET.get('raw'):
+        try:
+            stream = await aio.run_blocking(archives.read_member, submission.file.path, member)
+        except aio.Overloaded:
+            raise
+        except Exception as e:
+            return HttpResponse(f"Помилка при читанні файлу з архіву: {str(e)}", status=404)
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        return aio.file_response(request, stream, content_type=content_type, filename=name,
+                                 as_attachment=bool(request.GET.get('download')))
+    
+    preview = await aio.run_blocking(archives.get_member_preview, submission.file.path, member, _build_preview)
+    
+    # Breadcrumbs: each nested archive along the path is a separate link
+    parts = member.split(archives.NESTED_SEPARATOR)
+    breadcrumbs = [
+        {'name': part, 'member': archives.NESTED_SEPARATOR.join(parts[:i + 1])}
+        for i, part in enumerate(parts)
+    ]
+    
+    return await sync_to_async(render)(request, 'submissions/archive_member.html', {
+        'submission': submission,
+        'member': member,
+        'archive_name': os.path.basename(submission.file.name),
+        'member_prefix': member + archives.NESTED_SEPARATOR,
+        'file_name': name,
+        'file_ext': os.path.splitext(name)[1].lower(),
+        'breadcrumbs': breadcrumbs,
+        **preview,
+        'code_css': code_preview.stylesheet() if preview.get('code_page') else '',
+    })
+
 @login_required
 @require_POST
 def delete_comment(request, comment_id):
@@ -585,6 +954,75 @@ def delete_comment(request, comment_id):
     
     return JsonResponse({'status': 'error', 'message': 'Немає прав'}, status=403)
 
+@login_required
+def similar_submissions(request):
+    from django.contrib import messages
+    
+    class_groups = fragment_cache.get_class_groups()
+    selected_class_id = request.POST.get('class_group') or request.GET.get('class_group')
+    
+    selected_class = None
+    if selected_class_id:
+        try:
+            selected_class = ClassGroup.objects.filter(id=int(selected_class_id)).first()
+        except ValueError:
+            pass
+    
+    # Per-class threshold, entered in percent; empty resets to the default
+    if request.method == 'POST' and selected_class:
+        value = request.POST.get('threshold', '').strip()
+        try:
+            threshold = int(value) / 100 if value else None
+            if threshold is not None and not 0 < threshold <= 1:
+                raise ValueError
+        except ValueError:
+            messages.error(request, 'Поріг має бути числом від 1 до 100')
+        else:
+            selected_class.similarity_threshold = threshold
+            selected_class.save(update_fields=['similarity_threshold'])
+            messages.success(request, f'Поріг для класу {selected_class.name} збережено')
+        return redirect(f"{request.path}?class_group={selected_class.id}")
+    
+    for cls in class_groups:
+        cls.selected = selected_class is not None and cls.id == selected_class.id
+    
+    # (first, second, score, is_code)
+    pairs = []
+    threshold = similarity.get_threshold(selected_class)
+    if selected_class:
+        pairs = [(a, b, score, False) for a, b, score in similarity.similar_pairs(selected_class, threshold=threshold)]
+        pairs += [(a, b, score, True) for a, b, score in code_similarity.similar_pairs(selected_class, threshold=threshold)]
+        pairs.sort(key=lambda pair: -pair[2])
+    
+    return render(request, 'submissions/similar_submissions.html', {
+        'class_groups': class_groups,
+        'selected_class': selected_class,
+        'pairs': pairs,
+        'threshold': threshold,
+    })
+
+@login_required
+def compare_code(request, submission_id, other_id):
+    submission = get_object_or_404(Submission.objects.select_related('class_group'), id=submission_id)
+    other = get_object_or_404(Submission.objects.select_related('class_group'), id=other_id)
+    if not (code_similarity.is_code(submission) and code_similarity.is_code(other)):
+        return HttpResponse("Порівнювати можна лише файли коду", status=400)
+    if submission.class_group_id != other.class_group_id:
+        # The class boilerplate filter only knows one class
+        return HttpResponse("Порівнювати можна лише роботи одного класу", status=400)
+    
+    try:
+        left_lines, right_lines, score, truncated = code_similarity.compare(submission, other)
+    except OSError as e:
+        return HttpResponse(f"Помилка при читанні файлу: {str(e)}", status=404)
+    
+    return render(request, 'submissions/compare_code.html', {
+        'submission': submission,
+        'other': other,
+        'sides': [(submission, left_lines, truncated[0]), (other, right_lines, truncated[1])],
+        'score': score,
+    })
+
 @login_required
 def activity_log(request):
     logs = ActivityLog.objects.all()
@@ -634,3 +1072,23 @@ def activity_log(request):
         'date_from': date_from,
         'date_to': date_to,
     })
+
+
+@login_required
+def performance_stats(request):
+    """Перцентилі часу відповіді за маршрутами (див. profiling.py)"""
+    rows = profiling.stats() if settings.PROFILING_ENABLED else []
+    return render(request, 'submissions/performance_stats.html', {
+        'rows': rows,
+        'window': settings.PROFILING_WINDOW,
+        'enabled': settings.PROFILING_ENABLED,
+    })
+
+
+def metrics_view(request):
+    """Метрики для Prometheus; доступні лише з адрес METRICS_ALLOWED_IPS"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
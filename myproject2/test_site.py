@@ -7,7 +7,7 @@ import sys
 import os
 
 # Add project directory to path
-sys.path.insert(0, '/home/yuriilinux/project_site/new_projectsite/myproject2')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject2.settings')
 
 import django